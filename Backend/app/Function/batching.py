@@ -0,0 +1,144 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# A batch is run as soon as it holds this many texts...
+EMBED_BATCH_MAX_SIZE = int(os.getenv("EMBED_BATCH_MAX_SIZE", "32"))
+# ...or once its first text has waited this long, whichever comes first.
+EMBED_BATCH_MAX_WAIT_MS = float(os.getenv("EMBED_BATCH_MAX_WAIT_MS", "5"))
+
+# Upper bounds of the batch-size histogram buckets
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+_STOP = object()
+
+
+class EmbeddingBatcher:
+    """
+    Dynamic micro-batching scheduler for a batch encode function.
+
+    Concurrent callers submit single texts; a worker thread collects whatever
+    arrives within a short window into one batch, runs a single forward pass,
+    and resolves each caller's future with its own row of the result.
+    """
+
+    def __init__(self, encode_batch: Callable[[List[str]], Sequence[Any]], max_batch_size: int = EMBED_BATCH_MAX_SIZE, max_wait_ms: float = EMBED_BATCH_MAX_WAIT_MS):
+        """
+        Args:
+            encode_batch: Encodes a list of texts, returning one vector per text in order.
+            max_batch_size: Largest number of texts encoded together.
+            max_wait_ms: Longest time the first text of a batch waits for others to join.
+        """
+        self.encode_batch = encode_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+        self._queue: "queue.Queue[Tuple[str, Future]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._histogram = [0] * (len(BATCH_SIZE_BUCKETS) + 1)
+        self.requests = 0
+        self.batches = 0
+        self.encode_seconds = 0.0
+
+    def submit(self, text: str) -> Future:
+        """
+        Queues one text for encoding.
+        Returns:
+            A future resolved with its vector; await it with asyncio.wrap_future.
+        """
+        future: Future = Future()
+        self._ensure_worker()
+        self._queue.put((text, future))
+        return future
+
+    def encode(self, text: str) -> Any:
+        """
+        Blocking submit for callers that are not on the event loop.
+        """
+        return self.submit(text).result()
+
+    def _ensure_worker(self) -> None:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="embed-batcher", daemon=True)
+                self._thread.start()
+
+    def _collect(self, first) -> List[Tuple[str, Future]]:
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                self._queue.put(_STOP)  # Handled after this batch is finished
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+            batch = [item for item in self._collect(first) if item[1].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            started = time.perf_counter()
+            try:
+                vectors = self.encode_batch([text for text, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            self._record(len(batch), time.perf_counter() - started)
+            for (_, future), vector in zip(batch, vectors):
+                future.set_result(vector)
+
+    def _record(self, size: int, seconds: float) -> None:
+        with self._lock:
+            self.requests += size
+            self.batches += 1
+            self.encode_seconds += seconds
+            for i, bound in enumerate(BATCH_SIZE_BUCKETS):
+                if size <= bound:
+                    self._histogram[i] += 1
+                    break
+            else:
+                self._histogram[-1] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Returns the current queue depth, request/batch counters and the batch-size histogram.
+        """
+        with self._lock:
+            labels = [f"<={bound}" for bound in BATCH_SIZE_BUCKETS] + [f">{BATCH_SIZE_BUCKETS[-1]}"]
+            return {
+                "queue_depth": self._queue.qsize(),
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000,
+                "requests": self.requests,
+                "batches": self.batches,
+                "mean_batch_size": round(self.requests / self.batches, 2) if self.batches else 0.0,
+                "encode_seconds": round(self.encode_seconds, 3),
+                "batch_size_histogram": dict(zip(labels, self._histogram)),
+            }
+
+    def shutdown(self) -> None:
+        """
+        Stops the worker after the texts already queued are encoded.
+        """
+        with self._lock:
+            thread = self._thread
+        if thread is not None and thread.is_alive():
+            self._queue.put(_STOP)
+            thread.join()
@@ -0,0 +1,487 @@
+import argparse
+import hashlib
+import multiprocessing
+import os
+import sqlite3
+import sys
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path, PurePosixPath
+from typing import Any, BinaryIO, Callable, Dict, Iterable, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from app.db.vector_store import WriterLocked, vector_store
+from app.Function.caching import invalidate_retrieval_cache
+from app.Function.chunking import (
+    EMBED_BATCH_SIZE,
+    IngestionCancelled,
+    chunk_document,
+    embed_batch,
+    upsert_batch,
+)
+from app.Function.documents import (
+    delete_vectors,
+    document_id_for,
+    get_manifest,
+    save_manifest,
+    stale_vector_ids,
+    vector_id,
+)
+from app.Function.extraction import EXTRACT_WORKERS, extract_changed_pages
+from app.Function.metrics import timed
+
+load_dotenv()
+
+# Worker processes extracting documents in parallel during bulk ingestion.
+# Each worker extracts whole documents; at most two per worker are in flight.
+BULK_EXTRACT_WORKERS = int(os.getenv("BULK_EXTRACT_WORKERS", str(EXTRACT_WORKERS)))
+# Limits of one POST /upload/bulk request, zip archives counted by their extracted contents
+BULK_MAX_FILES = int(os.getenv("BULK_MAX_FILES", "1000"))
+BULK_MAX_TOTAL_MB = int(os.getenv("BULK_MAX_TOTAL_MB", "2048"))
+
+SUPPORTED_SUFFIXES = (".pdf", ".docx")
+COPY_CHUNK_BYTES = 1024 * 1024
+
+DONE, DUPLICATE, FAILED = "done", "duplicate", "failed"
+
+
+@dataclass
+class BulkFile:
+    path: Path
+    name: str  # Path relative to the ingested directory; the document's filename and identity
+
+
+def iter_directory(root: Path) -> List[BulkFile]:
+    """
+    Lists the PDF and DOCX files under `root`, recursively, in a stable order.
+    """
+    return [
+        BulkFile(path=path, name=path.relative_to(root).as_posix())
+        for path in sorted(root.rglob("*"))
+        if path.is_file() and path.suffix.lower() in SUPPORTED_SUFFIXES and not path.name.startswith(".")
+    ]
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(COPY_CHUNK_BYTES)
+            if not chunk:
+                return digest.hexdigest()
+            digest.update(chunk)
+
+
+class BulkCheckpoint:
+    """
+    Progress of a bulk ingestion in a single SQLite file: one row per file
+    with its content hash, document id and outcome. A rerun against the same
+    checkpoint skips files that are done (or were duplicates) and retries
+    failed ones, and a file whose content hash is already done is a duplicate.
+    """
+
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            "name TEXT PRIMARY KEY, sha256 TEXT NOT NULL, document_id TEXT, status TEXT NOT NULL, "
+            "chunks INTEGER NOT NULL DEFAULT 0, error TEXT, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS files_sha256 ON files (sha256)")
+
+    def status(self, name: str) -> Optional[str]:
+        row = self._conn.execute("SELECT status FROM files WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def document_for(self, sha256: str) -> Optional[str]:
+        """
+        Returns the document id a file with this content hash was ingested as, if any.
+        """
+        row = self._conn.execute(
+            "SELECT document_id FROM files WHERE sha256 = ? AND status = ? LIMIT 1", (sha256, DONE)
+        ).fetchone()
+        return row[0] if row else None
+
+    def record(self, name: str, sha256: str, document_id: Optional[str], status: str, chunks: int = 0, error: Optional[str] = None):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO files (name, sha256, document_id, status, chunks, error, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (name, sha256, document_id, status, chunks, error, time.time()),
+        )
+        self._conn.commit()
+
+    def failures(self) -> List[Dict[str, str]]:
+        rows = self._conn.execute("SELECT name, error FROM files WHERE status = ? ORDER BY name", (FAILED,)).fetchall()
+        return [{"name": name, "error": error} for name, error in rows]
+
+    def close(self):
+        self._conn.close()
+
+
+def _copy_limited(src: BinaryIO, dest: Path, max_bytes: int, budget: List[int]) -> None:
+    """
+    Copies `src` to `dest`, failing as soon as the file grows past max_bytes or
+    the request past its remaining byte budget (declared sizes are not trusted).
+    """
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    written = 0
+    with open(dest, "wb") as out:
+        while True:
+            chunk = src.read(COPY_CHUNK_BYTES)
+            if not chunk:
+                return
+            written += len(chunk)
+            budget[0] -= len(chunk)
+            if written > max_bytes:
+                raise ValueError(f"'{dest.name}' exceeds the {max_bytes // (1024 * 1024)} MB file size limit.")
+            if budget[0] < 0:
+                raise ValueError(f"Upload exceeds the {BULK_MAX_TOTAL_MB} MB bulk upload limit.")
+            out.write(chunk)
+
+
+def _safe_name(name: str) -> Optional[str]:
+    """
+    Normalizes an uploaded or archived path to a relative POSIX path, or returns
+    None for names that would escape the spool directory.
+    """
+    parts = [part for part in PurePosixPath(name.replace("\\", "/")).parts if part not in ("", ".", "/")]
+    if not parts or ".." in parts or ":" in parts[0]:
+        return None
+    return "/".join(parts)
+
+
+def spool_uploads(uploads: Iterable[Tuple[str, BinaryIO]], dest: Path, max_file_bytes: int) -> Dict[str, int]:
+    """
+    Writes uploaded documents, and the documents inside uploaded zip archives,
+    below `dest` for a bulk ingestion job. Archive members keep their path under
+    a folder named after the archive; other archive members are skipped.
+    Raises:
+        ValueError: For an unsupported or unsafe file, or when BULK_MAX_FILES or
+            BULK_MAX_TOTAL_MB (or MAX_FILE_SIZE_MB for one file) is exceeded.
+    Returns:
+        The number of files spooled and of archive members skipped.
+    """
+    budget = [BULK_MAX_TOTAL_MB * 1024 * 1024]
+    spooled = skipped = 0
+
+    def target(name: str) -> Path:
+        nonlocal spooled
+        spooled += 1
+        if spooled > BULK_MAX_FILES:
+            raise ValueError(f"A bulk upload holds at most {BULK_MAX_FILES} documents.")
+        path = dest / name
+        stem, suffix, n = path.with_suffix(""), path.suffix, 1
+        while path.exists():
+            n += 1
+            path = Path(f"{stem} ({n}){suffix}")
+        return path
+
+    for filename, stream in uploads:
+        name = _safe_name(filename or "")
+        suffix = PurePosixPath(name or "").suffix.lower()
+        if name is None or suffix not in SUPPORTED_SUFFIXES + (".zip",):
+            raise ValueError(f"Unsupported file '{filename}': only PDF, DOCX and zip archives of them are accepted.")
+        if suffix != ".zip":
+            _copy_limited(stream, target(PurePosixPath(name).name), max_file_bytes, budget)
+            continue
+        try:
+            archive = zipfile.ZipFile(stream)
+        except zipfile.BadZipFile:
+            raise ValueError(f"'{filename}' is not a valid zip archive.")
+        with archive:
+            folder = PurePosixPath(name).stem
+            for member in archive.infolist():
+                member_name = _safe_name(member.filename)
+                if (
+                    member.is_dir()
+                    or member_name is None
+                    or PurePosixPath(member_name).suffix.lower() not in SUPPORTED_SUFFIXES
+                    or any(part.startswith(".") or part == "__MACOSX" for part in PurePosixPath(member_name).parts)
+                ):
+                    skipped += not member.is_dir()
+                    continue
+                with archive.open(member) as src:
+                    _copy_limited(src, target(f"{folder}/{member_name}"), max_file_bytes, budget)
+    if not spooled:
+        raise ValueError("The upload contains no PDF or DOCX files.")
+    return {"files": spooled, "skipped": skipped}
+
+
+@dataclass
+class _Document:
+    file: BulkFile
+    sha256: str
+    document_id: str
+    old_pages: Dict[str, Dict[str, Any]]
+    fingerprints: List[str] = field(default_factory=list)
+    chunk_counts: Dict[int, int] = field(default_factory=dict)
+    unwritten: int = 0  # Chunks queued for embedding or upsert
+    chunked: bool = False
+
+
+def throughput(progress: Dict[str, int], elapsed: float) -> Dict[str, float]:
+    """
+    Aggregate rates of a bulk ingestion so far, over wall-clock time.
+    """
+    def rate(value):
+        return round(value / elapsed, 1) if elapsed > 0 else 0.0
+
+    return {
+        "seconds": round(elapsed, 3),
+        "files_per_sec": rate(progress["files_done"]),
+        "pages_per_sec": rate(progress["pages_extracted"]),
+        "chunks_per_sec": rate(progress["vectors_written"]),
+        "mb_per_sec": rate(progress["bytes_read"] / (1024 * 1024)),
+    }
+
+
+def run_bulk_ingestion(
+    files: List[BulkFile],
+    checkpoint: BulkCheckpoint,
+    workers: int = BULK_EXTRACT_WORKERS,
+    batch_size: int = EMBED_BATCH_SIZE,
+    on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+    should_cancel: Optional[Callable[[], bool]] = None,
+) -> Dict[str, Any]:
+    """
+    Ingests many documents at once. Files are hashed and deduplicated by
+    content, then extracted whole in parallel worker processes (two per worker
+    in flight), while the main thread chunks the extracted pages of every
+    document into one stream of full embedding batches; the upsert of a batch
+    overlaps the embedding of the next. Small files therefore share embedding
+    batches instead of each paying for a partial one.
+
+    Each document is ingested incrementally as in run_ingestion_pipeline: only
+    pages whose fingerprint changed since the stored manifest are extracted and
+    embedded, and stale vectors are deleted. A document's manifest and its
+    checkpoint row are written once all of its vectors are, so an interrupted
+    run resumes from the checkpoint, re-doing at most the documents in flight.
+    Args:
+        files: Documents to ingest; BulkFile.name is their filename and, via
+            document_id_for, their document id.
+        on_progress: Called after every upserted batch with the file, page and
+            chunk counters and the aggregate throughput so far.
+        should_cancel: Polled between batches; raises IngestionCancelled when it returns True.
+    Returns:
+        Totals and aggregate throughput of the run.
+    """
+    started = time.perf_counter()
+    progress = {
+        "files_total": len(files),
+        "files_done": 0,
+        "files_skipped": 0,
+        "files_duplicate": 0,
+        "files_failed": 0,
+        "pages_extracted": 0,
+        "chunks_embedded": 0,
+        "vectors_written": 0,
+        "bytes_read": 0,
+    }
+    pending = deque(files)
+    in_flight: deque = deque()  # (_Document, future) in submission order
+    seen: Dict[str, str] = {}  # Content hash -> document id of an original still being ingested
+    # Copies of an original still being ingested; recorded as duplicates once it
+    # is done, or queued again if it fails
+    parked: Dict[str, List[BulkFile]] = {}
+    batch: List[Tuple[_Document, str, Any, Dict[str, Any]]] = []
+    upserting = None  # (documents of the batch, future) of the one upsert in flight
+    cache_hits = stale_deleted = 0
+
+    # spawn, not fork: the API process runs threads (ingest workers, torch)
+    pool = ProcessPoolExecutor(max_workers=max(1, workers), mp_context=multiprocessing.get_context("spawn"))
+    writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="bulk-upsert")
+
+    def fail(file: BulkFile, sha256: str, error: BaseException):
+        print(f"Bulk ingestion of {file.name} failed: {error}")
+        checkpoint.record(file.name, sha256, None, FAILED, error=str(error))
+        progress["files_failed"] += 1
+
+    def submit_more():
+        while pending and len(in_flight) < 2 * max(1, workers):
+            file = pending.popleft()
+            if checkpoint.status(file.name) in (DONE, DUPLICATE):
+                progress["files_skipped"] += 1
+                continue
+            try:
+                sha256 = file_sha256(file.path)
+                progress["bytes_read"] += file.path.stat().st_size
+            except OSError as e:
+                fail(file, "", e)
+                continue
+            if sha256 in seen:
+                parked.setdefault(sha256, []).append(file)
+                continue
+            original = checkpoint.document_for(sha256)
+            if original:
+                checkpoint.record(file.name, sha256, original, DUPLICATE)
+                progress["files_duplicate"] += 1
+                continue
+            document_id = document_id_for(file.name)
+            seen[sha256] = document_id
+            old_pages = (get_manifest(document_id) or {}).get("pages", {})
+            known = {int(n): entry["fingerprint"] for n, entry in old_pages.items()}
+            document = _Document(file=file, sha256=sha256, document_id=document_id, old_pages=old_pages)
+            filetype = file.path.suffix.lstrip(".").lower() or "pdf"
+            in_flight.append((document, pool.submit(extract_changed_pages, str(file.path), filetype, known)))
+
+    def finish(document: _Document):
+        nonlocal stale_deleted
+        removed = [int(n) for n in document.old_pages if int(n) > len(document.fingerprints)]
+        stale = stale_vector_ids(document.document_id, document.old_pages, {**document.chunk_counts, **{n: 0 for n in removed}})
+        delete_vectors(stale)
+        stale_deleted += len(stale)
+        save_manifest(document.document_id, document.file.name, {
+            str(n): {
+                "fingerprint": fp,
+                "chunks": document.chunk_counts[n] if n in document.chunk_counts else document.old_pages[str(n)]["chunks"],
+            }
+            for n, fp in enumerate(document.fingerprints, start=1)
+        })
+        checkpoint.record(document.file.name, document.sha256, document.document_id, DONE, chunks=sum(document.chunk_counts.values()))
+        progress["files_done"] += 1
+        seen.pop(document.sha256, None)
+        for copy in parked.pop(document.sha256, []):
+            checkpoint.record(copy.name, document.sha256, document.document_id, DUPLICATE)
+            progress["files_duplicate"] += 1
+
+    def wait_for_upsert():
+        nonlocal upserting
+        if upserting is None:
+            return
+        documents, future = upserting
+        upserting = None
+        progress["vectors_written"] += future.result()
+        for document in documents:
+            document.unwritten -= 1
+            if document.chunked and document.unwritten == 0:
+                finish(document)
+        if on_progress:
+            on_progress({**progress, **throughput(progress, time.perf_counter() - started)})
+
+    def flush():
+        nonlocal upserting, cache_hits, batch
+        if should_cancel and should_cancel():
+            raise IngestionCancelled()
+        documents, ids, chunks, metadata = (list(column) for column in zip(*batch))
+        batch = []
+        _, vectors, hits = embed_batch(chunks, batch_size)
+        cache_hits += hits
+        progress["chunks_embedded"] += len(chunks)
+        wait_for_upsert()
+        upserting = (documents, writer.submit(upsert_batch, ids, chunks, vectors, metadata))
+
+    try:
+        submit_more()
+        while in_flight:
+            document, future = in_flight.popleft()
+            try:
+                with timed("extract"):
+                    document.fingerprints, texts = future.result()
+            except Exception as e:
+                fail(document.file, document.sha256, e)
+                seen.pop(document.sha256, None)
+                # A copy of the failed file becomes the next original
+                pending.extendleft(reversed(parked.pop(document.sha256, [])))
+                submit_more()
+                continue
+            submit_more()
+            progress["pages_extracted"] += len(texts)
+            for number in sorted(texts):
+                chunks = chunk_document(texts[number])
+                document.chunk_counts[number] = len(chunks)
+                for ordinal, chunk in enumerate(chunks):
+                    meta = {"document_id": document.document_id, "page": number, "chunk": ordinal}
+                    batch.append((document, vector_id(document.document_id, number, ordinal), chunk, meta))
+                    document.unwritten += 1
+                    if len(batch) >= batch_size:
+                        flush()
+            document.chunked = True
+            if document.unwritten == 0:
+                finish(document)
+        if batch:
+            flush()
+        wait_for_upsert()
+    finally:
+        for _, future in in_flight:
+            future.cancel()
+        pool.shutdown(wait=False, cancel_futures=True)
+        writer.shutdown(wait=True)
+        vector_store.flush()
+        invalidate_retrieval_cache()
+
+    stats = {
+        **progress,
+        **throughput(progress, time.perf_counter() - started),
+        "cache_hits": cache_hits,
+        "stale_vectors_deleted": stale_deleted,
+        "failures": checkpoint.failures(),
+    }
+    print(
+        f"Bulk ingestion: {progress['files_done']} documents ingested, {progress['files_skipped']} already done, "
+        f"{progress['files_duplicate']} duplicates, {progress['files_failed']} failed; {progress['pages_extracted']} pages, "
+        f"{progress['vectors_written']} chunks ({cache_hits} from cache) in {stats['seconds']}s "
+        f"({stats['files_per_sec']} files/sec, {stats['pages_per_sec']} pages/sec, {stats['chunks_per_sec']} chunks/sec, "
+        f"{stats['mb_per_sec']} MB/sec)"
+    )
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="python -m app.Function.bulk",
+        description="Ingest every PDF and DOCX file under a directory, resumably.",
+        epilog="Run from Backend/, e.g. python -m app.Function.bulk ./documents --workers 8",
+    )
+    parser.add_argument("directory", type=Path)
+    parser.add_argument(
+        "--checkpoint",
+        help="Checkpoint file; rerunning with the same one skips documents already ingested "
+             "(default: <directory name>.bulk-checkpoint.sqlite3 in the working directory)",
+    )
+    parser.add_argument("--workers", type=int, default=BULK_EXTRACT_WORKERS, help="Extraction worker processes")
+    parser.add_argument("--batch-size", type=int, default=EMBED_BATCH_SIZE, help="Chunks per embedding batch")
+    parser.add_argument("--progress-seconds", type=float, default=5.0, help="Interval between progress lines")
+    args = parser.parse_args()
+
+    if not args.directory.is_dir():
+        parser.error(f"{args.directory} is not a directory")
+    try:
+        vector_store.claim_writer()
+    except WriterLocked as e:
+        parser.error(str(e))
+    files = iter_directory(args.directory)
+    checkpoint_path = args.checkpoint or f"{args.directory.resolve().name}.bulk-checkpoint.sqlite3"
+    checkpoint = BulkCheckpoint(checkpoint_path)
+    print(f"Found {len(files)} documents in {args.directory}; checkpoint {checkpoint_path}")
+
+    last_report = time.monotonic()
+
+    def on_progress(progress):
+        nonlocal last_report
+        if time.monotonic() - last_report >= args.progress_seconds:
+            last_report = time.monotonic()
+            handled = progress["files_done"] + progress["files_skipped"] + progress["files_duplicate"] + progress["files_failed"]
+            print(
+                f"{handled}/{progress['files_total']} files, {progress['pages_extracted']} pages, "
+                f"{progress['vectors_written']} chunks; {progress['files_per_sec']} files/sec, "
+                f"{progress['chunks_per_sec']} chunks/sec"
+            )
+
+    try:
+        stats = run_bulk_ingestion(files, checkpoint, workers=args.workers, batch_size=args.batch_size, on_progress=on_progress)
+    except KeyboardInterrupt:
+        print(f"Interrupted; rerun with --checkpoint {checkpoint_path} to resume.")
+        sys.exit(130)
+    finally:
+        checkpoint.close()
+    for failure in stats["failures"]:
+        print(f"Failed: {failure['name']}: {failure['error']}")
+    sys.exit(1 if stats["failures"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Set
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+class LRUCache:
+    """
+    Thread-safe in-process LRU cache with an optional per-entry TTL and hit/miss counters.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: Optional[float] = None):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Returns the cached value, or None on a miss or an expired entry.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl_seconds is not None and time.monotonic() - entry[1] > self.ttl_seconds:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+class SemanticAnswerCache:
+    """
+    Caches LLM answers by query meaning. A lookup hits when a previous query's
+    embedding is within `threshold` cosine similarity of the new one and was
+    answered from exactly the same retrieved context. Entries live in fixed
+    slots of one float32 matrix, and the least recently used slot is reused
+    once the cache is full.
+    """
+
+    def __init__(self, max_size: int, threshold: float):
+        self.max_size = max_size
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._vectors: Optional[np.ndarray] = None
+        self._contexts: List[Optional[str]] = [None] * max_size
+        self._answers: List[Optional[str]] = [None] * max_size
+        self._last_used = np.zeros(max_size, dtype=np.float64)
+        self._slots_by_context: Dict[str, Set[int]] = {}
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        v = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(v)
+        return v / norm if norm else v
+
+    def lookup(self, query_vector, context_hash: str) -> Optional[str]:
+        with self._lock:
+            slots = self._slots_by_context.get(context_hash)
+            if not slots or self._vectors is None:
+                self.misses += 1
+                return None
+            candidates = np.fromiter(slots, dtype=np.int64, count=len(slots))
+            scores = self._vectors[candidates] @ self._normalize(query_vector)
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                self.misses += 1
+                return None
+            slot = int(candidates[best])
+            self._last_used[slot] = time.monotonic()
+            self.hits += 1
+            return self._answers[slot]
+
+    def store(self, query_vector, context_hash: str, answer: str) -> None:
+        if self.max_size <= 0:
+            return
+        vector = self._normalize(query_vector)
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_size, vector.shape[0]), dtype=np.float32)
+            if self._size < self.max_size:
+                slot = self._size
+                self._size += 1
+            else:
+                slot = int(np.argmin(self._last_used))
+                self._slots_by_context[self._contexts[slot]].discard(slot)
+                if not self._slots_by_context[self._contexts[slot]]:
+                    del self._slots_by_context[self._contexts[slot]]
+                self.evictions += 1
+            self._vectors[slot] = vector
+            self._contexts[slot] = context_hash
+            self._answers[slot] = answer
+            self._last_used[slot] = time.monotonic()
+            self._slots_by_context.setdefault(context_hash, set()).add(slot)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._vectors = None
+            self._contexts = [None] * self.max_size
+            self._answers = [None] * self.max_size
+            self._last_used[:] = 0
+            self._slots_by_context = {}
+            self._size = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": self._size,
+                "max_size": self.max_size,
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "4096"))
+QUERY_CACHE_TTL_SECONDS = float(os.getenv("QUERY_CACHE_TTL_SECONDS", "3600"))
+
+# Level 1: normalized query text -> query embedding. Embeddings depend only on
+# the model, so this level survives index changes.
+query_embedding_cache = LRUCache(QUERY_CACHE_SIZE, QUERY_CACHE_TTL_SECONDS)
+
+# Level 2: (embedding digest, top_k, index generation) -> matched chunk texts.
+retrieval_cache = LRUCache(QUERY_CACHE_SIZE, QUERY_CACHE_TTL_SECONDS)
+
+
+SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", "1024"))
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+
+# Answers from the LLM in /retrieve, keyed by query meaning and retrieved context.
+answer_cache = SemanticAnswerCache(SEMANTIC_CACHE_SIZE, SEMANTIC_CACHE_THRESHOLD)
+
+
+def invalidate_retrieval_cache() -> None:
+    """
+    Drops cached retrieval results. Called whenever vectors are written or deleted.
+    """
+    retrieval_cache.clear()
+
+
+def cache_stats() -> Dict[str, Any]:
+    return {
+        "query_embedding": query_embedding_cache.stats(),
+        "retrieval": retrieval_cache.stats(),
+        "answer": answer_cache.stats(),
+    }
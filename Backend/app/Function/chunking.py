@@ -1,89 +1,176 @@
 
-from sentence_transformers import SentenceTransformer
-from transformers import AutoTokenizer
-import uuid
+import asyncio
+import hashlib
+import os
+from dataclasses import dataclass
 from fastapi import HTTPException
-from typing import List
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from app.db.pinecone import pinecone  # Assuming pinecone is already initialized
-from app.model.model import model  # SentenceTransformer model (shared)
+from typing import List, Optional, Tuple
+from app.db.vector_store import vector_store, async_vector_store  # Pinecone or local backend, see VECTOR_STORE
+from app.model.model import get_model, get_tokenizer  # SentenceTransformer model (shared, loaded lazily)
+from app.db.embedding_cache import embedding_cache, content_key, normalize_text
+from app.Function.batching import EmbeddingBatcher
+from app.Function.caching import query_embedding_cache, retrieval_cache
+from app.Function.metrics import CHUNKS, TOKENS, timed
 
 
-tokenizer = AutoTokenizer.from_pretrained("sentence-transformers/all-MiniLM-L6-v2")
+# Number of chunks sent through model.encode in one forward pass, and number of
+# vectors sent to the vector store in one upsert request.
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+UPSERT_BATCH_SIZE = int(os.getenv("UPSERT_BATCH_SIZE", "100"))
 
-import fitz  # PyMuPDF
+# Chunk size and overlap in model tokens. all-MiniLM-L6-v2 reads at most 256
+# tokens including [CLS] and [SEP], so larger chunks would be truncated.
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "200"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "30"))
 
-def convert_document(file_path: str) -> str:
+
+class IngestionCancelled(Exception):
+    """Raised between batches when the caller asked for ingestion to stop."""
+
+@dataclass
+class Chunk:
+    text: str
+    token_count: int  # Tokens in the embedding model's vocabulary, without special tokens
+
+
+def _token_offsets(text: str) -> List[Tuple[int, int]]:
+    """
+    Tokenizes text once with the fast tokenizer and returns each token's character span.
+    """
+    with timed("tokenize"):
+        encoding = get_tokenizer()(text, add_special_tokens=False, return_offsets_mapping=True, verbose=False)
+    return encoding["offset_mapping"]
+
+def chunk_document(text: str, max_tokens: int = CHUNK_TOKENS, overlap: int = CHUNK_OVERLAP_TOKENS) -> List[Chunk]:
+    """
+    Splits text into windows of max_tokens tokens overlapping by `overlap`
+    tokens. The text is tokenized once and windows are cut from the token
+    offsets, so every chunk fits the model and nothing is dropped.
+    """
+    offsets = _token_offsets(text)
+    step = max(max_tokens - overlap, 1)
+    chunks = []
+    with timed("chunk"):
+        for start in range(0, len(offsets), step):
+            end = min(start + max_tokens, len(offsets))
+            chunks.append(Chunk(text[offsets[start][0]:offsets[end - 1][1]], end - start))
+            if end == len(offsets):
+                break
+    CHUNKS.labels("created").inc(len(chunks))
+    TOKENS.labels("chunked").inc(sum(chunk.token_count for chunk in chunks))
+    return chunks
+
+def _batched(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def upsert_batch(ids, chunks, vectors, metadata=None):
     """
-    Extracts text from a PDF file using PyMuPDF (fitz).
+    Upserts one batch of embedded chunks. `metadata` optionally holds one dict
+    per chunk of extra fields to store next to the text and token count.
     """
-    doc = fitz.open(file_path)
-    full_text = ""
-    for page in doc:
-        full_text += page.get_text()
-    return full_text
-
-
-def chunk_document(text: str, max_tokens=512) -> list[str]:
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=max_tokens,
-        chunk_overlap=50,
-    )
-    chunks = splitter.split_text(text)
-    return [chunk for chunk in chunks if is_within_token_limit(chunk, max_tokens)]
-
-def is_within_token_limit(text, max_tokens=512):
-    tokens = tokenizer.encode(text, add_special_tokens=False)
-    return len(tokens) <= max_tokens
-
-def embed_store_chunks(chunks):
-    for chunk in chunks:
-        vector = model.encode(chunk)
-        pinecone.upsert(vectors=[
-            {
-                "id": str(uuid.uuid4()),
-                "values": vector.tolist(),  # Pinecone expects list, not np.ndarray
-                "metadata": {"text": chunk}
-            }
-        ])
-
-
-from typing import List # Important for type hinting
-
-def query_chunks(query_text: str) -> List[str]:
+    metadata = metadata or [{}] * len(chunks)
+    records = [
+        {
+            "id": vector_id,
+            "values": vector.tolist(),  # Stores expect list, not np.ndarray
+            "metadata": {"text": chunk.text, "token_count": chunk.token_count, **extra}
+        }
+        for vector_id, chunk, vector, extra in zip(ids, chunks, vectors, metadata)
+    ]
+    for page in _batched(records, UPSERT_BATCH_SIZE):
+        with timed("vector_upsert"):
+            vector_store.upsert(vectors=page)
+    CHUNKS.labels("upserted").inc(len(records))
+    return len(records)
+
+def embed_batch(batch, batch_size):
     """
-    Queries the Pinecone index with the given text and returns a list of
-    the text content from the relevant chunks.
+    Embeds one batch, running the model only on chunks missing from the
+    embedding cache.
+    Returns:
+        The content keys and the vectors of the batch, plus the number of cache hits.
+    """
+    keys = [content_key(chunk.text) for chunk in batch]
+    cached = embedding_cache.get_many(keys)
+    misses = [i for i, key in enumerate(keys) if key not in cached]
+    vectors = [cached.get(key) for key in keys]
+    CHUNKS.labels("cache_hit").inc(len(batch) - len(misses))
+    if misses:
+        with timed("embed"):
+            encoded = get_model().encode([batch[i].text for i in misses], batch_size=batch_size, show_progress_bar=False)
+        CHUNKS.labels("embedded").inc(len(misses))
+        for i, vector in zip(misses, encoded):
+            vectors[i] = vector
+        embedding_cache.put_many({keys[i]: vectors[i] for i in misses})
+    return keys, vectors, len(batch) - len(misses)
+
+async def aembed_query(query_text: str):
+    """
+    Returns the embedding of a query, served from the query embedding cache when
+    the same (normalized) question was asked before. On a cache miss the query
+    joins the next micro-batch and the event loop awaits its vector instead of
+    running the model.
+    """
+    key = normalize_text(query_text)
+    vector = query_embedding_cache.get(key)
+    if vector is None:
+        # Time waiting for the batch plus encoding it; the forward pass alone is timed as "embed"
+        with timed("query_embed"):
+            vector = await asyncio.wrap_future(query_batcher.submit(query_text))
+        query_embedding_cache.put(key, vector)
+    return vector
+
+def _encode_queries(texts: List[str]):
+    with timed("embed"):
+        vectors = get_model().encode(texts, batch_size=len(texts), show_progress_bar=False)
+    vectors.setflags(write=False)  # Rows are shared between requests through the cache
+    return list(vectors)
+
+# Concurrent query encodes are coalesced into one forward pass
+query_batcher = EmbeddingBatcher(_encode_queries)
+
+def _retrieval_key(vector, top_k: int, ef: Optional[int] = None):
+    # Results are only valid for the index generation they were read from
+    return (hashlib.sha1(vector.tobytes()).hexdigest(), top_k, ef, vector_store.generation)
+
+def _match_texts(results) -> List[str]:
+    # Extract the text content from the metadata of each match
+    # Assuming your chunk text is stored under the 'text' key in metadata
+    relevant_texts = []
+    for match in results.matches:
+        if 'text' in match.metadata:
+            relevant_texts.append(match.metadata['text'])
+    return relevant_texts
+
+
+async def aquery_chunks(query_text: str, top_k: int = 2, ef: Optional[int] = None) -> List[str]:
+    """
+    Queries the vector store with the given text and returns the text content
+    of the relevant chunks; `ef` overrides the HNSW candidate list size. The
+    query is encoded by the
+    EmbeddingBatcher thread, coalesced with concurrent queries into one forward
+    pass, and the vector store call runs on the I/O executor under its
+    concurrency limit.
     """
     if not query_text:
-        return [] # Handle empty query gracefully
+        return []
 
     try:
-        vector = model.encode(query_text) # Assuming 'model' is your embedding model
-        
-        # Perform the Pinecone query
-        results = pinecone.query(
-            vector=vector.tolist(),
-            top_k=2, # You might want to make top_k configurable
-            include_metadata=True
-        )
-
-        # Extract the text content from the metadata of each match
-        # Assuming your chunk text is stored under the 'text' key in metadata
-        relevant_texts = []
-        for match in results.matches:
-            if 'text' in match.metadata:
-                relevant_texts.append(match.metadata['text'])
-
-
-        return relevant_texts # This will now be a List[str]
+        vector = await aembed_query(query_text)
+        cache_key = _retrieval_key(vector, top_k, ef)
+        cached = retrieval_cache.get(cache_key)
+        if cached is not None:
+            return list(cached)
+
+        with timed("vector_query"):
+            results = await async_vector_store.query(vector=vector, top_k=top_k, include_metadata=True, ef=ef)
+        relevant_texts = _match_texts(results)
+        retrieval_cache.put(cache_key, tuple(relevant_texts))
+        return relevant_texts
 
     except Exception as e:
-        # Log the error for debugging
         import traceback
         traceback.print_exc()
-        print(f"Error in query_chunks: {e}")
-        # Re-raise or return an empty list depending on desired error handling
+        print(f"Error in aquery_chunks: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to query chunks: {e}")
-    
-
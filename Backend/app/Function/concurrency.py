@@ -0,0 +1,59 @@
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Threads for CPU-bound work called from request handlers (model.encode,
+# tokenization). PyTorch releases the GIL inside the forward pass, so a few
+# threads use the cores without oversubscribing them.
+CPU_WORKERS = int(os.getenv("CPU_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Threads for blocking client libraries that have no asyncio API.
+IO_WORKERS = int(os.getenv("IO_WORKERS", "32"))
+
+# Maximum concurrent in-flight calls per dependency, across all requests of a worker.
+CONCURRENCY_LIMITS = {
+    "embed": int(os.getenv("EMBED_CONCURRENCY", str(CPU_WORKERS))),
+    "vector_store": int(os.getenv("VECTOR_STORE_CONCURRENCY", "16")),
+    "llm": int(os.getenv("LLM_CONCURRENCY", "16")),
+    "mongo": int(os.getenv("MONGO_CONCURRENCY", "32")),
+}
+
+cpu_executor = ThreadPoolExecutor(max_workers=CPU_WORKERS, thread_name_prefix="cpu")
+io_executor = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="io")
+
+_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+
+def limiter(dependency: str) -> asyncio.Semaphore:
+    """
+    Returns the semaphore that bounds concurrent calls to one dependency.
+    """
+    if dependency not in _semaphores:
+        _semaphores[dependency] = asyncio.Semaphore(CONCURRENCY_LIMITS[dependency])
+    return _semaphores[dependency]
+
+
+async def run_cpu(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    Runs CPU-bound work on the CPU executor, under the "embed" limit.
+    """
+    async with limiter("embed"):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(cpu_executor, functools.partial(fn, *args, **kwargs))
+
+
+async def run_io(fn: Callable[..., Any], *args, dependency: str = None, **kwargs) -> Any:
+    """
+    Runs a blocking I/O call on the I/O executor, under the limit of `dependency` if given.
+    """
+    loop = asyncio.get_running_loop()
+    call = functools.partial(fn, *args, **kwargs)
+    if dependency is None:
+        return await loop.run_in_executor(io_executor, call)
+    async with limiter(dependency):
+        return await loop.run_in_executor(io_executor, call)
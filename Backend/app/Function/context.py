@@ -0,0 +1,152 @@
+import hashlib
+import os
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+from fastapi import HTTPException
+
+from app.db.vector_store import async_vector_store, vector_store
+from app.model.model import get_tokenizer
+from app.Function.caching import retrieval_cache
+from app.Function.chunking import aembed_query
+from app.Function.metrics import timed
+
+load_dotenv()
+
+# Chunks fetched from the vector store per question, before deduplication and packing
+CONTEXT_CANDIDATES = int(os.getenv("CONTEXT_CANDIDATES", "20"))
+# Most chunk tokens put into the prompt. Counted with the embedding model's
+# tokenizer (the token_count stored with each chunk), a close proxy for the LLM's.
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+# MMR trade-off between relevance to the question (1.0) and novelty against
+# the chunks already selected (0.0).
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.7"))
+# Candidates at least this similar to a selected chunk are dropped as duplicates
+# (overlapping windows of the same text, or the same passage in two revisions).
+MMR_DUPLICATE_THRESHOLD = float(os.getenv("MMR_DUPLICATE_THRESHOLD", "0.95"))
+
+
+@dataclass(frozen=True)
+class BuiltContext:
+    text: str
+    chunks: Tuple[str, ...]
+    token_count: int  # Chunk tokens in `text`
+    candidates: int  # Chunks fetched from the vector store
+    duplicates: int  # Candidates dropped as near-duplicates
+
+
+def count_tokens(text: str) -> int:
+    """
+    Counts tokens with the embedding model's (MiniLM WordPiece) tokenizer. The
+    LLM tokenizes differently, so for prompts this is an approximation.
+    """
+    with timed("tokenize"):
+        return len(get_tokenizer()(text, add_special_tokens=False, verbose=False)["input_ids"])
+
+
+def mmr_order(query_vector, candidate_vectors, lambda_: float = MMR_LAMBDA, duplicate_threshold: float = MMR_DUPLICATE_THRESHOLD) -> Tuple[List[int], int]:
+    """
+    Maximal Marginal Relevance over all candidates at once: each step picks the
+    candidate maximizing lambda * relevance - (1 - lambda) * its highest
+    similarity to the candidates already picked.
+    Returns:
+        Candidate indices in selection order, and the number dropped as near-duplicates.
+    """
+    candidates = np.asarray(candidate_vectors, dtype=np.float32)
+    candidates = candidates / (np.linalg.norm(candidates, axis=1, keepdims=True) + 1e-12)
+    query = np.asarray(query_vector, dtype=np.float32)
+    relevance = candidates @ (query / (np.linalg.norm(query) + 1e-12))
+    similarity = candidates @ candidates.T
+
+    n = len(candidates)
+    redundancy = np.full(n, -np.inf, dtype=np.float32)  # Highest similarity to a selected candidate
+    available = np.ones(n, dtype=bool)
+    order: List[int] = []
+    duplicates = 0
+    while available.any():
+        scores = lambda_ * relevance - (1 - lambda_) * np.maximum(redundancy, 0)
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        order.append(best)
+        available[best] = False
+        redundancy = np.maximum(redundancy, similarity[best])
+        near_duplicates = available & (similarity[best] >= duplicate_threshold)
+        duplicates += int(near_duplicates.sum())
+        available &= ~near_duplicates
+    return order, duplicates
+
+
+def pack(token_counts: List[int], order: List[int], budget: int) -> List[int]:
+    """
+    Takes chunks in `order` while they fit in `budget` tokens, skipping any
+    that would overflow it. The first chunk is always taken.
+    """
+    packed, used = [], 0
+    for i in order:
+        if packed and used + token_counts[i] > budget:
+            continue
+        packed.append(i)
+        used += token_counts[i]
+    return packed
+
+
+def _context_key(vector, candidates: int, budget: int, ef: Optional[int]):
+    # Like the retrieval cache keys: only valid for the index generation they were read from
+    return ("context", hashlib.sha1(vector.tobytes()).hexdigest(), candidates, budget, ef, vector_store.generation)
+
+
+async def abuild_context(
+    query_text: str,
+    candidates: int = CONTEXT_CANDIDATES,
+    budget: int = CONTEXT_TOKEN_BUDGET,
+    query_vector: Optional[np.ndarray] = None,
+    ef: Optional[int] = None,
+) -> BuiltContext:
+    """
+    Builds the LLM context for a question: over-fetches `candidates` chunks with
+    their vectors, drops near-duplicates and orders the rest with MMR, then packs
+    chunks up to `budget` tokens. `ef` overrides the HNSW candidate list size.
+    """
+    if not query_text:
+        return BuiltContext("", (), 0, 0, 0)
+
+    try:
+        vector = query_vector if query_vector is not None else await aembed_query(query_text)
+        cache_key = _context_key(vector, candidates, budget, ef)
+        cached = retrieval_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        with timed("vector_query"):
+            results = await async_vector_store.query(vector=vector, top_k=candidates, include_metadata=True, include_values=True, ef=ef)
+        matches = [match for match in results.matches if "text" in match.metadata]
+        if not matches:
+            return BuiltContext("", (), 0, 0, 0)
+
+        texts = [match.metadata["text"] for match in matches]
+        # Chunks ingested before token counts were stored are counted here
+        token_counts = [int(match.metadata.get("token_count") or count_tokens(text)) for match, text in zip(matches, texts)]
+        if all(match.values for match in matches):
+            order, duplicates = mmr_order(vector, [match.values for match in matches])
+        else:
+            order, duplicates = list(range(len(matches))), 0  # Relevance order when a store returns no vectors
+
+        packed = pack(token_counts, order, budget)
+        chunks = tuple(texts[i] for i in packed)
+        context = BuiltContext(
+            text="\n".join(chunks),
+            chunks=chunks,
+            token_count=sum(token_counts[i] for i in packed),
+            candidates=len(matches),
+            duplicates=duplicates,
+        )
+        retrieval_cache.put(cache_key, context)
+        return context
+
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        print(f"Error in abuild_context: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to build context: {e}")
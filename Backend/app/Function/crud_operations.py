@@ -1,10 +1,64 @@
 from pymongo.collection import Collection
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import BulkWriteError
 from bson.objectid import ObjectId
-from typing import List , IO, Union , Optional , Literal,Dict,Any
+from typing import List , IO, Union , Optional , Literal,Dict,Any, Tuple
 from datetime import datetime
-from app.db.mongo import chat_history_collection
+from app.db.mongo import async_chat_history_collection as chat_history_collection
+from app.db.mongo import async_chat_messages_collection as chat_messages_collection
+from app.Function.concurrency import limiter
+from app.Function.metrics import timed
 
-def create_conversation() -> str:
+# Messages live in their own collection so a conversation document stays small
+# however long the chat grows. Each question/answer turn is one document
+# holding its messages, so a turn is written atomically and never stored
+# half. Message ids are ObjectIds created in order; a turn document's _id is
+# the id of its first message and last_id that of its last, so sorting turns
+# by (convo_id, _id) gives the chat order and message ids serve as the
+# pagination cursor.
+
+# Conversations read per batch while migrating legacy embedded messages
+MIGRATION_BATCH_SIZE = 100
+
+async def ensure_indexes() -> None:
+    """
+    Creates the indexes the conversation queries rely on. Idempotent; run at startup.
+    """
+    async with limiter("mongo"):
+        await chat_messages_collection.create_index([("convo_id", ASCENDING), ("_id", ASCENDING)])
+        await chat_messages_collection.create_index([("convo_id", ASCENDING), ("last_id", ASCENDING)])
+        await chat_history_collection.create_index([("created_at", DESCENDING)])
+
+async def migrate_embedded_messages() -> int:
+    """
+    Moves messages stored in the legacy `messages` array of conversation
+    documents into the messages collection, one document per legacy message.
+    Safe to re-run after an interruption.
+    Returns:
+        The number of conversations migrated.
+    """
+    migrated = 0
+    while True:
+        # Migrated conversations lose their `messages` field, so each read returns the next batch
+        async with limiter("mongo"):
+            cursor = chat_history_collection.find({"messages": {"$exists": True}}, {"messages": 1}).limit(MIGRATION_BATCH_SIZE)
+            legacy = await cursor.to_list(length=None)
+        if not legacy:
+            return migrated
+        for convo in legacy:
+            messages = [_turn_document(convo["_id"], [message]) for message in convo.get("messages", [])]
+            async with limiter("mongo"):
+                if messages:
+                    try:
+                        await chat_messages_collection.insert_many(messages, ordered=False)
+                    except BulkWriteError as e:
+                        # Messages copied by an earlier, interrupted run already exist
+                        if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+                            raise
+                await chat_history_collection.update_one({"_id": convo["_id"]}, {"$unset": {"messages": ""}})
+            migrated += 1
+
+async def create_conversation() -> str:
     """
     Creates a new conversation document and returns its convo_id.
     Returns:
@@ -13,59 +67,125 @@ def create_conversation() -> str:
     doc = {
         "created_at": datetime.now(),
     }
-    result = chat_history_collection.insert_one(doc)
+    async with limiter("mongo"):
+        with timed("mongo_write"):
+            result = await chat_history_collection.insert_one(doc)
     return str(result.inserted_id)
 
-def get_latest_conversation() -> Optional[Dict[str, Any]]:
+async def get_conversation_by_id(convo_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
     """
-    Retrieves the most recent conversation document.
+    Retrieves a conversation document (without its messages) by its ID, or the newest one when no ID is given.
     Returns:
-        The latest conversation document or None if no conversations exist.
+        The conversation document or None if it does not exist.
     """
-    return chat_history_collection.find_one(sort=[("created_at", -1)])
+    async with limiter("mongo"):
+        with timed("mongo_read"):
+            if convo_id:
+                return await chat_history_collection.find_one({"_id": ObjectId(convo_id)})
+            # Sort by _id which is chronological by default
+            return await chat_history_collection.find_one(sort=[("_id", -1)])
 
-def store_user_message(convo_id: str, content: str, timestamp: datetime) -> ObjectId:
+async def get_messages(convo_id: str, limit: int, before: Optional[str] = None, since: Optional[str] = None) -> Tuple[List[Dict[str, Any]], bool]:
     """
-    Stores a user message in the conversation document's messages array.
+    Returns one page of a conversation's messages in chat order.
     Args:
         convo_id: The conversation identifier.
-        content: The user's message text.
-        timestamp: The message timestamp (UTC).
+        limit: Maximum number of messages returned.
+        before: Return the newest messages older than this message id (default: the newest messages).
+        since: Return the oldest messages newer than this message id; takes precedence over `before`.
     Returns:
-        The ObjectId of the inserted message.
+        The messages, and whether more exist beyond the page in the direction read.
     """
-    message = {
-        "_id": ObjectId(),
-        "role": "user",
-        "content": content,
-        "timestamp": timestamp
-    }
-    chat_history_collection.update_one(
-        {"_id": ObjectId(convo_id)},
-        {"$push": {"messages": message}}
-    )
-    return message["_id"]
+    # Every turn holds at least one message, so limit + 1 turns hold more than
+    # `limit` messages past the cursor whenever more exist.
+    query: Dict[str, Any] = {"convo_id": ObjectId(convo_id)}
+    if since:
+        # Turns ending after the cursor; the first may also hold older messages
+        query["last_id"] = {"$gt": ObjectId(since)}
+        order = ASCENDING
+    else:
+        if before:
+            # Turns starting before the cursor; the last may also hold newer messages
+            query["_id"] = {"$lt": ObjectId(before)}
+        order = DESCENDING
+    async with limiter("mongo"):
+        with timed("mongo_read"):
+            cursor = chat_messages_collection.find(query, {"messages": 1}).sort("_id", order).limit(limit + 1)
+            turns = await cursor.to_list(length=None)
+    if order == ASCENDING:
+        messages = [m for turn in turns for m in turn["messages"] if m["_id"] > ObjectId(since)]
+    else:
+        messages = [m for turn in turns for m in reversed(turn["messages"])]
+        if before:
+            messages = [m for m in messages if m["_id"] < ObjectId(before)]
+    has_more = len(messages) > limit
+    messages = messages[:limit]
+    if order == DESCENDING:
+        messages.reverse()
+    return messages, has_more
 
-def store_bot_reply(convo_id: str, content: str, timestamp: datetime) -> ObjectId:
+async def list_conversations(limit: int, before: Optional[str] = None) -> Tuple[List[Dict[str, Any]], bool]:
     """
-    Stores a bot reply in the conversation document's messages array.
+    Lists conversations most recent first, one page at a time.
     Args:
-        convo_id: The conversation identifier.
-        content: The bot's reply text.
-        timestamp: The reply timestamp (UTC).
+        limit: Maximum number of conversations returned.
+        before: Return conversations older than this conversation id.
     Returns:
-        The ObjectId of the inserted message.
+        The conversations, and whether older ones exist.
+    """
+    query = {"_id": {"$lt": ObjectId(before)}} if before else {}
+    async with limiter("mongo"):
+        with timed("mongo_read"):
+            cursor = chat_history_collection.find(query).sort("_id", -1).limit(limit + 1)
+            conversations = await cursor.to_list(length=None)
+    return conversations[:limit], len(conversations) > limit
+
+async def delete_conversation_by_id(convo_id: str) -> bool:
     """
-    message = {
-        "_id": ObjectId(),
-        "role": "bot",
-        "content": content,
-        "timestamp": timestamp
+    Deletes a conversation document and its messages.
+    Returns:
+        True if a conversation was deleted.
+    """
+    async with limiter("mongo"):
+        with timed("mongo_write"):
+            result = await chat_history_collection.delete_one({"_id": ObjectId(convo_id)})
+            await chat_messages_collection.delete_many({"convo_id": ObjectId(convo_id)})
+    return result.deleted_count == 1
+
+def _turn_document(convo_id: ObjectId, messages: List[Dict[str, Any]]) -> Dict[str, Any]:
+    return {
+        "_id": messages[0]["_id"],
+        "convo_id": convo_id,
+        "last_id": messages[-1]["_id"],
+        "messages": messages,
     }
-    chat_history_collection.update_one(
-        {"_id": ObjectId(convo_id)},
-        {"$push": {"messages": message}}
-    )
-    return message["_id"]
 
+def turn_document(convo_id: str, user_content: str, bot_content: str, timestamp: datetime) -> Dict[str, Any]:
+    """
+    Builds the document of one question/answer turn, its messages in chat order.
+    """
+    messages = [
+        {"_id": ObjectId(), "role": role, "content": content, "timestamp": timestamp}
+        for role, content in (("user", user_content), ("bot", bot_content))
+    ]
+    return _turn_document(ObjectId(convo_id), messages)
+
+async def store_turn(convo_id: str, user_content: str, bot_content: str, timestamp: datetime) -> None:
+    """
+    Stores a user message and the bot reply in one atomic write.
+    Args:
+        convo_id: The conversation identifier.
+        user_content: The user's message text.
+        bot_content: The bot's reply text.
+        timestamp: The turn timestamp.
+    """
+    await store_turns([turn_document(convo_id, user_content, bot_content, timestamp)])
 
+async def store_turns(turns: List[Dict[str, Any]]) -> None:
+    """
+    Writes buffered turns (built with turn_document) in one ordered insert. Each
+    turn is a single document, so it is either stored whole or not at all.
+    """
+    async with limiter("mongo"):
+        with timed("mongo_write"):
+            await chat_messages_collection.insert_many(turns, ordered=True)
@@ -0,0 +1,95 @@
+import hashlib
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from app.db.mongo import documents_collection
+from app.db.vector_store import vector_store
+from app.Function.caching import invalidate_retrieval_cache
+
+# Vector ids are deleted in pages of this size (Pinecone accepts up to 1000 per call).
+DELETE_BATCH_SIZE = 1000
+
+
+def document_id_for(filename: str) -> str:
+    """
+    Default document identity when the client does not supply one: uploads with
+    the same file name are treated as revisions of the same document.
+    """
+    return hashlib.sha256(filename.encode("utf-8")).hexdigest()[:24]
+
+
+def vector_id(document_id: str, page: int, ordinal: int) -> str:
+    return f"{document_id}:{page}:{ordinal}"
+
+
+def get_manifest(document_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Returns the stored manifest of a document: its per-page fingerprints and
+    the number of chunks (vectors) written for each page.
+    """
+    return documents_collection.find_one({"_id": document_id})
+
+
+def save_manifest(document_id: str, filename: str, pages: Dict[str, Dict[str, Any]]) -> None:
+    """
+    Args:
+        pages: Maps the 1-based page number (as a string) to {"fingerprint": str, "chunks": int}.
+    """
+    documents_collection.update_one(
+        {"_id": document_id},
+        {
+            "$set": {"filename": filename, "pages": pages, "updated_at": datetime.now()},
+            "$setOnInsert": {"created_at": datetime.now()},
+        },
+        upsert=True,
+    )
+
+
+def delete_vectors(ids: List[str]) -> None:
+    for start in range(0, len(ids), DELETE_BATCH_SIZE):
+        vector_store.delete(ids=ids[start:start + DELETE_BATCH_SIZE])
+
+
+def stale_vector_ids(document_id: str, old_pages: Dict[str, Dict[str, Any]], new_chunk_counts: Dict[int, int]) -> List[str]:
+    """
+    Ids of vectors written for a previous revision that the new revision no
+    longer overwrites: chunks past the new end of a re-chunked page, and every
+    chunk of a page that is gone.
+    Args:
+        new_chunk_counts: Chunks per page in the new revision, for every page that
+            was re-chunked or removed (removed pages map to 0).
+    """
+    ids = []
+    for page, count in new_chunk_counts.items():
+        old_count = old_pages.get(str(page), {}).get("chunks", 0)
+        ids.extend(vector_id(document_id, page, ordinal) for ordinal in range(count, old_count))
+    return ids
+
+
+def delete_document(document_id: str) -> Optional[int]:
+    """
+    Removes every vector of a document and its manifest.
+    Returns:
+        The number of vectors deleted, or None if the document is unknown.
+    """
+    manifest = get_manifest(document_id)
+    if manifest is None:
+        return None
+    ids = [
+        vector_id(document_id, int(page), ordinal)
+        for page, entry in manifest.get("pages", {}).items()
+        for ordinal in range(entry.get("chunks", 0))
+    ]
+    delete_vectors(ids)
+    vector_store.flush()
+    invalidate_retrieval_cache()
+    documents_collection.delete_one({"_id": document_id})
+    return len(ids)
+
+
+def clear_manifests() -> None:
+    """
+    Forgets every document manifest. Must accompany clearing the vector store,
+    or re-uploads would skip pages whose vectors no longer exist.
+    """
+    documents_collection.delete_many({})
@@ -0,0 +1,190 @@
+# PDF text extraction. Kept free of model and database imports so that
+# extraction worker processes start quickly.
+import hashlib
+import multiprocessing
+import os
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import fitz  # PyMuPDF
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Documents with fewer pages are extracted serially; process start-up and
+# handing the document to workers costs more than it saves on small files.
+PARALLEL_EXTRACT_MIN_PAGES = int(os.getenv("PARALLEL_EXTRACT_MIN_PAGES", "64"))
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", str(os.cpu_count() or 1)))
+EXTRACT_SHARD_PAGES = int(os.getenv("EXTRACT_SHARD_PAGES", "32"))
+
+DocumentSource = Union[str, os.PathLike, bytes, bytearray]
+
+
+@dataclass
+class PageText:
+    number: int  # 1-based page number
+    text: str
+    offset: int  # Character offset of this page in the joined document text
+
+
+def open_document(source: DocumentSource, filetype: Optional[str] = None) -> fitz.Document:
+    """
+    Opens a document with PyMuPDF, either from a path on disk or straight from
+    an in-memory buffer without touching the filesystem.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return fitz.open(stream=source, filetype=filetype or "pdf")
+    # Spooled uploads have no meaningful extension, so the type is passed along
+    return fitz.open(source, filetype=filetype)
+
+
+# In an extraction worker process: the document its last shard came from,
+# keyed by path, file type, mtime and size, so later shards reuse the handle
+_worker_document: Optional[Tuple[tuple, fitz.Document]] = None
+
+
+def _worker_open(path: str, filetype: Optional[str]) -> fitz.Document:
+    global _worker_document
+    stat = os.stat(path)
+    key = (path, filetype, stat.st_mtime_ns, stat.st_size)
+    if _worker_document is None or _worker_document[0] != key:
+        if _worker_document is not None:
+            _worker_document[1].close()
+            _worker_document = None
+        _worker_document = (key, open_document(path, filetype))
+    return _worker_document[1]
+
+
+def _extract_indices(path: str, filetype: Optional[str], indices: List[int]) -> List[str]:
+    """
+    Worker entry point: extracts the given 0-based pages of the document at
+    `path`, opening it once per worker process rather than once per shard.
+    """
+    doc = _worker_open(path, filetype)
+    return [doc[i].get_text() for i in indices]
+
+
+def page_fingerprints(source: DocumentSource, filetype: Optional[str] = None) -> List[str]:
+    """
+    Returns a sha256 fingerprint per page, computed from the page's raw content
+    stream and the streams of the form XObjects it draws, without extracting
+    any text. An unchanged page keeps its fingerprint across re-uploads.
+    """
+    with open_document(source, filetype) as doc:
+        return [_fingerprint(doc, page) for page in doc]
+
+
+def _fingerprint(doc: fitz.Document, page: fitz.Page) -> str:
+    digest = hashlib.sha256(page.read_contents())
+    if doc.is_pdf:
+        for xobject in page.get_xobjects():
+            digest.update(doc.xref_stream(xobject[0]) or b"")
+    else:
+        digest.update(page.get_text().encode("utf-8"))
+    return digest.hexdigest()
+
+
+def extract_changed_pages(
+    source: DocumentSource,
+    filetype: Optional[str],
+    known_fingerprints: Dict[int, str],
+) -> Tuple[List[str], Dict[int, str]]:
+    """
+    Worker entry point for bulk ingestion: fingerprints every page and extracts
+    the text of the pages whose fingerprint differs from `known_fingerprints`,
+    with one open handle on the document.
+    Args:
+        known_fingerprints: Maps 1-based page numbers to the fingerprint stored for them.
+    Returns:
+        The fingerprint of every page, and the text of each changed page by page number.
+    """
+    fingerprints, texts = [], {}
+    with open_document(source, filetype) as doc:
+        for number, page in enumerate(doc, start=1):
+            fingerprint = _fingerprint(doc, page)
+            fingerprints.append(fingerprint)
+            if known_fingerprints.get(number) != fingerprint:
+                texts[number] = page.get_text()
+    return fingerprints, texts
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn, not fork: the API process runs threads (ingest workers, torch)
+            # and forking a multi-threaded process can deadlock the child.
+            _pool = ProcessPoolExecutor(max_workers=EXTRACT_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def iter_pages(
+    source: DocumentSource,
+    filetype: Optional[str] = None,
+    on_page: Optional[Callable[[int, int], None]] = None,
+    page_numbers: Optional[Iterable[int]] = None,
+) -> Iterator[PageText]:
+    """
+    Yields the text of every page, in order, with each page's offset into the
+    joined text. Large documents are split into batches of
+    EXTRACT_SHARD_PAGES pages that are extracted in parallel worker processes,
+    with at most two batches per worker in flight so memory stays bounded.
+    Workers are sent the document's path, never its bytes; an in-memory
+    document is written to a temporary file first.
+    Args:
+        on_page: Called as on_page(pages_done, pages_total) as pages complete.
+        page_numbers: 1-based pages to extract instead of the whole document.
+    """
+    with open_document(source, filetype) as doc:
+        if page_numbers is None:
+            indices = list(range(doc.page_count))
+        else:
+            indices = sorted(n - 1 for n in set(page_numbers) if 0 < n <= doc.page_count)
+        total = len(indices)
+        if total < PARALLEL_EXTRACT_MIN_PAGES or EXTRACT_WORKERS <= 1:
+            offset = 0
+            for done, index in enumerate(indices, start=1):
+                text = doc[index].get_text()
+                yield PageText(number=index + 1, text=text, offset=offset)
+                offset += len(text)
+                if on_page:
+                    on_page(done, total)
+            return
+
+    spilled = None
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        with tempfile.NamedTemporaryFile(prefix="extract-", suffix=f".{filetype or 'pdf'}", delete=False) as spill:
+            spill.write(source)
+        spilled = path = spill.name
+    else:
+        path = os.fspath(source)
+    shards = deque(indices[start:start + EXTRACT_SHARD_PAGES] for start in range(0, total, EXTRACT_SHARD_PAGES))
+    in_flight = deque()
+    pool = _get_pool()
+    done = offset = 0
+    try:
+        while shards or in_flight:
+            while shards and len(in_flight) < 2 * EXTRACT_WORKERS:
+                shard = shards.popleft()
+                in_flight.append((shard, pool.submit(_extract_indices, path, filetype, shard)))
+            shard, future = in_flight.popleft()
+            for index, text in zip(shard, future.result()):
+                yield PageText(number=index + 1, text=text, offset=offset)
+                offset += len(text)
+            done += len(shard)
+            if on_page:
+                on_page(done, total)
+    finally:
+        for _, future in in_flight:
+            future.cancel()
+        if spilled:
+            os.unlink(spilled)
+
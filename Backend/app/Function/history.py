@@ -0,0 +1,210 @@
+import asyncio
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set
+
+from dotenv import load_dotenv
+from pymongo.errors import BulkWriteError
+
+from app.Function.crud_operations import store_turn, store_turns, turn_document
+
+load_dotenv()
+
+# Buffer turns and write them in batches; when off, each turn is written by its own background task.
+HISTORY_WRITE_BEHIND = os.getenv("HISTORY_WRITE_BEHIND", "true").lower() in ("1", "true", "yes")
+# How long the first buffered turn waits for others before the buffer is flushed
+HISTORY_FLUSH_INTERVAL_MS = float(os.getenv("HISTORY_FLUSH_INTERVAL_MS", "200"))
+# Turns per write; a full buffer is flushed without waiting for the interval
+HISTORY_FLUSH_MAX_TURNS = int(os.getenv("HISTORY_FLUSH_MAX_TURNS", "100"))
+# Most turns waiting to be written, e.g. while MongoDB is down; past this, record() waits for room
+HISTORY_BUFFER_MAX_TURNS = int(os.getenv("HISTORY_BUFFER_MAX_TURNS", "10000"))
+# How long record() waits for room in a full buffer before dropping the turn
+HISTORY_BUFFER_FULL_WAIT_MS = float(os.getenv("HISTORY_BUFFER_FULL_WAIT_MS", "1000"))
+# Longest pause between attempts to write the buffer while MongoDB is failing
+MAX_RETRY_INTERVAL_SECONDS = 5.0
+# Attempts to write what is still buffered when the server shuts down
+SHUTDOWN_FLUSH_ATTEMPTS = 3
+
+
+class HistoryWriter:
+    """
+    Persists conversation turns off the request path.
+
+    Handlers call record() and return immediately. In write-behind mode the
+    turns are buffered and written with one ordered insert per flush, so
+    turns of a conversation keep their order; close() drains the buffer at
+    shutdown. A turn is lost only if the process dies before its flush.
+
+    At most max_buffered turns wait to be written. While MongoDB is down the
+    buffer fills up; then record() waits up to full_wait_ms for room, slowing
+    the handlers down, and drops the turn if there is still none. Delayed and
+    dropped turns are counted and logged.
+    """
+
+    def __init__(
+        self,
+        write_behind: bool = HISTORY_WRITE_BEHIND,
+        flush_interval_ms: float = HISTORY_FLUSH_INTERVAL_MS,
+        max_turns: int = HISTORY_FLUSH_MAX_TURNS,
+        max_buffered: int = HISTORY_BUFFER_MAX_TURNS,
+        full_wait_ms: float = HISTORY_BUFFER_FULL_WAIT_MS,
+    ):
+        self.write_behind = write_behind
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_turns = max(1, max_turns)
+        self.max_buffered = max(1, max_buffered)
+        self.full_wait = full_wait_ms / 1000
+        self.delayed = 0
+        self.dropped = 0
+        self._reported = (0, 0)  # (delayed, dropped) when last logged
+        self._buffer: List[Dict[str, Any]] = []  # One turn document per turn
+        self._pending: Set[asyncio.Task] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._room: Optional[asyncio.Event] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+
+    async def record(self, convo_id: str, user_content: str, bot_content: str) -> None:
+        """
+        Schedules a question/answer turn to be stored. Returns without waiting on
+        MongoDB unless max_buffered turns are already waiting to be written.
+        Must be called from the event loop.
+        """
+        if not convo_id:
+            return
+        timestamp = datetime.now()
+        self._ensure_flusher()
+        if self._backlog() >= self.max_buffered:
+            if not await self._wait_for_room():
+                self.dropped += 1
+                if self.dropped - self._reported[1] == 1:
+                    print(f"Conversation history buffer is full ({self.max_buffered} turns); dropping turns until MongoDB catches up.")
+                return
+            self.delayed += 1
+        if not self.write_behind:
+            task = self._loop.create_task(self._store_one(convo_id, user_content, bot_content, timestamp))
+            self._pending.add(task)
+            task.add_done_callback(self._task_done)
+            return
+        self._buffer.append(turn_document(convo_id, user_content, bot_content, timestamp))
+        if len(self._buffer) == 1 or len(self._buffer) >= self.max_turns:
+            self._wake.set()
+
+    def _backlog(self) -> int:
+        return len(self._buffer) + len(self._pending)
+
+    async def _wait_for_room(self) -> bool:
+        deadline = self._loop.time() + self.full_wait
+        while self._backlog() >= self.max_buffered:
+            remaining = deadline - self._loop.time()
+            if remaining <= 0:
+                return False
+            self._room.clear()
+            try:
+                await asyncio.wait_for(self._room.wait(), remaining)
+            except asyncio.TimeoutError:
+                return False
+        return True
+
+    def _task_done(self, task: asyncio.Task) -> None:
+        self._pending.discard(task)
+        self._room.set()
+
+    def _report_backpressure(self) -> None:
+        delayed, dropped = self.delayed - self._reported[0], self.dropped - self._reported[1]
+        if delayed or dropped:
+            print(f"Conversation history buffer was full: {delayed} turn(s) delayed, {dropped} dropped.")
+            self._reported = (self.delayed, self.dropped)
+
+    async def _store_one(self, convo_id: str, user_content: str, bot_content: str, timestamp: datetime) -> None:
+        try:
+            await store_turn(convo_id, user_content, bot_content, timestamp)
+        except Exception as e:
+            print(f"Failed to store a turn of conversation {convo_id}: {e}")
+
+    def _ensure_flusher(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._wake = asyncio.Event()
+            self._room = asyncio.Event()
+            self._flush_lock = asyncio.Lock()
+            self._task = None
+        if self.write_behind and (self._task is None or self._task.done()):
+            self._task = loop.create_task(self._run())
+
+    async def _run(self) -> None:
+        failures = 0
+        while True:
+            await self._wake.wait()
+            self._wake.clear()
+            if len(self._buffer) < self.max_turns:
+                # Let concurrent turns join this batch; a full buffer wakes us early
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake.clear()
+            if await self.flush():
+                failures = 0
+            else:
+                # Back off while MongoDB is failing instead of retrying every interval
+                failures += 1
+                await asyncio.sleep(min(self.flush_interval * 2 ** failures, MAX_RETRY_INTERVAL_SECONDS))
+            if self._buffer:
+                # Turns that arrived during the flush, or a failed flush to retry
+                self._wake.set()
+
+    async def flush(self) -> bool:
+        """
+        Writes the buffered turns.
+        Returns:
+            True if the buffer was emptied; on a connection error the remaining
+            turns stay buffered for the next attempt.
+        """
+        if self._flush_lock is None:
+            return not self._buffer
+        async with self._flush_lock:
+            while self._buffer:
+                batch = self._buffer[:self.max_turns]
+                try:
+                    await store_turns(batch)
+                    written = len(batch)
+                except BulkWriteError as e:
+                    # Ordered writes stop at the first error: the turns before it were
+                    # stored, and the failing turn would fail again, so drop it.
+                    error = e.details["writeErrors"][0]
+                    print(f"Dropped a conversation turn that could not be stored: {error.get('errmsg')}")
+                    written = error["index"] + 1
+                except Exception as e:
+                    print(f"Failed to store {len(self._buffer)} buffered conversation turn(s), will retry: {e}")
+                    return False
+                del self._buffer[:written]
+                self._room.set()
+            self._report_backpressure()
+            return True
+
+    async def close(self) -> None:
+        """
+        Stops the background flusher and writes everything still pending. Call at shutdown.
+        """
+        if self._task is not None:
+            async with self._flush_lock:  # Never interrupt a write in progress
+                self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+            self._report_backpressure()
+        for _ in range(SHUTDOWN_FLUSH_ATTEMPTS):
+            if await self.flush():
+                return
+            await asyncio.sleep(self.flush_interval)
+        print(f"Lost {len(self._buffer)} conversation turn(s) that could not be stored at shutdown.")
+
+
+history_writer = HistoryWriter()
@@ -0,0 +1,371 @@
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from bson.objectid import ObjectId
+from dotenv import load_dotenv
+
+from app.db.mongo import ingest_jobs_collection
+from app.Function.bulk import BulkCheckpoint, iter_directory, run_bulk_ingestion
+from app.Function.chunking import IngestionCancelled
+from app.Function.pipeline import run_ingestion_pipeline
+
+load_dotenv()
+
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+INGEST_MAX_QUEUED = int(os.getenv("INGEST_MAX_QUEUED", "100"))
+INGEST_SPOOL_DIR = Path(os.getenv("INGEST_SPOOL_DIR", "./ingest_jobs"))
+# A worker renews the lease on its jobs every third of this; a job whose lease
+# has expired is resumed by whichever worker claims it first
+INGEST_LEASE_SECONDS = int(os.getenv("INGEST_LEASE_SECONDS", "60"))
+PROGRESS_UPDATE_SECONDS = 0.5
+# How often a running job checks whether it was cancelled through another worker
+CANCEL_POLL_SECONDS = 1.0
+
+QUEUED, RUNNING, COMPLETED, FAILED, CANCELLED = "queued", "running", "completed", "failed", "cancelled"
+ACTIVE_STATES = (QUEUED, RUNNING)
+BULK = "bulk"
+
+
+class QueueFull(Exception):
+    """Raised when INGEST_MAX_QUEUED jobs are already waiting or running."""
+
+
+class JobManager:
+    """
+    Runs document ingestion in a bounded background worker pool.
+
+    Job state and progress live in the `ingest_jobs` Mongo collection and the
+    uploaded bytes are spooled to INGEST_SPOOL_DIR, so queued and interrupted
+    jobs are picked up again by resume_pending() after a restart. Bulk jobs
+    spool a directory of documents with a checkpoint next to it, so a resumed
+    bulk job skips the documents it had already ingested.
+
+    Each job is leased to the worker process running it ("owner" and
+    "lease_until"), which renews the lease from a heartbeat thread. With several
+    uvicorn workers, a job is resumed only once its lease has expired, by the
+    one worker whose atomic claim succeeds.
+    """
+
+    def __init__(self, workers: int, max_queued: int, spool_dir: Path, lease_seconds: int = INGEST_LEASE_SECONDS):
+        self.max_queued = max_queued
+        self.spool_dir = spool_dir
+        self.lease_seconds = lease_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ingest")
+        self._cancel_events: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._heartbeat: Optional[threading.Thread] = None
+
+    def _payload_path(self, job_id: str) -> Path:
+        return self.spool_dir / f"{job_id}.bin"
+
+    def _bulk_path(self, job_id: str) -> Path:
+        return self.spool_dir / job_id
+
+    def _update(self, job_id: str, **fields):
+        fields["updated_at"] = datetime.now()
+        ingest_jobs_collection.update_one({"_id": ObjectId(job_id)}, {"$set": fields})
+
+    def _reserve(self, job_id: str):
+        """
+        Takes one of the max_queued slots for a job, or raises QueueFull.
+        """
+        with self._lock:
+            if len(self._cancel_events) >= self.max_queued:
+                raise QueueFull()
+            self._cancel_events[job_id] = threading.Event()
+
+    def _release(self, job_id: str):
+        with self._lock:
+            self._cancel_events.pop(job_id, None)
+
+    def _lease(self) -> Dict[str, Any]:
+        return {"owner": self.owner, "lease_until": datetime.now() + timedelta(seconds=self.lease_seconds)}
+
+    def _start_heartbeat(self):
+        with self._lock:
+            if self._heartbeat is None:
+                self._heartbeat = threading.Thread(target=self._beat, name="ingest-heartbeat", daemon=True)
+                self._heartbeat.start()
+
+    def _beat(self):
+        """
+        Renews the leases of this worker's jobs and claims jobs whose owner stopped renewing theirs.
+        """
+        while not self._stopped.wait(self.lease_seconds / 3):
+            try:
+                with self._lock:
+                    ids = [ObjectId(job_id) for job_id in self._cancel_events]
+                if ids:
+                    ingest_jobs_collection.update_many(
+                        {"_id": {"$in": ids}, "owner": self.owner}, {"$set": {"lease_until": self._lease()["lease_until"]}}
+                    )
+                resumed = self.resume_pending()
+                if resumed:
+                    print(f"Resumed {resumed} ingestion job(s) whose worker stopped.")
+            except Exception as e:
+                print(f"Ingestion job heartbeat failed: {e}")
+
+    def spool_file(self) -> Path:
+        """
+        Returns a new empty file in the spool directory, to stream an upload into before submit.
+        """
+        self.spool_dir.mkdir(parents=True, exist_ok=True)
+        fd, name = tempfile.mkstemp(prefix="upload-", suffix=".part", dir=self.spool_dir)
+        os.close(fd)
+        return Path(name)
+
+    def submit(self, spooled: Path, filename: str, filetype: str, document_id: str) -> str:
+        """
+        Takes over a spooled document (see spool_file), records a queued job and schedules it.
+        Raises:
+            QueueFull: When max_queued jobs are already queued or running; the
+                spooled file is left to the caller.
+        Returns:
+            The job id.
+        """
+        job_id = ObjectId()
+        # Reserve the slot first, so concurrent uploads cannot overshoot it
+        self._reserve(str(job_id))
+        payload = self._payload_path(str(job_id))
+        try:
+            spooled.rename(payload)
+            self._insert(job_id, {
+                "filename": filename,
+                "filetype": filetype,
+                "document_id": document_id,
+                "progress": {
+                    "pages_total": 0,
+                    "pages_extracted": 0,
+                    "chunks_embedded": 0,
+                    "vectors_written": 0,
+                },
+            })
+        except BaseException:
+            self._release(str(job_id))
+            payload.unlink(missing_ok=True)
+            raise
+        self._executor.submit(self._run, str(job_id))
+        return str(job_id)
+
+    def _insert(self, job_id: ObjectId, fields: Dict[str, Any]):
+        now = datetime.now()
+        ingest_jobs_collection.insert_one({
+            "_id": job_id,
+            **fields,
+            "status": QUEUED,
+            "cancel_requested": False,
+            "result": None,
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+            **self._lease(),
+        })
+        self._start_heartbeat()
+
+    def staging_dir(self) -> Path:
+        """
+        Returns a new empty directory in the spool directory, to spool the files of a bulk job into.
+        """
+        self.spool_dir.mkdir(parents=True, exist_ok=True)
+        return Path(tempfile.mkdtemp(prefix="staging-", dir=self.spool_dir))
+
+    def submit_bulk(self, staging: Path, files: int) -> str:
+        """
+        Takes over a directory of spooled documents (see staging_dir), records a
+        queued bulk job for it and schedules it.
+        Raises:
+            QueueFull: When max_queued jobs are already queued or running; the
+                staging directory is left to the caller.
+        Returns:
+            The job id.
+        """
+        job_id = ObjectId()
+        self._reserve(str(job_id))
+        bulk_path = self._bulk_path(str(job_id))
+        try:
+            bulk_path.mkdir()
+            staging.rename(bulk_path / "files")
+            self._insert(job_id, {
+                "kind": BULK,
+                "progress": {
+                    "files_total": files,
+                    "files_done": 0,
+                    "files_skipped": 0,
+                    "files_duplicate": 0,
+                    "files_failed": 0,
+                    "pages_extracted": 0,
+                    "chunks_embedded": 0,
+                    "vectors_written": 0,
+                },
+            })
+        except BaseException:
+            self._release(str(job_id))
+            shutil.rmtree(bulk_path, ignore_errors=True)
+            raise
+        self._executor.submit(self._run, str(job_id))
+        return str(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = ingest_jobs_collection.find_one({"_id": ObjectId(job_id)})
+        if job:
+            job["id"] = str(job.pop("_id"))
+        return job
+
+    def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Asks a queued or running job to stop. A running job stops at the next
+        batch boundary, within CANCEL_POLL_SECONDS when another worker runs it;
+        vectors it has already written are kept.
+        """
+        result = ingest_jobs_collection.update_one(
+            {"_id": ObjectId(job_id), "status": {"$in": list(ACTIVE_STATES)}},
+            {"$set": {"cancel_requested": True, "updated_at": datetime.now()}},
+        )
+        if result.matched_count:
+            event = self._cancel_events.get(job_id)
+            if event:
+                event.set()
+        return self.get(job_id)
+
+    def resume_pending(self) -> int:
+        """
+        Claims and re-enqueues queued or running jobs whose worker stopped: jobs
+        with no owner, or whose lease has expired. The claim is a single atomic
+        update, so when several workers call this each job is resumed by one.
+        Returns:
+            The number of jobs resumed.
+        """
+        self._start_heartbeat()
+        resumed = 0
+        now = datetime.now()
+        orphaned = {"status": {"$in": list(ACTIVE_STATES)}, "$or": [{"owner": None}, {"lease_until": {"$lt": now}}]}
+        for job in ingest_jobs_collection.find(orphaned, {"_id": 1}):
+            job_id = str(job["_id"])
+            if job_id in self._cancel_events:
+                continue
+            try:
+                self._reserve(job_id)
+            except QueueFull:
+                break
+            claimed = ingest_jobs_collection.find_one_and_update(
+                {"_id": job["_id"], **orphaned},
+                {"$set": {"status": QUEUED, "updated_at": now, **self._lease()}},
+            )
+            if claimed is None:
+                # Another worker claimed it first
+                self._release(job_id)
+                continue
+            self._executor.submit(self._run, job_id)
+            resumed += 1
+        return resumed
+
+    def shutdown(self):
+        """
+        Stops taking work and gives up the leases of unfinished jobs, so another
+        worker resumes them without waiting for the leases to expire.
+        """
+        self._stopped.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            ids = [ObjectId(job_id) for job_id in self._cancel_events]
+        if ids:
+            try:
+                ingest_jobs_collection.update_many({"_id": {"$in": ids}, "owner": self.owner}, {"$set": {"owner": None}})
+            except Exception as e:
+                print(f"Could not release the leases of {len(ids)} ingestion job(s): {e}")
+
+    def _run(self, job_id: str):
+        event = self._cancel_events[job_id]
+        payload = self._payload_path(job_id)
+        bulk_path = self._bulk_path(job_id)
+        try:
+            job = ingest_jobs_collection.find_one({"_id": ObjectId(job_id)})
+            if job is None:
+                return
+            if job.get("cancel_requested") or event.is_set():
+                raise IngestionCancelled()
+            if not (bulk_path if job.get("kind") == BULK else payload).exists():
+                raise FileNotFoundError(f"Spooled upload for job {job_id} is missing.")
+            self._update(job_id, status=RUNNING, started_at=datetime.now())
+
+            last_update = 0.0
+
+            def on_progress(progress):
+                nonlocal last_update
+                # Throttle progress writes; the final counters are written with the result
+                now = time.monotonic()
+                if now - last_update >= PROGRESS_UPDATE_SECONDS:
+                    last_update = now
+                    self._update(job_id, **{f"progress.{key}": value for key, value in progress.items()})
+
+            last_poll = time.monotonic()
+
+            def should_cancel():
+                nonlocal last_poll
+                # cancel() only sets the event in the worker that served it; poll for the others
+                now = time.monotonic()
+                if not event.is_set() and now - last_poll >= CANCEL_POLL_SECONDS:
+                    last_poll = now
+                    try:
+                        polled = ingest_jobs_collection.find_one({"_id": ObjectId(job_id)}, {"cancel_requested": 1})
+                    except Exception as e:
+                        print(f"Could not check job {job_id} for cancellation: {e}")
+                        polled = None
+                    if polled and polled.get("cancel_requested"):
+                        event.set()
+                return event.is_set()
+
+            if job.get("kind") == BULK:
+                checkpoint = BulkCheckpoint(str(bulk_path / "checkpoint.sqlite3"))
+                try:
+                    stats = run_bulk_ingestion(
+                        iter_directory(bulk_path / "files"),
+                        checkpoint,
+                        on_progress=on_progress,
+                        should_cancel=should_cancel,
+                    )
+                finally:
+                    checkpoint.close()
+                self._update(job_id, status=COMPLETED, result=stats, finished_at=datetime.now(), **{
+                    f"progress.{key}": stats[key] for key in job["progress"]
+                })
+                return
+
+            stats = run_ingestion_pipeline(
+                payload,
+                job["filetype"],
+                document_id=job["document_id"],
+                filename=job["filename"],
+                on_progress=on_progress,
+                should_cancel=should_cancel,
+            )
+            self._update(job_id, status=COMPLETED, result=stats, finished_at=datetime.now(), **{
+                "progress.pages_total": stats["pages_changed"],
+                "progress.pages_extracted": stats["pages_changed"],
+                "progress.chunks_embedded": stats["chunks"],
+                "progress.vectors_written": stats["chunks"],
+            })
+        except IngestionCancelled:
+            self._update(job_id, status=CANCELLED, finished_at=datetime.now())
+        except Exception as e:
+            traceback.print_exc()
+            self._update(job_id, status=FAILED, error=str(e), finished_at=datetime.now())
+        finally:
+            self._release(job_id)
+            if payload.exists():
+                payload.unlink()
+            shutil.rmtree(bulk_path, ignore_errors=True)
+
+
+job_manager = JobManager(INGEST_WORKERS, INGEST_MAX_QUEUED, INGEST_SPOOL_DIR)
@@ -0,0 +1,134 @@
+import time
+
+# Imported first by main.py, so this marks the start of the app import.
+IMPORT_STARTED = time.perf_counter()
+
+import asyncio
+import os
+import traceback
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from dotenv import load_dotenv
+
+from app.db import mongo
+from app.db.vector_store import async_vector_store
+from app.model.model import get_clients, get_model, get_tokenizer, model_loaded
+from app.Function.concurrency import run_cpu, run_io
+from app.Function.crud_operations import ensure_indexes, migrate_embedded_messages
+from app.Function.jobs import job_manager
+
+load_dotenv()
+
+# Time allowed to each dependency check of /readyz
+READINESS_TIMEOUT_SECONDS = float(os.getenv("READINESS_TIMEOUT_SECONDS", "2"))
+# Delay before a failed startup step (e.g. MongoDB not up yet) is tried again
+STARTUP_RETRY_SECONDS = float(os.getenv("STARTUP_RETRY_SECONDS", "5"))
+
+
+def _warmup() -> None:
+    # Loads the weights and runs one forward pass, so the first request does not pay for either
+    get_tokenizer()("warmup", add_special_tokens=False)
+    get_model().encode(["warmup"], show_progress_bar=False)
+
+
+class Lifecycle:
+    """
+    Startup sequence and readiness of the backend.
+
+    The server accepts connections as soon as the app is imported; the model
+    warmup and MongoDB setup run in the background, and /readyz reports ready
+    once they have finished and every dependency answers.
+    """
+
+    def __init__(self):
+        self.import_seconds: Optional[float] = None
+        self.ready_seconds: Optional[float] = None
+        self.steps: Dict[str, float] = {}
+        self.errors: Dict[str, str] = {}
+
+    @property
+    def started(self) -> bool:
+        return self.ready_seconds is not None
+
+    async def _step(self, name: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        # Retries until the step succeeds; the last error is reported by /readyz meanwhile
+        while True:
+            started = time.perf_counter()
+            try:
+                result = await fn()
+            except Exception as e:
+                traceback.print_exc()
+                self.errors[name] = str(e) or type(e).__name__
+                print(f"Startup step '{name}' failed, retrying in {STARTUP_RETRY_SECONDS}s: {e}")
+                await asyncio.sleep(STARTUP_RETRY_SECONDS)
+                continue
+            self.errors.pop(name, None)
+            self.steps[name] = round(time.perf_counter() - started, 3)
+            return result
+
+    async def _prepare_mongo(self) -> None:
+        await mongo.ping()
+        await ensure_indexes()
+        migrated = await migrate_embedded_messages()
+        if migrated:
+            print(f"Moved the messages of {migrated} conversation(s) into the chat_messages collection.")
+        resumed = await run_io(job_manager.resume_pending)
+        if resumed:
+            print(f"Resumed {resumed} ingestion job(s) interrupted by the last shutdown.")
+
+    async def startup(self) -> None:
+        """
+        Warms up the embedding model and prepares MongoDB, concurrently. Run as a
+        background task from the app lifespan.
+        """
+        self.import_seconds = round(time.perf_counter() - IMPORT_STARTED, 3)
+        await asyncio.gather(
+            self._step("model", lambda: run_cpu(_warmup)),
+            self._step("mongo", self._prepare_mongo),
+        )
+        self.ready_seconds = round(time.perf_counter() - IMPORT_STARTED, 3)
+        print(f"Backend ready {self.ready_seconds}s after import started (import {self.import_seconds}s, startup steps {self.steps}).")
+
+    async def _check(self, check: Callable[[], Awaitable[Any]]) -> Dict[str, Any]:
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(check(), READINESS_TIMEOUT_SECONDS)
+        except Exception as e:
+            return {"status": "error", "error": str(e) or type(e).__name__}
+        return {"status": "ok", "latency_ms": round((time.perf_counter() - started) * 1000, 1)}
+
+    async def _check_model(self) -> None:
+        if not model_loaded() or "model" not in self.steps:
+            raise RuntimeError(self.errors.get("model", "warming up"))
+
+    async def _check_llm(self) -> None:
+        # Only checks the client is configured; a completion would cost a paid request
+        get_clients()
+
+    async def readiness(self) -> Dict[str, Any]:
+        """
+        Checks each dependency separately.
+        Returns:
+            {"ready": bool, "dependencies": {name: {"status", ...}}, timings in seconds}.
+        """
+        names = ["model", "mongo", "vector_store", "llm"]
+        results = await asyncio.gather(
+            self._check(self._check_model),
+            self._check(mongo.ping),
+            self._check(async_vector_store.ping),
+            self._check(self._check_llm),
+        )
+        dependencies = dict(zip(names, results))
+        if dependencies["mongo"]["status"] == "ok" and "mongo" not in self.steps:
+            # Reachable, but indexes, migration or job resumption are not done yet
+            dependencies["mongo"] = {"status": "starting", "error": self.errors.get("mongo", "preparing collections")}
+        return {
+            "ready": self.started and all(d["status"] == "ok" for d in dependencies.values()),
+            "dependencies": dependencies,
+            "import_seconds": self.import_seconds,
+            "ready_seconds": self.ready_seconds,
+            "startup_steps": self.steps,
+        }
+
+
+lifecycle = Lifecycle()
@@ -0,0 +1,189 @@
+import os
+import random
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+from dotenv import load_dotenv
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+
+from app.Function.concurrency import run_io
+
+load_dotenv()
+
+# Requests slower than this are saved as a profile; 0 disables the profiler.
+PROFILE_SLOW_REQUESTS_MS = float(os.getenv("PROFILE_SLOW_REQUESTS_MS", "0"))
+# Fraction of requests run under the sampling profiler while it is enabled.
+# Only those can be saved when slow, so this trades overhead for coverage.
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0.1"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+# Set for multi-worker servers (uvicorn --workers N) so /metrics sums all workers
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+# From sub-millisecond cache and tokenizer work up to a slow LLM completion
+_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+STAGE_SECONDS = Histogram(
+    "rag_stage_seconds",
+    "Time spent in one stage of ingestion or retrieval: extract, chunk, tokenize, embed, "
+    "query_embed, vector_upsert, vector_query, llm, llm_first_token, mongo_read, mongo_write",
+    ["stage"],
+    buckets=_BUCKETS,
+)
+REQUEST_SECONDS = Histogram(
+    "rag_request_seconds",
+    "HTTP request latency by route and status code",
+    ["method", "route", "status"],
+    buckets=_BUCKETS,
+)
+REQUESTS_IN_FLIGHT = Gauge("rag_requests_in_flight", "HTTP requests being served", multiprocess_mode="livesum")
+LLM_CALLS_IN_FLIGHT = Gauge("rag_llm_calls_in_flight", "LLM completions awaiting their answer", multiprocess_mode="livesum")
+LLM_RETRIES = Counter("rag_llm_retries_total", "LLM completions retried, by the transient error that failed them", ["error"])
+LLM_HEDGES = Counter("rag_llm_hedges_total", "Hedged LLM requests: sent, and won (answered before the original)", ["outcome"])
+TOKENS = Counter(
+    "rag_tokens_total",
+    "Tokens processed: chunked (ingested chunk tokens), context (chunk tokens put into prompts), prompt (whole prompts); counted with the embedding tokenizer, so approximate for the LLM",
+    ["kind"],
+)
+CHUNKS = Counter(
+    "rag_chunks_total",
+    "Chunks processed: created, embedded (by the model), cache_hit (embedding cache), upserted, retrieved (put into prompts)",
+    ["kind"],
+)
+
+# Stage durations of the request being served, for its Server-Timing header.
+# None outside a request, e.g. in ingestion jobs.
+_request_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_timings", default=None)
+
+
+def observe(stage: str, seconds: float) -> None:
+    """
+    Records the duration of one stage in its histogram and in the current request's timings.
+    """
+    STAGE_SECONDS.labels(stage).observe(seconds)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def timed(stage: str):
+    """
+    Times the enclosed block as `stage`. Works around awaits too, as long as
+    the block starts and ends in the same task.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - started)
+
+
+def timed_iter(stage: str, items: Iterable) -> Iterator:
+    """
+    Yields from `items`, timing the production of each item as `stage` (e.g.
+    extracting each page of a lazily extracted document).
+    """
+    iterator = iter(items)
+    while True:
+        started = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        observe(stage, time.perf_counter() - started)
+        yield item
+
+
+def server_timing(timings: Dict[str, float], total: float) -> str:
+    """
+    Formats stage durations as a Server-Timing header value, in milliseconds.
+    """
+    entries = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items()]
+    entries.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(entries)
+
+
+def metrics_payload() -> Tuple[bytes, str]:
+    """
+    Returns the Prometheus exposition of all metrics and its content type.
+    """
+    registry = REGISTRY
+    if PROMETHEUS_MULTIPROC_DIR:
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def _start_profiler():
+    if not PROFILE_SLOW_REQUESTS_MS or random.random() >= PROFILE_SAMPLE_RATE:
+        return None
+    from pyinstrument import Profiler  # Optional; only needed with PROFILE_SLOW_REQUESTS_MS set
+
+    # async_mode="enabled" attributes time awaited by this request to this request only
+    profiler = Profiler(async_mode="enabled")
+    profiler.start()
+    return profiler
+
+
+def _save_profile(profiler, method: str, route: str, elapsed_ms: float) -> Path:
+    slug = re.sub(r"[^A-Za-z0-9]+", "_", route).strip("_") or "root"
+    path = Path(PROFILE_DIR) / f"{datetime.now():%Y%m%d-%H%M%S-%f}_{method}_{slug}_{elapsed_ms:.0f}ms.html"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(profiler.output_html(), encoding="utf-8")
+    return path
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware that times every HTTP request, tracks requests in flight,
+    and adds a Server-Timing header listing the stages timed while the request
+    ran. For streaming responses the header is sent before the body, so it
+    covers the work done before the first byte.
+
+    With PROFILE_SLOW_REQUESTS_MS set, a sample of requests runs under a
+    sampling profiler and those slower than the threshold are saved as HTML
+    reports in PROFILE_DIR.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings: Dict[str, float] = {}
+        token = _request_timings.set(timings)
+        profiler = _start_profiler()
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                header = server_timing(timings, time.perf_counter() - started)
+                message = {**message, "headers": [*message.get("headers", []), (b"server-timing", header.encode("latin-1"))]}
+            await send(message)
+
+        try:
+            with REQUESTS_IN_FLIGHT.track_inprogress():
+                await self.app(scope, receive, send_with_timing)
+        finally:
+            elapsed = time.perf_counter() - started
+            _request_timings.reset(token)
+            # The router leaves the matched route in the scope; use its template so /jobs/{job_id} is one series
+            route = getattr(scope.get("route"), "path", "unmatched")
+            REQUEST_SECONDS.labels(scope["method"], route, str(status)).observe(elapsed)
+            if profiler is not None:
+                profiler.stop()
+                if elapsed * 1000 >= PROFILE_SLOW_REQUESTS_MS:
+                    path = await run_io(_save_profile, profiler, scope["method"], route, elapsed * 1000)
+                    print(f"Slow request {scope['method']} {scope['path']} took {elapsed * 1000:.0f} ms; profile saved to {path}")
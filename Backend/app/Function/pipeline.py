@@ -0,0 +1,200 @@
+import os
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from dotenv import load_dotenv
+
+from app.db.vector_store import vector_store
+from app.Function.caching import invalidate_retrieval_cache
+from app.Function.chunking import (
+    EMBED_BATCH_SIZE,
+    IngestionCancelled,
+    chunk_document,
+    embed_batch,
+    upsert_batch,
+)
+from app.Function.documents import (
+    delete_vectors,
+    document_id_for,
+    get_manifest,
+    save_manifest,
+    stale_vector_ids,
+    vector_id,
+)
+from app.Function.extraction import DocumentSource, iter_pages, page_fingerprints
+from app.Function.metrics import timed_iter
+
+load_dotenv()
+
+# Items buffered between two pipeline stages. Together with the embedding batch
+# size this bounds how much of a document is in memory at once.
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "4"))
+
+_DONE = object()
+
+
+class _Failure:
+    def __init__(self, exc: BaseException):
+        self.exc = exc
+
+
+def _put(q: queue.Queue, item, stop: threading.Event) -> bool:
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _stage(upstream: Iterable, stop: threading.Event, maxsize: int = PIPELINE_QUEUE_SIZE) -> Iterator:
+    """
+    Runs `upstream` on its own thread and yields its items through a bounded
+    queue, so the producer works ahead of the consumer by at most `maxsize`
+    items. Exceptions raised upstream are re-raised in the consumer; setting
+    `stop` makes the producer give up.
+    """
+    q: queue.Queue = queue.Queue(maxsize=maxsize)
+
+    def produce():
+        try:
+            for item in upstream:
+                if not _put(q, item, stop):
+                    return
+            _put(q, _DONE, stop)
+        except BaseException as e:
+            _put(q, _Failure(e), stop)
+
+    threading.Thread(target=produce, daemon=True).start()
+    while True:
+        item = q.get()
+        if item is _DONE:
+            return
+        if isinstance(item, _Failure):
+            raise item.exc
+        yield item
+
+
+def _batches(items: Iterable, size: int) -> Iterator[List]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def run_ingestion_pipeline(
+    source: DocumentSource,
+    filetype: Optional[str] = None,
+    document_id: Optional[str] = None,
+    filename: Optional[str] = None,
+    batch_size: int = EMBED_BATCH_SIZE,
+    on_progress: Optional[Callable[[Dict[str, int]], None]] = None,
+    should_cancel: Optional[Callable[[], bool]] = None,
+) -> Dict[str, Any]:
+    """
+    Ingests a document as a stream: pages flow into the splitter, chunks into
+    batched embedding, and embeddings into the vector store, each stage on its
+    own thread with a bounded queue in between. Memory stays bounded for any
+    document size, and the first vectors are written after roughly one page of
+    work instead of after the whole file has been extracted and chunked.
+
+    Ingestion is incremental per document: pages are fingerprinted first and
+    only pages whose fingerprint changed since the last upload of the same
+    document_id are extracted and embedded. Vectors left over from chunks or
+    pages that no longer exist are deleted. Chunks never span pages, so a page's
+    vectors depend on that page alone; they are stored as
+    "{document_id}:{page}:{chunk}" with document_id, page and chunk in metadata.
+    Args:
+        document_id: Identity of the document; defaults to one derived from filename.
+        on_progress: Called after every upserted batch with a snapshot of the
+            pages_total, pages_extracted, chunks_embedded and vectors_written counters.
+        should_cancel: Polled between batches; raises IngestionCancelled when it returns True.
+    Returns:
+        Ingestion stats including throughput and time to first vector written.
+    """
+    started = time.perf_counter()
+    filename = filename or "document"
+    document_id = document_id or document_id_for(filename)
+
+    fingerprints = page_fingerprints(source, filetype)
+    old_pages = (get_manifest(document_id) or {}).get("pages", {})
+    changed = [n for n, fp in enumerate(fingerprints, start=1) if old_pages.get(str(n), {}).get("fingerprint") != fp]
+    removed = [int(n) for n in old_pages if int(n) > len(fingerprints)]
+
+    stop = threading.Event()
+    progress = {"pages_total": len(changed), "pages_extracted": 0, "chunks_embedded": 0, "vectors_written": 0}
+    chunk_counts: Dict[int, int] = {}
+    cache_hits = 0
+    first_vector_seconds = None
+
+    def on_page(done, total):
+        progress["pages_extracted"] = done
+
+    def page_chunks():
+        for page in timed_iter("extract", iter_pages(source, filetype, on_page=on_page, page_numbers=changed)):
+            chunks = chunk_document(page.text)
+            chunk_counts[page.number] = len(chunks)
+            for ordinal, chunk in enumerate(chunks):
+                meta = {"document_id": document_id, "page": page.number, "chunk": ordinal}
+                yield vector_id(document_id, page.number, ordinal), chunk, meta
+
+    def embedded_batches():
+        nonlocal cache_hits
+        for batch in _batches(_stage(page_chunks(), stop), batch_size):
+            ids, chunks, metadata = (list(column) for column in zip(*batch))
+            _, vectors, hits = embed_batch(chunks, batch_size)
+            cache_hits += hits
+            progress["chunks_embedded"] += len(batch)
+            yield ids, chunks, vectors, metadata
+
+    try:
+        for ids, chunks, vectors, metadata in _stage(embedded_batches(), stop):
+            if should_cancel and should_cancel():
+                raise IngestionCancelled()
+            progress["vectors_written"] += upsert_batch(ids, chunks, vectors, metadata)
+            if first_vector_seconds is None:
+                first_vector_seconds = time.perf_counter() - started
+            if on_progress:
+                on_progress(dict(progress))
+
+        stale = stale_vector_ids(document_id, old_pages, {**chunk_counts, **{n: 0 for n in removed}})
+        delete_vectors(stale)
+        save_manifest(document_id, filename, {
+            str(n): {
+                "fingerprint": fp,
+                "chunks": chunk_counts[n] if n in chunk_counts else old_pages[str(n)]["chunks"],
+            }
+            for n, fp in enumerate(fingerprints, start=1)
+        })
+    finally:
+        stop.set()
+        vector_store.flush()
+        invalidate_retrieval_cache()
+
+    elapsed = time.perf_counter() - started
+    stats = {
+        "document_id": document_id,
+        "pages": len(fingerprints),
+        "pages_changed": len(changed),
+        "pages_removed": len(removed),
+        "chunks": progress["vectors_written"],
+        "stale_vectors_deleted": len(stale),
+        "cache_hits": cache_hits,
+        "seconds": round(elapsed, 3),
+        "first_vector_seconds": round(first_vector_seconds, 3) if first_vector_seconds is not None else None,
+        "pages_per_sec": round(progress["pages_extracted"] / elapsed, 1) if elapsed > 0 else 0.0,
+        "chunks_per_sec": round(progress["vectors_written"] / elapsed, 1) if elapsed > 0 else 0.0,
+    }
+    print(
+        f"Ingested document {document_id}: {len(changed)}/{len(fingerprints)} pages changed, "
+        f"{stats['chunks']} chunks ({cache_hits} from cache), {len(stale)} stale vectors deleted in "
+        f"{stats['seconds']}s, first vector after {stats['first_vector_seconds']}s ({stats['chunks_per_sec']} chunks/sec)"
+    )
+    return stats
@@ -0,0 +1,136 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import Dict, List, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+
+from app.model.model import embedding_model_id
+
+load_dotenv()
+
+
+def normalize_text(text: str) -> str:
+    """
+    Canonical form of a chunk for hashing: NFKC-normalized with runs of
+    whitespace collapsed, so trivially re-flowed text maps to the same key.
+    """
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+def content_key(text: str, model_name: Optional[str] = None) -> str:
+    """
+    Content address of a chunk: sha256 of the model (and embedding backend) and the normalized text.
+    It keys the cache only; vector ids are "{document_id}:{page}:{chunk}" (see documents.vector_id).
+    model_name defaults to the currently configured embedding model.
+    """
+    if model_name is None:
+        model_name = embedding_model_id()
+    return hashlib.sha256(f"{model_name}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Persistent content-addressed embedding cache in a single SQLite file.
+    Vectors are stored as raw float32 bytes. When the cache grows past
+    max_entries, the least recently used entries are evicted.
+
+    Hits do not write to SQLite: their last_used times are buffered in
+    memory and flushed in one batch every TOUCH_BATCH hits, every
+    TOUCH_INTERVAL seconds, or before an eviction.
+    """
+
+    TOUCH_BATCH = 1000
+    TOUCH_INTERVAL = 30.0
+
+    def __init__(self, path: str, max_entries: int):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._touched: Dict[str, float] = {}
+        self._last_flush = time.monotonic()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self._count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def __len__(self):
+        return self._count
+
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        """
+        Returns the cached vectors for whichever of `keys` are present.
+        """
+        if not keys:
+            return {}
+        unique = list(dict.fromkeys(keys))
+        found: Dict[str, np.ndarray] = {}
+        with self._lock:
+            # Stay under SQLite's bound-parameter limit
+            for start in range(0, len(unique), 500):
+                part = unique[start:start + 500]
+                placeholders = ",".join("?" * len(part))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", part
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+            if found:
+                now = time.time()
+                for key in found:
+                    self._touched[key] = now
+                if len(self._touched) >= self.TOUCH_BATCH or time.monotonic() - self._last_flush >= self.TOUCH_INTERVAL:
+                    self._flush_touched()
+                    self._conn.commit()
+        return found
+
+    def _flush_touched(self) -> None:
+        """
+        Writes the buffered last_used times. The caller holds the lock and commits.
+        """
+        if self._touched:
+            self._conn.executemany(
+                "UPDATE embeddings SET last_used = ? WHERE key = ?", [(t, k) for k, t in self._touched.items()]
+            )
+            self._touched.clear()
+        self._last_flush = time.monotonic()
+
+    def put_many(self, entries: Dict[str, np.ndarray]) -> None:
+        if not entries:
+            return
+        now = time.time()
+        rows = [(k, np.asarray(v, dtype=np.float32).tobytes(), now) for k, v in entries.items()]
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.executemany("INSERT OR IGNORE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)", rows)
+            self._count += self._conn.total_changes - before
+            if self._count > self.max_entries:
+                # Evict by up-to-date recency
+                self._flush_touched()
+                overflow = self._count - self.max_entries
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (overflow,),
+                )
+                self._count -= overflow
+            self._conn.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM embeddings")
+            self._conn.commit()
+            self._touched.clear()
+            self._count = 0
+
+
+embedding_cache = EmbeddingCache(
+    os.getenv("EMBEDDING_CACHE_PATH", "./embedding_cache.sqlite3"),
+    max_entries=int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000")),
+)
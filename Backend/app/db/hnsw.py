@@ -0,0 +1,429 @@
+import math
+import pickle
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+class HNSWIndex:
+    """
+    Hierarchical Navigable Small World graph (Malkov & Yashunin) over
+    L2-normalized float32 vectors, using cosine distance (1 - dot product).
+
+    Labels are the insertion order of the vectors. Deletes are tombstones: the
+    node stays in the graph for navigation but is never returned.
+
+    Layer-0 links live in one int32 matrix and visited nodes are tracked with
+    per-search stamps, so searches expand several nodes per step with a few
+    numpy operations instead of looping over neighbours in Python.
+
+    Knobs:
+        M: links per node on the upper layers (2 * M on layer 0).
+        ef_construction: candidate list size while inserting; higher gives
+            better recall at the cost of slower inserts.
+        ef_search: candidate list size while querying; higher gives better
+            recall at the cost of query latency.
+    """
+
+    # Candidates expanded together in one search step
+    EXPAND_BATCH = 16
+
+    def __init__(self, dim: int, M: int = 16, ef_construction: int = 200, ef_search: int = 64, seed: int = 42):
+        self.dim = dim
+        self.M = M
+        self.M0 = 2 * M
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self._level_mult = 1 / math.log(M)
+        self._rng = np.random.default_rng(seed)
+        self._size = 0
+        self._vectors = np.empty((0, dim), dtype=np.float32)
+        self._links0 = np.empty((0, self.M0), dtype=np.int32)
+        self._counts0 = np.empty(0, dtype=np.int32)
+        # Links of the few nodes above layer 0: label -> [links on layer 1, layer 2, ...]
+        self._upper: Dict[int, List[List[int]]] = {}
+        self._visited = np.empty(0, dtype=np.uint32)
+        self._visit_stamp = 0
+        self._scratch = np.empty(0, dtype=np.int32)
+        self._tombstones = np.empty(0, dtype=bool)
+        self.entry_point: Optional[int] = None
+        self.max_level = -1
+        self.deleted = set()
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def live_count(self) -> int:
+        return self._size - len(self.deleted)
+
+    def vector(self, label: int) -> np.ndarray:
+        return self._vectors[label]
+
+    def _reserve(self, rows: int):
+        """
+        Makes room for `rows` more nodes, growing every per-node array
+        geometrically and copying memory-mapped vectors into RAM before the first write.
+        """
+        needed = self._size + rows
+        if not isinstance(self._vectors, np.memmap) and self._vectors.shape[0] >= needed:
+            return
+        capacity = max(needed, 2 * self._vectors.shape[0], 1024)
+
+        def grow(array, fill, shape=()):
+            grown = np.full((capacity,) + shape, fill, dtype=array.dtype)
+            grown[:self._size] = array[:self._size]
+            return grown
+
+        self._vectors = grow(self._vectors, 0, (self.dim,))
+        self._links0 = grow(self._links0, -1, (self.M0,))
+        self._counts0 = grow(self._counts0, 0)
+        self._visited = grow(self._visited, 0)
+        self._scratch = grow(self._scratch, 0)
+        self._tombstones = grow(self._tombstones, False)
+
+    def _neighbors(self, node: int, level: int) -> np.ndarray:
+        if level == 0:
+            return self._links0[node, :self._counts0[node]]
+        return np.asarray(self._upper[node][level - 1], dtype=np.int32)
+
+    def _set_neighbors(self, node: int, level: int, neighbors: np.ndarray):
+        if level == 0:
+            self._links0[node, :len(neighbors)] = neighbors
+            self._counts0[node] = len(neighbors)
+        else:
+            self._upper[node][level - 1] = [int(n) for n in neighbors]
+
+    def _gather(self, nodes: np.ndarray, level: int) -> np.ndarray:
+        """
+        The neighbours of several nodes on one layer, as one array.
+        """
+        if level == 0:
+            links = self._links0[nodes].ravel()
+            return links[links >= 0]
+        return np.asarray([n for node in nodes.tolist() for n in self._upper[node][level - 1]], dtype=np.int32)
+
+    def _search_layer(self, q: np.ndarray, entry_points: List[int], ef: int, level: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Best-first search on one layer, expanding the EXPAND_BATCH closest
+        unexpanded candidates per step: their neighbours are gathered, filtered
+        and scored together, which keeps the number of Python-level steps close
+        to the number of hops rather than the number of nodes visited.
+        Returns:
+            Up to ef distances and labels as arrays, closest first.
+        """
+        self._visit_stamp += 1
+        if self._visit_stamp == np.iinfo(np.uint32).max:
+            self._visited[:] = 0
+            self._visit_stamp = 1
+        stamp = self._visit_stamp
+
+        labels = np.unique(np.asarray(entry_points, dtype=np.int32))
+        self._visited[labels] = stamp
+        dists = 1.0 - self._vectors[labels] @ q
+        cand_dists, cand_labels = dists, labels
+        if len(dists) > ef:
+            keep = np.argpartition(dists, ef - 1)[:ef]
+            dists, labels = dists[keep], labels[keep]
+        worst = float(dists.max()) if len(dists) >= ef else math.inf
+
+        batch = max(self.EXPAND_BATCH, ef // 8)
+        while len(cand_labels):
+            if len(cand_labels) > batch:
+                nearest = np.argpartition(cand_dists, batch - 1)[:batch]
+            else:
+                nearest = np.arange(len(cand_labels))
+            nearest = nearest[cand_dists[nearest] <= worst]
+            if not len(nearest):
+                break
+            nodes = cand_labels[nearest]
+            remaining = np.ones(len(cand_labels), dtype=bool)
+            remaining[nearest] = False
+            cand_dists, cand_labels = cand_dists[remaining], cand_labels[remaining]
+
+            neighbors = self._gather(nodes, level)
+            neighbors = neighbors[self._visited[neighbors] != stamp]
+            if not len(neighbors):
+                continue
+            # A node reached from several expanded nodes is scored once
+            positions = np.arange(len(neighbors), dtype=np.int32)
+            self._scratch[neighbors] = positions
+            neighbors = neighbors[self._scratch[neighbors] == positions]
+            self._visited[neighbors] = stamp
+            nd = 1.0 - self._vectors[neighbors] @ q
+            closer = nd < worst
+            nd, neighbors = nd[closer], neighbors[closer]
+            if not len(nd):
+                continue
+            dists, labels = np.concatenate((dists, nd)), np.concatenate((labels, neighbors))
+            if len(dists) > ef:
+                keep = np.argpartition(dists, ef - 1)[:ef]
+                dists, labels = dists[keep], labels[keep]
+            if len(dists) >= ef:
+                worst = float(dists.max())
+            promising = nd <= worst
+            cand_dists = np.concatenate((cand_dists, nd[promising]))
+            cand_labels = np.concatenate((cand_labels, neighbors[promising]))
+
+        order = np.argsort(dists)
+        return dists[order], labels[order]
+
+    def _select_neighbors(self, dists: np.ndarray, labels: np.ndarray, m: int) -> np.ndarray:
+        """
+        Neighbour selection heuristic: going through the candidates closest
+        first, keep one only if it is closer to the base point than to any
+        neighbour already kept, which preserves links into distinct clusters.
+        Pruned candidates backfill the list up to m.
+        Args:
+            dists, labels: Candidates and their distances to the base point, closest first.
+        """
+        if len(labels) <= m:
+            return labels
+        vectors = self._vectors[labels]
+        # blocks[j] has bit i set when candidate i is at least as close to
+        # candidate j as to the base point, i.e. j being kept prunes i
+        blocks = np.packbits((1.0 - vectors @ vectors.T) <= dists[None, :], axis=1, bitorder="little")
+        selected, pruned = [], []
+        blocked = 0
+        for i in range(len(labels)):
+            if blocked >> i & 1:
+                pruned.append(i)
+                continue
+            selected.append(i)
+            if len(selected) == m:
+                break
+            blocked |= int.from_bytes(blocks[i].tobytes(), "little")
+        return labels[selected + pruned[:m - len(selected)]]
+
+    def add(self, vector: np.ndarray) -> int:
+        """
+        Inserts one normalized vector and returns its label.
+        """
+        label = self._size
+        level = int(-math.log(1.0 - self._rng.random()) * self._level_mult)
+        self._reserve(1)
+        self._size += 1
+        self._vectors[label] = vector
+        if level > 0:
+            self._upper[label] = [[] for _ in range(level)]
+
+        if self.entry_point is None:
+            self.entry_point, self.max_level = label, level
+            return label
+
+        q = self._vectors[label]
+        entry = [self.entry_point]
+        for lc in range(self.max_level, level, -1):
+            entry = [int(self._search_layer(q, entry, 1, lc)[1][0])]
+
+        for lc in range(min(level, self.max_level), -1, -1):
+            dists, found = self._search_layer(q, entry, self.ef_construction, lc)
+            neighbors = self._select_neighbors(dists, found, self.M)
+            self._set_neighbors(label, lc, neighbors)
+            m_max = self.M0 if lc == 0 else self.M
+            for n in neighbors.tolist():
+                links = self._neighbors(n, lc)
+                if len(links) < m_max:
+                    self._set_neighbors(n, lc, np.append(links, label))
+                    continue
+                links = np.append(links, label)
+                link_dists = 1.0 - self._vectors[links] @ self._vectors[n]
+                order = np.argsort(link_dists)
+                self._set_neighbors(n, lc, self._select_neighbors(link_dists[order], links[order], m_max))
+            entry = found.tolist()
+
+        if level > self.max_level:
+            self.entry_point, self.max_level = label, level
+        return label
+
+    def add_many(self, vectors: np.ndarray) -> List[int]:
+        """
+        Inserts normalized vectors in order and returns their labels.
+        """
+        self._reserve(len(vectors))
+        return [self.add(vector) for vector in vectors]
+
+    def mark_deleted(self, label: int):
+        self.deleted.add(label)
+        self._tombstones[label] = True
+
+    def search(self, q: np.ndarray, k: int, ef: Optional[int] = None) -> List[Tuple[float, int]]:
+        """
+        Returns up to k (distance, label) pairs for live vectors, closest first.
+        """
+        if self.entry_point is None or k <= 0:
+            return []
+        ef = max(ef or self.ef_search, k)
+        entry = [self.entry_point]
+        for lc in range(self.max_level, 0, -1):
+            entry = [int(self._search_layer(q, entry, 1, lc)[1][0])]
+        while True:
+            dists, found = self._search_layer(q, entry, ef, 0)
+            live = ~self._tombstones[found]
+            # Tombstones can crowd live vectors out of the candidate list; widen and retry
+            if live.sum() >= k or ef >= self._size:
+                return list(zip(dists[live][:k].tolist(), found[live][:k].tolist()))
+            ef = min(2 * ef, self._size)
+
+    def save(self, path: Path):
+        path.mkdir(parents=True, exist_ok=True)
+        tmp = path / "hnsw_vectors.tmp.npy"
+        np.save(tmp, np.ascontiguousarray(self._vectors[:self._size]))
+        tmp.replace(path / "hnsw_vectors.npy")
+        graph = {
+            "dim": self.dim,
+            "M": self.M,
+            "ef_construction": self.ef_construction,
+            "links0": self._links0[:self._size].copy(),
+            "counts0": self._counts0[:self._size].copy(),
+            "upper": self._upper,
+            "entry_point": self.entry_point,
+            "max_level": self.max_level,
+            "deleted": self.deleted,
+        }
+        tmp = path / "hnsw_graph.tmp.pkl"
+        with open(tmp, "wb") as f:
+            pickle.dump(graph, f, protocol=pickle.HIGHEST_PROTOCOL)
+        tmp.replace(path / "hnsw_graph.pkl")
+
+    @classmethod
+    def load(cls, path: Path, ef_search: int = 64) -> Optional["HNSWIndex"]:
+        """
+        Reloads a saved graph, memory-mapping its vectors. Returns None if nothing was saved.
+        A graph saved in another format is rebuilt from the saved vectors.
+        """
+        graph_file, vectors_file = path / "hnsw_graph.pkl", path / "hnsw_vectors.npy"
+        if not graph_file.exists() or not vectors_file.exists():
+            return None
+        with open(graph_file, "rb") as f:
+            graph = pickle.load(f)
+        index = cls(graph["dim"], M=graph["M"], ef_construction=graph["ef_construction"], ef_search=ef_search)
+        if "links0" not in graph:
+            print(f"Rebuilding the HNSW graph in {path}: it was saved in an older format.")
+            index.add_many(np.load(vectors_file))
+            for label in graph["deleted"]:
+                index.mark_deleted(label)
+            return index
+        index._vectors = np.load(vectors_file, mmap_mode="r")
+        index._size = index._vectors.shape[0]
+        index._links0 = graph["links0"]
+        index._counts0 = graph["counts0"]
+        index._upper = graph["upper"]
+        index._visited = np.zeros(index._size, dtype=np.uint32)
+        index._scratch = np.zeros(index._size, dtype=np.int32)
+        index._tombstones = np.zeros(index._size, dtype=bool)
+        index.entry_point = graph["entry_point"]
+        index.max_level = graph["max_level"]
+        index.deleted = graph["deleted"]
+        index._tombstones[list(index.deleted)] = True
+        return index
+
+    @staticmethod
+    def files() -> Tuple[str, ...]:
+        return ("hnsw_graph.pkl", "hnsw_vectors.npy")
+
+
+class HnswlibIndex:
+    """
+    The HNSWIndex interface backed by hnswlib's C++ implementation, which
+    builds large graphs orders of magnitude faster. hnswlib is an optional
+    dependency, imported only when this implementation is selected.
+    """
+
+    def __init__(self, dim: int, M: int = 16, ef_construction: int = 200, ef_search: int = 64, seed: int = 42):
+        import hnswlib
+
+        self.dim = dim
+        self.M = M
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self._index = hnswlib.Index(space="cosine", dim=dim)
+        self._index.init_index(max_elements=1024, ef_construction=ef_construction, M=M, random_seed=seed)
+        self._index.set_ef(ef_search)
+        self._size = 0
+        self.deleted = set()
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def live_count(self) -> int:
+        return self._size - len(self.deleted)
+
+    def vector(self, label: int) -> np.ndarray:
+        return np.asarray(self._index.get_items([label])[0], dtype=np.float32)
+
+    def add_many(self, vectors: np.ndarray) -> List[int]:
+        """
+        Inserts normalized vectors and returns their labels; hnswlib inserts them on all cores.
+        """
+        labels = list(range(self._size, self._size + len(vectors)))
+        if not labels:
+            return labels
+        if labels[-1] >= self._index.get_max_elements():
+            self._index.resize_index(max(labels[-1] + 1, 2 * self._index.get_max_elements()))
+        self._index.add_items(np.asarray(vectors, dtype=np.float32), labels)
+        self._size += len(labels)
+        return labels
+
+    def add(self, vector: np.ndarray) -> int:
+        return self.add_many(np.asarray(vector, dtype=np.float32)[None, :])[0]
+
+    def mark_deleted(self, label: int):
+        self._index.mark_deleted(label)
+        self.deleted.add(label)
+
+    def search(self, q: np.ndarray, k: int, ef: Optional[int] = None) -> List[Tuple[float, int]]:
+        """
+        Returns up to k (distance, label) pairs for live vectors, closest first.
+        """
+        k = min(k, self.live_count)
+        if k <= 0:
+            return []
+        ef = max(ef or self.ef_search, k)
+        while True:
+            self._index.set_ef(ef)
+            try:
+                labels, dists = self._index.knn_query(np.asarray(q, dtype=np.float32)[None, :], k=k)
+                return list(zip(dists[0].tolist(), labels[0].tolist()))
+            except RuntimeError:
+                # Too few live vectors reachable with this ef among tombstones; widen and retry
+                if ef >= self._size:
+                    raise
+                ef = min(2 * ef, self._size)
+            finally:
+                self._index.set_ef(self.ef_search)
+
+    def save(self, path: Path):
+        path.mkdir(parents=True, exist_ok=True)
+        tmp = path / "hnswlib_index.tmp.bin"
+        self._index.save_index(str(tmp))
+        tmp.replace(path / "hnswlib_index.bin")
+        meta = {"dim": self.dim, "M": self.M, "ef_construction": self.ef_construction, "size": self._size, "deleted": self.deleted}
+        tmp = path / "hnswlib_meta.tmp.pkl"
+        with open(tmp, "wb") as f:
+            pickle.dump(meta, f, protocol=pickle.HIGHEST_PROTOCOL)
+        tmp.replace(path / "hnswlib_meta.pkl")
+
+    @classmethod
+    def load(cls, path: Path, ef_search: int = 64) -> Optional["HnswlibIndex"]:
+        """
+        Reloads a saved index. Returns None if nothing was saved.
+        """
+        index_file, meta_file = path / "hnswlib_index.bin", path / "hnswlib_meta.pkl"
+        if not index_file.exists() or not meta_file.exists():
+            return None
+        with open(meta_file, "rb") as f:
+            meta = pickle.load(f)
+        index = cls(meta["dim"], M=meta["M"], ef_construction=meta["ef_construction"], ef_search=ef_search)
+        index._index.load_index(str(index_file), max_elements=max(meta["size"], 1024))
+        index._index.set_ef(ef_search)
+        index._size = meta["size"]
+        index.deleted = meta["deleted"]
+        return index
+
+    @staticmethod
+    def files() -> Tuple[str, ...]:
+        return ("hnswlib_index.bin", "hnswlib_meta.pkl")
+
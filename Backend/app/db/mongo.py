@@ -1,16 +1,36 @@
-from pymongo import MongoClient 
+from pymongo import MongoClient, AsyncMongoClient
 from gridfs import GridFS
+from dotenv import load_dotenv
+import os
 
-try:
-    client = MongoClient('mongodb://localhost:27017/')
-    client.admin.command('ismaster')
-    print("MongoDB connection successful.")
-except Exception as e:
-    print(f"Could not connect to MongoDB: {e}")
-    exit()
+load_dotenv()
 
- 
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
+# How long an operation waits for a reachable server before failing
+MONGO_TIMEOUT_MS = int(os.getenv("MONGO_TIMEOUT_MS", "5000"))
+
+# The clients connect in the background on first use, so importing this module
+# never blocks; an unreachable server shows up in /readyz instead of exiting.
+client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=MONGO_TIMEOUT_MS)
 db = client['pdf_rag_db']
 chat_history_collection = db['chat_history']
+chat_messages_collection = db['chat_messages']
+ingest_jobs_collection = db['ingest_jobs']
+documents_collection = db['documents']
+vector_store_state_collection = db['vector_store_state']
+
+# Asyncio client for request handlers; the sync client above serves background
+# threads (ingestion jobs, document manifests).
+async_client = AsyncMongoClient(MONGO_URI, serverSelectionTimeoutMS=MONGO_TIMEOUT_MS)
+async_db = async_client['pdf_rag_db']
+async_chat_history_collection = async_db['chat_history']
+async_chat_messages_collection = async_db['chat_messages']
+
+async def ping() -> None:
+    """
+    Raises if MongoDB cannot be reached.
+    """
+    await async_client.admin.command("ping")
+
 # chunks_collection = db['chunks']
 # fs = GridFS(db)
@@ -1,25 +1,34 @@
-from pinecone import Pinecone
 from dotenv import load_dotenv
 import os
+import threading
 
 # Load environment variables from .env
 load_dotenv()
 
-# Get values from environment
-api_key = os.getenv("PINECONE_API_KEY")
-index_name = os.getenv("PINECONE_INDEX_NAME")  # corrected key name
+_index = None
+_lock = threading.Lock()
 
-# Validate values
-if not api_key:
-    raise ValueError("PINECONE_API_KEY environment variable is not set.")
-if not index_name:
-    raise ValueError("PINECONE_INDEX_NAME environment variable is not set.")
+def get_index():
+    """
+    Returns the Pinecone index, connecting on first call rather than at import.
+    """
+    global _index
+    if _index is None:
+        with _lock:
+            if _index is None:
+                from pinecone import Pinecone
 
-# Initialize Pinecone
-pc = Pinecone(api_key=api_key)
+                # Get values from environment
+                api_key = os.getenv("PINECONE_API_KEY")
+                index_name = os.getenv("PINECONE_INDEX_NAME")  # corrected key name
 
-# Get or create the index
-index = pc.Index(index_name)
+                # Validate values
+                if not api_key:
+                    raise ValueError("PINECONE_API_KEY environment variable is not set.")
+                if not index_name:
+                    raise ValueError("PINECONE_INDEX_NAME environment variable is not set.")
 
-# Export for use
-pinecone = index
+                # Initialize Pinecone and get the index
+                pc = Pinecone(api_key=api_key)
+                _index = pc.Index(index_name)
+    return _index
@@ -0,0 +1,602 @@
+import atexit
+import json
+import os
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+from app.db.hnsw import HNSWIndex, HnswlibIndex
+from app.Function.concurrency import run_io
+from app.db.mongo import vector_store_state_collection
+
+load_dotenv()
+
+# How often each worker publishes its writes to, and reads other workers' writes
+# from, the shared index generation; 0 disables sharing
+GENERATION_POLL_SECONDS = float(os.getenv("VECTOR_STORE_GENERATION_POLL_SECONDS", "1.0"))
+
+
+@dataclass
+class Match:
+    id: str
+    score: float
+    metadata: Dict[str, Any] = field(default_factory=dict)
+    values: Optional[List[float]] = None
+
+
+@dataclass
+class QueryResult:
+    matches: List[Match] = field(default_factory=list)
+
+
+class SharedGeneration:
+    """
+    A write counter shared by every worker process through one MongoDB document.
+    A background thread adds this process's writes to it and reads back the
+    total, so neither writers nor readers ever wait on MongoDB. Other workers'
+    writes show up within about two poll intervals; while MongoDB is unreachable
+    the value stops advancing and the cache TTL is the only bound.
+    """
+
+    def __init__(self, poll_seconds: float):
+        self.poll_seconds = poll_seconds
+        self.value = 0
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._failing = False
+
+    def _start(self):
+        if self.poll_seconds <= 0 or self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="store-generation", daemon=True)
+                self._thread.start()
+                # Short-lived processes (the bulk CLI) publish their last writes on exit
+                atexit.register(self._sync)
+
+    def read(self) -> int:
+        self._start()
+        return self.value
+
+    def bump(self):
+        if self.poll_seconds <= 0:
+            return
+        with self._lock:
+            self._pending += 1
+        self._start()
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.poll_seconds)
+            self._wake.clear()
+            self._sync()
+
+    def _sync(self):
+        with self._lock:
+            pending, self._pending = self._pending, 0
+        try:
+            if pending:
+                vector_store_state_collection.update_one({"_id": "generation"}, {"$inc": {"value": pending}}, upsert=True)
+            doc = vector_store_state_collection.find_one({"_id": "generation"})
+            self.value = int(doc["value"]) if doc else 0
+            if self._failing:
+                print("Shared vector store generation is reachable again")
+            self._failing = False
+        except Exception as e:
+            # Publish these writes on the next attempt
+            with self._lock:
+                self._pending += pending
+            if not self._failing:
+                print(f"Could not sync the shared vector store generation: {e}")
+            self._failing = True
+
+
+shared_generation = SharedGeneration(GENERATION_POLL_SECONDS)
+
+
+class VectorStore:
+    """
+    The surface every vector backend implements. It mirrors the subset of the
+    Pinecone Index API the app uses, so call sites don't care which backend is live.
+
+    `generation` changes on every write through this process, and shortly after
+    every write through another worker (see SharedGeneration), so callers can key
+    caches on it and never serve results from before an upsert or delete.
+    """
+
+    _local_generation = 0
+
+    @property
+    def generation(self) -> Tuple[int, int]:
+        return (self._local_generation, shared_generation.read())
+
+    def _bump_generation(self):
+        self._local_generation += 1
+        shared_generation.bump()
+
+    def upsert(self, vectors: List[Dict[str, Any]]) -> None:
+        """
+        Inserts or overwrites vectors.
+        Args:
+            vectors: Records of the form {"id": str, "values": list, "metadata": dict}.
+        """
+        raise NotImplementedError
+
+    def query(self, vector, top_k: int, include_metadata: bool = True, include_values: bool = False, ef: Optional[int] = None) -> QueryResult:
+        """
+        Returns the top_k most similar vectors by cosine similarity, best first.
+        `ef` is the candidate list size of approximate backends, trading latency
+        for recall; exact and remote backends ignore it.
+        """
+        raise NotImplementedError
+
+    def delete(self, ids: Optional[List[str]] = None, delete_all: bool = False) -> None:
+        """
+        Deletes the given ids, or every vector when delete_all is True.
+        """
+        raise NotImplementedError
+
+    def flush(self) -> None:
+        """
+        Persists pending writes. A no-op for remote backends.
+        """
+
+    def ping(self) -> None:
+        """
+        Raises if the store cannot be reached. Local backends are always reachable.
+        """
+
+    def claim_writer(self) -> None:
+        """
+        Makes this process the store's only writer, or raises if another process
+        is. A no-op for remote backends, which take concurrent writers.
+        """
+
+
+class WriterLocked(RuntimeError):
+    """Raised when another process already writes a local vector store."""
+
+
+def _claim_directory(path: Path):
+    """
+    Takes an exclusive lock on `path`/.writer.lock, held until the process exits.
+    Local stores keep their vectors in process and flush() rewrites the whole
+    directory, so two writing processes would overwrite each other's vectors.
+    Returns:
+        The open lock file, which must be kept referenced.
+    """
+    path.mkdir(parents=True, exist_ok=True)
+    handle = open(path / ".writer.lock", "a+")
+    try:
+        try:
+            import fcntl
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except ImportError:
+            import msvcrt
+            msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        handle.close()
+        raise WriterLocked(
+            f"Another process is writing the vector store in {path}. VECTOR_STORE=numpy and hnsw "
+            f"support one writing process: run a single uvicorn worker and stop it before running "
+            f"the bulk ingestion CLI, or use VECTOR_STORE=pinecone."
+        )
+    return handle
+
+
+class PineconeStore(VectorStore):
+    def __init__(self, get_index):
+        """
+        Args:
+            get_index: Returns the Pinecone index; called on first use so that
+                building the store does not connect.
+        """
+        self._get_index = get_index
+
+    @property
+    def index(self):
+        return self._get_index()
+
+    def ping(self):
+        self.index.describe_index_stats()
+
+    def upsert(self, vectors):
+        self.index.upsert(vectors=vectors)
+        self._bump_generation()
+
+    def query(self, vector, top_k, include_metadata=True, include_values=False, ef=None):
+        results = self.index.query(
+            vector=list(map(float, vector)),
+            top_k=top_k,
+            include_metadata=include_metadata,
+            include_values=include_values,
+        )
+        return QueryResult(matches=[
+            Match(
+                id=m.id,
+                score=m.score,
+                metadata=dict(m.metadata or {}),
+                values=list(m.values) if include_values and m.values else None,
+            )
+            for m in results.matches
+        ])
+
+    def delete(self, ids=None, delete_all=False):
+        if delete_all:
+            self.index.delete(delete_all=True)
+        elif ids:
+            self.index.delete(ids=list(ids))
+        self._bump_generation()
+
+
+class NumpyStore(VectorStore):
+    """
+    In-process vector store. Vectors live in one contiguous float32 matrix with
+    L2-normalized rows, so cosine top-k is a single matrix-vector product followed
+    by argpartition. The matrix is persisted as a .npy file and memory-mapped on
+    load; it is copied into RAM only on the first write.
+
+    Only one process may write a store directory (see claim_writer): each keeps
+    its own copy in memory and flush() rewrites the files.
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._lock = threading.RLock()
+        self._matrix: Optional[np.ndarray] = None
+        self._size = 0
+        self._ids: List[str] = []
+        self._metadata: List[Dict[str, Any]] = []
+        self._rows: Dict[str, int] = {}
+        self._dirty = False
+        self._writer = None
+        self._load()
+
+    @property
+    def _vectors_file(self) -> Path:
+        return self.path / "vectors.npy"
+
+    @property
+    def _meta_file(self) -> Path:
+        return self.path / "metadata.json"
+
+    def _load(self):
+        if not self._vectors_file.exists() or not self._meta_file.exists():
+            return
+        self._matrix = np.load(self._vectors_file, mmap_mode="r")
+        with open(self._meta_file, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self._ids = meta["ids"]
+        self._metadata = meta["metadata"]
+        self._size = len(self._ids)
+        self._rows = {vid: row for row, vid in enumerate(self._ids)}
+
+    def __len__(self):
+        return self._size
+
+    def _reserve(self, rows: int, dim: int):
+        """
+        Makes room for `rows` more vectors, growing the matrix geometrically and
+        copying a memory-mapped matrix into RAM before the first write.
+        """
+        needed = self._size + rows
+        if self._matrix is not None and self._matrix.shape[1] != dim:
+            raise ValueError(f"Vector dimension {dim} does not match store dimension {self._matrix.shape[1]}.")
+        if self._matrix is not None and isinstance(self._matrix, np.ndarray) \
+                and not isinstance(self._matrix, np.memmap) and self._matrix.shape[0] >= needed:
+            return
+        capacity = max(needed, 2 * (self._matrix.shape[0] if self._matrix is not None else 0), 1024)
+        grown = np.empty((capacity, dim), dtype=np.float32)
+        if self._size:
+            grown[:self._size] = self._matrix[:self._size]
+        self._matrix = grown
+
+    @staticmethod
+    def _normalize(values) -> np.ndarray:
+        arr = np.asarray(values, dtype=np.float32)
+        norms = np.linalg.norm(arr, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return arr / norms
+
+    def upsert(self, vectors):
+        if not vectors:
+            return
+        self.claim_writer()
+        values = self._normalize([v["values"] for v in vectors])
+        with self._lock:
+            self._reserve(len(vectors), values.shape[1])
+            for record, row_values in zip(vectors, values):
+                row = self._rows.get(record["id"])
+                if row is None:
+                    row = self._size
+                    self._size += 1
+                    self._ids.append(record["id"])
+                    self._metadata.append(record.get("metadata", {}))
+                    self._rows[record["id"]] = row
+                else:
+                    self._metadata[row] = record.get("metadata", {})
+                self._matrix[row] = row_values
+            self._dirty = True
+            self._bump_generation()
+
+    def query(self, vector, top_k, include_metadata=True, include_values=False, ef=None):
+        with self._lock:
+            if self._size == 0 or top_k <= 0:
+                return QueryResult()
+            q = self._normalize(vector)
+            scores = self._matrix[:self._size] @ q
+            k = min(top_k, self._size)
+            if k < self._size:
+                top = np.argpartition(-scores, k - 1)[:k]
+            else:
+                top = np.arange(self._size)
+            top = top[np.argsort(-scores[top])]
+            return QueryResult(matches=[
+                Match(
+                    id=self._ids[row],
+                    score=float(scores[row]),
+                    metadata=dict(self._metadata[row]) if include_metadata else {},
+                    values=self._matrix[row].tolist() if include_values else None,
+                )
+                for row in top
+            ])
+
+    def delete(self, ids=None, delete_all=False):
+        self.claim_writer()
+        with self._lock:
+            if delete_all:
+                self._matrix = None
+                self._size = 0
+                self._ids, self._metadata, self._rows = [], [], {}
+                self._dirty = True
+                self._bump_generation()
+                return
+            doomed = {self._rows[i] for i in (ids or []) if i in self._rows}
+            if not doomed:
+                return
+            keep = np.array([row for row in range(self._size) if row not in doomed], dtype=np.int64)
+            self._matrix = np.ascontiguousarray(self._matrix[keep]) if len(keep) else None
+            self._ids = [self._ids[row] for row in keep]
+            self._metadata = [self._metadata[row] for row in keep]
+            self._size = len(self._ids)
+            self._rows = {vid: row for row, vid in enumerate(self._ids)}
+            self._dirty = True
+            self._bump_generation()
+
+    def claim_writer(self):
+        if self._writer is None:
+            self._writer = _claim_directory(self.path)
+
+    def flush(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            self.path.mkdir(parents=True, exist_ok=True)
+            if self._size:
+                tmp = self.path / "vectors.tmp.npy"
+                np.save(tmp, np.ascontiguousarray(self._matrix[:self._size]))
+                os.replace(tmp, self._vectors_file)
+            elif self._vectors_file.exists():
+                self._vectors_file.unlink()
+            tmp = self.path / "metadata.tmp.json"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"ids": self._ids, "metadata": self._metadata}, f)
+            os.replace(tmp, self._meta_file)
+            self._dirty = False
+
+
+class HNSWStore(VectorStore):
+    """
+    In-process approximate nearest-neighbour store backed by an HNSW graph, for
+    local corpora too large for NumpyStore's brute-force scan. Inserts go straight
+    into the graph; overwrites and deletes leave tombstones that are compacted
+    away on flush once they make up more than half of the graph. Re-upserting a
+    vector with unchanged values only updates its metadata.
+
+    implementation is "python" (HNSWIndex, no extra dependency) or "hnswlib"
+    (HnswlibIndex, needs the optional hnswlib package; use it for millions of vectors).
+    Like NumpyStore, it allows one writing process per directory.
+    """
+
+    def __init__(self, path: str, M: int = 16, ef_construction: int = 200, ef_search: int = 64, implementation: str = "python"):
+        if implementation not in ("python", "hnswlib"):
+            raise ValueError(f"Unknown HNSW implementation: {implementation}")
+        self.path = Path(path)
+        self._index_class = HnswlibIndex if implementation == "hnswlib" else HNSWIndex
+        self.M = M
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self._lock = threading.RLock()
+        self._index: Optional[HNSWIndex] = None
+        self._labels: Dict[str, int] = {}
+        self._ids: List[Optional[str]] = []
+        self._metadata: List[Optional[Dict[str, Any]]] = []
+        self._dirty = False
+        self._writer = None
+        self._load()
+
+    @property
+    def _meta_file(self) -> Path:
+        return self.path / "hnsw_metadata.json"
+
+    def _load(self):
+        if not self._meta_file.exists():
+            return
+        self._index = self._index_class.load(self.path, ef_search=self.ef_search)
+        if self._index is None:
+            return
+        with open(self._meta_file, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self._ids = meta["ids"]
+        self._metadata = meta["metadata"]
+        self._labels = {vid: label for label, vid in enumerate(self._ids) if vid is not None}
+
+    def __len__(self):
+        return len(self._labels)
+
+    def upsert(self, vectors):
+        if not vectors:
+            return
+        self.claim_writer()
+        values = NumpyStore._normalize([v["values"] for v in vectors])
+        with self._lock:
+            if self._index is None:
+                self._index = self._index_class(values.shape[1], M=self.M, ef_construction=self.ef_construction, ef_search=self.ef_search)
+            inserts: Dict[str, int] = {}  # id -> row of `values`; the last record wins
+            for row, record in enumerate(vectors):
+                label = self._labels.get(record["id"])
+                if label is not None and np.array_equal(self._index.vector(label), values[row]):
+                    self._metadata[label] = record.get("metadata", {})
+                    inserts.pop(record["id"], None)
+                    continue
+                self._remove(record["id"])
+                inserts[record["id"]] = row
+            if inserts:
+                labels = self._index.add_many(values[list(inserts.values())])
+                for (vid, row), label in zip(inserts.items(), labels):
+                    self._ids.append(vid)
+                    self._metadata.append(vectors[row].get("metadata", {}))
+                    self._labels[vid] = label
+            self._dirty = True
+            self._bump_generation()
+
+    def _remove(self, vid: str):
+        label = self._labels.pop(vid, None)
+        if label is None:
+            return
+        self._index.mark_deleted(label)
+        self._ids[label] = None
+        self._metadata[label] = None
+
+    def query(self, vector, top_k, include_metadata=True, include_values=False, ef: Optional[int] = None):
+        """
+        Approximate cosine top-k. `ef` overrides ef_search for this call to trade
+        latency for recall.
+        """
+        with self._lock:
+            if self._index is None or not self._labels:
+                return QueryResult()
+            q = NumpyStore._normalize(vector)
+            hits = self._index.search(q, top_k, ef=ef or self.ef_search)
+            return QueryResult(matches=[
+                Match(
+                    id=self._ids[label],
+                    score=1.0 - dist,
+                    metadata=dict(self._metadata[label]) if include_metadata else {},
+                    values=self._index.vector(label).tolist() if include_values else None,
+                )
+                for dist, label in hits
+            ])
+
+    def delete(self, ids=None, delete_all=False):
+        self.claim_writer()
+        with self._lock:
+            if delete_all:
+                self._index = None
+                self._labels, self._ids, self._metadata = {}, [], []
+                self._dirty = True
+                self._bump_generation()
+                return
+            for vid in ids or []:
+                self._remove(vid)
+            self._dirty = True
+            self._bump_generation()
+
+    def _compact(self):
+        """
+        Rebuilds the graph from live vectors only, dropping tombstones.
+        """
+        old = self._index
+        records = [
+            {"id": vid, "values": old.vector(label), "metadata": self._metadata[label]}
+            for vid, label in self._labels.items()
+        ]
+        self._index = None
+        self._labels, self._ids, self._metadata = {}, [], []
+        self.upsert(records)
+
+    def claim_writer(self):
+        if self._writer is None:
+            self._writer = _claim_directory(self.path)
+
+    def flush(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            if self._index is not None and len(self._index.deleted) > self._index.live_count:
+                self._compact()
+            self.path.mkdir(parents=True, exist_ok=True)
+            if self._index is not None:
+                self._index.save(self.path)
+            else:
+                for name in self._index_class.files():
+                    if (self.path / name).exists():
+                        (self.path / name).unlink()
+            tmp = self.path / "hnsw_metadata.tmp.json"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"ids": self._ids, "metadata": self._metadata}, f)
+            os.replace(tmp, self._meta_file)
+            self._dirty = False
+
+
+def _build_vector_store() -> VectorStore:
+    backend = os.getenv("VECTOR_STORE", "pinecone").lower()
+    if backend == "pinecone":
+        from app.db.pinecone import get_index
+        return PineconeStore(get_index)
+    if backend == "numpy":
+        return NumpyStore(os.getenv("VECTOR_STORE_PATH", "./vector_store"))
+    if backend == "hnsw":
+        return HNSWStore(
+            os.getenv("VECTOR_STORE_PATH", "./vector_store"),
+            M=int(os.getenv("HNSW_M", "16")),
+            ef_construction=int(os.getenv("HNSW_EF_CONSTRUCTION", "200")),
+            ef_search=int(os.getenv("HNSW_EF_SEARCH", "64")),
+            implementation=os.getenv("HNSW_IMPLEMENTATION", "python").lower(),
+        )
+    raise ValueError(f"Unknown VECTOR_STORE backend: {backend}")
+
+
+class AsyncVectorStore:
+    """
+    Asyncio facade over a VectorStore for request handlers. Calls run on the
+    I/O executor under the "vector_store" concurrency limit, so a slow store
+    never blocks the event loop.
+    """
+
+    def __init__(self, store: VectorStore):
+        self.store = store
+
+    @property
+    def generation(self) -> Tuple[int, int]:
+        return self.store.generation
+
+    async def upsert(self, vectors):
+        return await run_io(self.store.upsert, vectors, dependency="vector_store")
+
+    async def query(self, vector, top_k, include_metadata=True, include_values=False, ef=None) -> QueryResult:
+        return await run_io(
+            self.store.query, vector, top_k,
+            include_metadata=include_metadata, include_values=include_values, ef=ef, dependency="vector_store",
+        )
+
+    async def delete(self, ids=None, delete_all=False):
+        return await run_io(self.store.delete, ids=ids, delete_all=delete_all, dependency="vector_store")
+
+    async def flush(self):
+        return await run_io(self.store.flush, dependency="vector_store")
+
+    async def ping(self):
+        return await run_io(self.store.ping, dependency="vector_store")
+
+
+vector_store = _build_vector_store()
+async_vector_store = AsyncVectorStore(vector_store)
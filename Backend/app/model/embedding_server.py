@@ -0,0 +1,341 @@
+import argparse
+import itertools
+import json
+import os
+import queue
+import signal
+import socket
+import struct
+import sys
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+from app.Function.batching import EMBED_BATCH_MAX_SIZE, EMBED_BATCH_MAX_WAIT_MS, EmbeddingBatcher
+from app.model.model import EMBEDDING_MODEL_NAME, EMBEDDING_SERVER_SOCKET, embedding_model_id, load_embedding_model
+
+load_dotenv()
+
+# Longest an API worker waits for the vectors of one encode request
+EMBEDDING_SERVER_TIMEOUT_SECONDS = float(os.getenv("EMBEDDING_SERVER_TIMEOUT_SECONDS", "60"))
+# Model processes sharing the socket; each loads one model and batches the
+# requests of the API workers connected to it.
+EMBEDDING_SERVER_PROCESSES = int(os.getenv("EMBEDDING_SERVER_PROCESSES", "1"))
+DEFAULT_SOCKET = "/tmp/pdf_rag_embeddings.sock"
+
+# Wire format, little-endian. A request is a header plus a payload:
+#   encode: u32 count, count x u32 byte lengths, then the UTF-8 texts back to back
+#   info:   empty
+# A response is a header plus `size` bytes: for an encoded request the rows x dim
+# float32 matrix in C order, otherwise UTF-8 JSON (info) or an error message.
+_REQUEST = struct.Struct("<QBI")  # request id, op, payload size
+_RESPONSE = struct.Struct("<QBIII")  # request id, status, rows, dim, payload size
+OP_ENCODE, OP_INFO = 1, 2
+STATUS_OK, STATUS_ERROR = 0, 1
+
+
+def _recv_into(sock: socket.socket, view: memoryview) -> None:
+    # Fills `view` straight from the socket, without intermediate bytes objects
+    while len(view):
+        received = sock.recv_into(view)
+        if not received:
+            raise ConnectionError("Embedding server connection closed")
+        view = view[received:]
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytearray:
+    buffer = bytearray(size)
+    _recv_into(sock, memoryview(buffer))
+    return buffer
+
+
+def pack_texts(texts: List[str]) -> bytes:
+    encoded = [text.encode("utf-8") for text in texts]
+    lengths = np.array([len(data) for data in encoded], dtype="<u4")
+    return struct.pack("<I", len(encoded)) + lengths.tobytes() + b"".join(encoded)
+
+
+def unpack_texts(payload: bytearray) -> List[str]:
+    (count,) = struct.unpack_from("<I", payload)
+    lengths = np.frombuffer(payload, dtype="<u4", count=count, offset=4)
+    view = memoryview(payload)
+    texts, offset = [], 4 + 4 * count
+    for length in lengths.tolist():
+        texts.append(str(view[offset:offset + length], "utf-8"))
+        offset += length
+    return texts
+
+
+class EmbeddingServer:
+    """
+    Serves encode requests from API workers over a Unix socket, with one model
+    in memory. Texts of every connected worker go through one EmbeddingBatcher,
+    so concurrent requests from different workers share forward passes.
+    """
+
+    def __init__(self, model, max_batch_size: int = EMBED_BATCH_MAX_SIZE, max_wait_ms: float = EMBED_BATCH_MAX_WAIT_MS):
+        self.model = model
+        self.dimension = model.get_sentence_embedding_dimension()
+        self.batcher = EmbeddingBatcher(self._encode_batch, max_batch_size, max_wait_ms)
+
+    def _encode_batch(self, texts: List[str]):
+        return list(np.asarray(self.model.encode(texts, batch_size=len(texts), show_progress_bar=False), dtype=np.float32))
+
+    def serve(self, listener: socket.socket) -> None:
+        """
+        Accepts connections until the process is stopped; one reader and one writer thread per connection.
+        """
+        while True:
+            conn, _ = listener.accept()
+            threading.Thread(target=self._handle, args=(conn,), name="embed-conn", daemon=True).start()
+
+    def _handle(self, conn: socket.socket) -> None:
+        replies: "queue.Queue[Optional[Tuple[bytes, Optional[memoryview]]]]" = queue.Queue()
+
+        def write():
+            # Replies complete out of order; one writer keeps each frame contiguous
+            while True:
+                reply = replies.get()
+                if reply is None:
+                    return
+                header, body = reply
+                try:
+                    conn.sendall(header)
+                    if body is not None:
+                        conn.sendall(body)  # Sent from the array's own buffer
+                except OSError:
+                    return
+
+        writer = threading.Thread(target=write, name="embed-writer", daemon=True)
+        writer.start()
+        try:
+            while True:
+                request_id, op, size = _REQUEST.unpack(_recv_exact(conn, _REQUEST.size))
+                payload = _recv_exact(conn, size)
+                if op == OP_ENCODE:
+                    self._encode_request(request_id, unpack_texts(payload), replies)
+                elif op == OP_INFO:
+                    info = json.dumps({"model_id": embedding_model_id(), "dimension": self.dimension, "pid": os.getpid()}).encode("utf-8")
+                    replies.put((_RESPONSE.pack(request_id, STATUS_OK, 0, 0, len(info)) + info, None))
+                else:
+                    message = f"Unknown op {op}".encode("utf-8")
+                    replies.put((_RESPONSE.pack(request_id, STATUS_ERROR, 0, 0, len(message)) + message, None))
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            replies.put(None)
+            writer.join()
+            conn.close()
+
+    def _encode_request(self, request_id: int, texts: List[str], replies: queue.Queue) -> None:
+        if not texts:
+            replies.put((_RESPONSE.pack(request_id, STATUS_OK, 0, self.dimension, 0), None))
+            return
+        futures = [self.batcher.submit(text) for text in texts]
+        remaining = [len(futures)]
+        lock = threading.Lock()
+
+        def on_done(_):
+            with lock:
+                remaining[0] -= 1
+                if remaining[0]:
+                    return
+            try:
+                vectors = np.ascontiguousarray(np.stack([future.result() for future in futures]), dtype=np.float32)
+            except Exception as e:
+                message = str(e).encode("utf-8")
+                replies.put((_RESPONSE.pack(request_id, STATUS_ERROR, 0, 0, len(message)) + message, None))
+                return
+            header = _RESPONSE.pack(request_id, STATUS_OK, vectors.shape[0], vectors.shape[1], vectors.nbytes)
+            replies.put((header, memoryview(vectors).cast("B")))
+
+        for future in futures:
+            future.add_done_callback(on_done)
+
+
+class RemoteEmbedder:
+    """
+    Stand-in for the SentenceTransformer in API workers when EMBEDDING_SERVER_SOCKET
+    is set: encode() is answered by the embedding server, and only the tokenizer
+    (for chunking and token counts) is loaded in the worker.
+
+    One connection per worker carries concurrent requests, matched to their
+    answers by request id. Vectors are received straight into the returned
+    array's buffer.
+    """
+
+    def __init__(self, socket_path: str, timeout: float = EMBEDDING_SERVER_TIMEOUT_SECONDS):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self.dimension: Optional[int] = None
+        self._sock: Optional[socket.socket] = None
+        self._pending: Dict[int, Future] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._tokenizer = None
+
+    @property
+    def tokenizer(self):
+        if self._tokenizer is None:
+            from transformers import AutoTokenizer
+            # The tokenizer files of the same model repository, without the weights
+            self._tokenizer = AutoTokenizer.from_pretrained(f"sentence-transformers/{EMBEDDING_MODEL_NAME}")
+        return self._tokenizer
+
+    def _connect(self) -> socket.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            # Handshake before the reader starts: vectors of another model or backend must not mix with cached ones
+            sock.sendall(_REQUEST.pack(0, OP_INFO, 0))
+            _, status, _, _, size = _RESPONSE.unpack(_recv_exact(sock, _RESPONSE.size))
+            info = json.loads(bytes(_recv_exact(sock, size)))
+            if status != STATUS_OK or info["model_id"] != embedding_model_id():
+                raise RuntimeError(
+                    f"Embedding server at {self.socket_path} serves {info.get('model_id')}, "
+                    f"but this worker expects {embedding_model_id()}; set the same EMBEDDING_BACKEND for both."
+                )
+            sock.settimeout(None)
+        except BaseException:
+            sock.close()
+            raise
+        self.dimension = info["dimension"]
+        threading.Thread(target=self._read, args=(sock,), name="embed-client", daemon=True).start()
+        print(f"Connected to embedding server {self.socket_path} (pid {info['pid']}, {info['model_id']})")
+        return sock
+
+    def _read(self, sock: socket.socket) -> None:
+        try:
+            while True:
+                request_id, status, rows, dim, size = _RESPONSE.unpack(_recv_exact(sock, _RESPONSE.size))
+                with self._lock:
+                    future = self._pending.pop(request_id, None)
+                if status == STATUS_OK:
+                    vectors = np.empty((rows, dim), dtype=np.float32)
+                    if size:
+                        _recv_into(sock, memoryview(vectors).cast("B"))
+                    if future is not None:
+                        future.set_result(vectors)
+                else:
+                    message = str(_recv_exact(sock, size), "utf-8")
+                    if future is not None:
+                        future.set_exception(RuntimeError(f"Embedding server error: {message}"))
+        except (ConnectionError, OSError) as e:
+            self._disconnect(sock, e)
+
+    def _disconnect(self, sock: socket.socket, error: BaseException) -> None:
+        # Fails every request still waiting on this connection; the next request reconnects
+        with self._lock:
+            if self._sock is sock:
+                self._sock = None
+            pending, self._pending = self._pending, {}
+        sock.close()
+        for future in pending.values():
+            future.set_exception(ConnectionError(f"Lost connection to the embedding server: {error}"))
+
+    def submit(self, texts: List[str]) -> Tuple[int, Future]:
+        """
+        Sends one encode request.
+        Returns:
+            The request id, and a future resolved with the (len(texts), dim) float32 matrix.
+        """
+        payload = pack_texts(texts)
+        future: Future = Future()
+        with self._lock:
+            if self._sock is None:
+                self._sock = self._connect()
+            sock = self._sock
+            request_id = next(self._ids)
+            self._pending[request_id] = future
+            try:
+                sock.sendall(_REQUEST.pack(request_id, OP_ENCODE, len(payload)))
+                sock.sendall(payload)
+            except OSError as e:
+                self._pending.pop(request_id, None)
+                self._sock = None
+                sock.close()
+                raise ConnectionError(f"Lost connection to the embedding server: {e}") from e
+        return request_id, future
+
+    def encode(self, sentences, batch_size: Optional[int] = None, show_progress_bar: bool = False, **kwargs):
+        """
+        Same call as SentenceTransformer.encode for the arguments the backend uses:
+        one vector for a string, a (n, dim) float32 array for a list.
+        """
+        single = isinstance(sentences, str)
+        request_id, future = self.submit([sentences] if single else list(sentences))
+        try:
+            vectors = future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            # Forget the request; its answer, if it ever comes, is discarded by the reader
+            with self._lock:
+                self._pending.pop(request_id, None)
+            raise
+        return vectors[0] if single else vectors
+
+    def get_sentence_embedding_dimension(self) -> int:
+        if self.dimension is None:
+            with self._lock:
+                if self._sock is None:
+                    self._sock = self._connect()
+        return self.dimension
+
+
+def _bind(path: str) -> socket.socket:
+    if os.path.exists(path):
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(path)
+            raise SystemExit(f"An embedding server is already listening on {path}")
+        except (ConnectionRefusedError, FileNotFoundError):
+            os.unlink(path)  # Left behind by a server that was killed
+        finally:
+            probe.close()
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(path)
+    os.chmod(path, 0o600)  # Only the user running the API workers may connect
+    listener.listen(128)
+    return listener
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared embedding model server for multi-worker deployments.")
+    parser.add_argument("--socket", default=EMBEDDING_SERVER_SOCKET or DEFAULT_SOCKET, help="Unix socket path (default: EMBEDDING_SERVER_SOCKET)")
+    parser.add_argument("--processes", type=int, default=EMBEDDING_SERVER_PROCESSES, help="Model processes accepting on the socket")
+    parser.add_argument("--batch-size", type=int, default=EMBED_BATCH_MAX_SIZE, help="Most texts encoded in one forward pass")
+    parser.add_argument("--max-wait-ms", type=float, default=EMBED_BATCH_MAX_WAIT_MS, help="Longest a text waits for others to join its batch")
+    args = parser.parse_args()
+
+    listener = _bind(args.socket)
+    # Fork before the model is loaded: each process loads its own copy, and the
+    # kernel spreads incoming connections over the processes accepting on the socket.
+    children = []
+    for _ in range(max(1, args.processes) - 1):
+        pid = os.fork()
+        if pid == 0:
+            children = None
+            break
+        children.append(pid)
+
+    if children is not None:
+        def stop(signum, frame):
+            for pid in children:
+                os.kill(pid, signal.SIGTERM)
+            if os.path.exists(args.socket):
+                os.unlink(args.socket)
+            sys.exit(0)
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+    server = EmbeddingServer(load_embedding_model(), args.batch_size, args.max_wait_ms)
+    server.model.encode(["warmup"], show_progress_bar=False)
+    print(f"Embedding server (pid {os.getpid()}, {embedding_model_id()}, dim {server.dimension}) listening on {args.socket}")
+    server.serve(listener)
+
+
+if __name__ == "__main__":
+    main()
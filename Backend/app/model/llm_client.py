@@ -0,0 +1,292 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import openai
+from dotenv import load_dotenv
+
+from app.Function.concurrency import CONCURRENCY_LIMITS, limiter
+from app.Function.metrics import LLM_CALLS_IN_FLIGHT, LLM_HEDGES, LLM_RETRIES
+
+load_dotenv()
+
+# Deadline of one completion, retries and hedges included
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+# Retries of a completion that failed with a transient error (connection error,
+# timeout, 408, 409, 429 or 5xx), after a jittered exponential backoff.
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_RETRY_BASE_MS = float(os.getenv("LLM_RETRY_BASE_MS", "250"))
+LLM_RETRY_MAX_MS = float(os.getenv("LLM_RETRY_MAX_MS", "4000"))
+# Hedged requests: when a completion takes longer than the LLM_HEDGE_PERCENTILE
+# of recent completion latencies, a duplicate is sent and the first answer wins.
+# Off by default, since every hedge is a paid request.
+LLM_HEDGE = os.getenv("LLM_HEDGE", "false").lower() in ("1", "true", "yes")
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "0.95"))
+LLM_HEDGE_MIN_DELAY_MS = float(os.getenv("LLM_HEDGE_MIN_DELAY_MS", "250"))
+# Completions observed before the hedge delay is trusted
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+# Recent completion latencies kept for the hedge delay
+LATENCY_WINDOW = 200
+
+_RETRYABLE_STATUS = (408, 409, 429)
+
+
+class LLMTimeout(Exception):
+    """Raised when a completion does not finish within its deadline."""
+
+
+def is_transient(error: BaseException) -> bool:
+    """
+    Whether a failed completion is worth retrying: the request may not have
+    reached the model, or the API asked to try again later.
+    """
+    if isinstance(error, (openai.APIConnectionError, asyncio.TimeoutError)):  # APITimeoutError included
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in _RETRYABLE_STATUS or error.status_code >= 500
+    return False
+
+
+def _retry_after(error: BaseException) -> Optional[float]:
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    try:
+        return max(0.0, float(response.headers.get("retry-after", "")))
+    except ValueError:
+        return None
+
+
+class ResilientLLMClient:
+    """
+    Completion calls over a pair of long-lived (sync, async) OpenAI-compatible
+    clients, so connections are kept alive and reused across requests.
+
+    Every completion gets a deadline that covers its retries. Transient errors
+    are retried with full-jitter exponential backoff (or the server's
+    Retry-After). Async completions are bounded by the "llm" concurrency limit
+    and, with hedging on, a duplicate request is sent when the first one is
+    slower than the recent p95 and a slot is free.
+    """
+
+    def __init__(
+        self,
+        client,
+        async_client,
+        timeout: float = LLM_TIMEOUT_SECONDS,
+        max_retries: int = LLM_MAX_RETRIES,
+        retry_base_ms: float = LLM_RETRY_BASE_MS,
+        retry_max_ms: float = LLM_RETRY_MAX_MS,
+        hedge: bool = LLM_HEDGE,
+        hedge_percentile: float = LLM_HEDGE_PERCENTILE,
+        hedge_min_delay_ms: float = LLM_HEDGE_MIN_DELAY_MS,
+        hedge_min_samples: int = LLM_HEDGE_MIN_SAMPLES,
+    ):
+        self.client = client
+        self.async_client = async_client
+        self.timeout = timeout
+        self.max_retries = max(0, max_retries)
+        self.retry_base = retry_base_ms / 1000
+        self.retry_max = retry_max_ms / 1000
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay_ms / 1000
+        self.hedge_min_samples = hedge_min_samples
+        self._latencies: deque = deque(maxlen=LATENCY_WINDOW)
+        # Bounds sync completions the way limiter("llm") bounds async ones
+        self._sync_slots = threading.BoundedSemaphore(CONCURRENCY_LIMITS["llm"])
+        self.completions = 0
+        self.retries = 0
+        self.hedges = 0
+        self.hedges_won = 0
+        self.timeouts = 0
+
+    def _percentile(self, q: float) -> Optional[float]:
+        ordered = sorted(self._latencies)
+        if not ordered:
+            return None
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+    def hedge_delay(self) -> Optional[float]:
+        """
+        Seconds after which a completion is hedged, or None when hedging is off
+        or too few completions have been observed.
+        """
+        if not self.hedge or len(self._latencies) < self.hedge_min_samples:
+            return None
+        return max(self._percentile(self.hedge_percentile), self.hedge_min_delay)
+
+    def _backoff(self, attempt: int, error: BaseException) -> float:
+        retry_after = _retry_after(error)
+        if retry_after is not None:
+            return retry_after
+        # Full jitter: concurrent callers that failed together retry spread out
+        return random.uniform(0, min(self.retry_max, self.retry_base * 2 ** attempt))
+
+    def _retry_delay(self, attempt: int, error: BaseException, deadline: float) -> float:
+        """
+        Returns how long to wait before retrying after `error`, or re-raises it
+        when it is not transient, retries are used up, or the deadline would pass.
+        """
+        if isinstance(error, LLMTimeout) or not is_transient(error) or attempt >= self.max_retries:
+            if isinstance(error, (LLMTimeout, asyncio.TimeoutError, openai.APITimeoutError)):
+                self.timeouts += 1
+                raise LLMTimeout(f"LLM completion did not finish within {self.timeout}s") from error
+            raise error
+        delay = self._backoff(attempt, error)
+        if time.monotonic() + delay >= deadline:
+            self.timeouts += 1
+            raise LLMTimeout(f"LLM completion did not finish within {self.timeout}s") from error
+        self.retries += 1
+        LLM_RETRIES.labels(type(error).__name__).inc()
+        print(f"LLM completion failed ({type(error).__name__}: {error}); retry {attempt + 1}/{self.max_retries} in {delay:.2f}s")
+        return delay
+
+    # --- async -------------------------------------------------------------
+
+    async def _attempt(self, model: str, messages: List[Dict[str, str]], deadline: float) -> str:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise LLMTimeout(f"LLM completion did not finish within {self.timeout}s")
+
+        async def call():
+            async with limiter("llm"):
+                started = time.perf_counter()
+                with LLM_CALLS_IN_FLIGHT.track_inprogress():
+                    response = await self.async_client.chat.completions.create(model=model, messages=messages, timeout=remaining)
+                self._latencies.append(time.perf_counter() - started)
+                return response.choices[0].message.content
+
+        # The deadline also covers waiting for a free slot
+        return await asyncio.wait_for(call(), remaining)
+
+    async def _hedged(self, model: str, messages: List[Dict[str, str]], deadline: float) -> str:
+        delay = self.hedge_delay()
+        if delay is None:
+            return await self._attempt(model, messages, deadline)
+
+        primary = asyncio.ensure_future(self._attempt(model, messages, deadline))
+        tasks = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            # A hedge that would only queue behind other completions is not sent
+            if done or limiter("llm").locked():
+                return await primary
+
+            hedge = asyncio.ensure_future(self._attempt(model, messages, deadline))
+            tasks.add(hedge)
+            self.hedges += 1
+            LLM_HEDGES.labels("sent").inc()
+            errors = []
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.hedges_won += 1
+                            LLM_HEDGES.labels("won").inc()
+                        return task.result()
+                    errors.append(task.exception())
+            raise errors[0]
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def acomplete(self, model: str, messages: List[Dict[str, str]]) -> str:
+        """
+        Returns the completion of `messages`, retrying transient errors until the deadline.
+        """
+        deadline = time.monotonic() + self.timeout
+        self.completions += 1
+        attempt = 0
+        while True:
+            try:
+                return await self._hedged(model, messages, deadline)
+            except Exception as e:
+                delay = self._retry_delay(attempt, e, deadline)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def astream(self, model: str, messages: List[Dict[str, str]]) -> AsyncIterator[str]:
+        """
+        Yields the completion of `messages` as the API streams it. Transient
+        errors are retried only until the first token; once text has been
+        yielded, a failure is raised to the caller. Streams are not hedged.
+        """
+        deadline = time.monotonic() + self.timeout
+        self.completions += 1
+        attempt = 0
+        while True:
+            yielded = False
+            try:
+                async with limiter("llm"):
+                    with LLM_CALLS_IN_FLIGHT.track_inprogress():
+                        remaining = deadline - time.monotonic()
+                        stream = await asyncio.wait_for(
+                            self.async_client.chat.completions.create(model=model, messages=messages, stream=True, timeout=remaining),
+                            remaining,
+                        )
+                        events = stream.__aiter__()
+                        while True:
+                            try:
+                                event = await asyncio.wait_for(events.__anext__(), deadline - time.monotonic())
+                            except StopAsyncIteration:
+                                return
+                            if event.choices and event.choices[0].delta.content:
+                                yielded = True
+                                yield event.choices[0].delta.content
+            except Exception as e:
+                if yielded:
+                    raise
+                delay = self._retry_delay(attempt, e, deadline)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    # --- sync --------------------------------------------------------------
+
+    def complete(self, model: str, messages: List[Dict[str, str]]) -> str:
+        """
+        Blocking completion with the same deadline and retries (not hedged).
+        """
+        deadline = time.monotonic() + self.timeout
+        self.completions += 1
+        attempt = 0
+        while True:
+            try:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._sync_slots.acquire(timeout=remaining):
+                    raise LLMTimeout(f"LLM completion did not finish within {self.timeout}s")
+                try:
+                    started = time.perf_counter()
+                    with LLM_CALLS_IN_FLIGHT.track_inprogress():
+                        response = self.client.chat.completions.create(model=model, messages=messages, timeout=deadline - time.monotonic())
+                    self._latencies.append(time.perf_counter() - started)
+                    return response.choices[0].message.content
+                finally:
+                    self._sync_slots.release()
+            except Exception as e:
+                delay = self._retry_delay(attempt, e, deadline)
+            time.sleep(delay)
+            attempt += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Returns completion, retry, hedge and timeout counters, recent latency percentiles and the current hedge delay.
+        """
+        p50, p95 = self._percentile(0.50), self._percentile(0.95)
+        delay = self.hedge_delay()
+        return {
+            "completions": self.completions,
+            "retries": self.retries,
+            "timeouts": self.timeouts,
+            "hedging": self.hedge,
+            "hedges": self.hedges,
+            "hedges_won": self.hedges_won,
+            "hedge_delay_ms": round(delay * 1000, 1) if delay is not None else None,
+            "latency_p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "latency_p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+        }
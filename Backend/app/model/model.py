@@ -1,28 +1,170 @@
 from dotenv import load_dotenv
 import os
-from openai import OpenAI
+import threading
+import time
+import httpx
+from openai import OpenAI, AsyncOpenAI, DefaultHttpxClient, DefaultAsyncHttpxClient
 load_dotenv()
-from sentence_transformers import SentenceTransformer
 from langchain.llms.base import LLM
 from pydantic import Field
-from typing import Any
+from typing import Any, AsyncIterator
+from langchain_core.outputs import GenerationChunk
+from app.Function.metrics import observe, timed
+from app.model.llm_client import LLM_TIMEOUT_SECONDS, ResilientLLMClient
 # from langchain.schema import Generation, LLMResult
-model = SentenceTransformer("all-MiniLM-L6-v2")
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+# How the embedding model runs on CPU: "torch" (fp32 PyTorch), "int8" (PyTorch
+# with dynamically int8-quantized Linear layers) or "onnx" (ONNX Runtime).
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+# ONNX file of the model repository used by the onnx backend; the repository also
+# ships int8-quantized exports such as onnx/model_quint8_avx2.onnx.
+EMBEDDING_ONNX_FILE = os.getenv("EMBEDDING_ONNX_FILE", "onnx/model.onnx")
+# Intra-op threads of one forward pass; 0 keeps the runtime's default (all cores).
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "0"))
+# Unix socket of a shared embedding server (python -m app.model.embedding_server).
+# When set, API workers send encode requests there and load only the tokenizer.
+EMBEDDING_SERVER_SOCKET = os.getenv("EMBEDDING_SERVER_SOCKET")
+LLM_BASE_URL = os.getenv("LLM_BASE_URL", "https://api.studio.nebius.com/v1/")
+LLM_MODEL_NAME = "mistralai/Mistral-Nemo-Instruct-2407"
+# Connection pool shared by all completions: open connections are kept alive
+# and reused, so a request does not pay a TCP and TLS handshake.
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "64"))
+LLM_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_KEEPALIVE_CONNECTIONS", "32"))
+LLM_KEEPALIVE_SECONDS = float(os.getenv("LLM_KEEPALIVE_SECONDS", "60"))
+LLM_CONNECT_TIMEOUT_SECONDS = float(os.getenv("LLM_CONNECT_TIMEOUT_SECONDS", "5"))
 
-client = OpenAI(
-    base_url="https://api.studio.nebius.com/v1/",
-    api_key=os.getenv("NEBIUS_API_KEY"),
-)
+# Loaded on first use (or by the startup warmup), not at import, so importing
+# the app stays fast and a reload or a new worker boots immediately.
+_model = None
+_clients = None
+_llm = None
+_lock = threading.Lock()
+
+
+class LLMNotConfigured(ValueError):
+    """Raised when the LLM API is needed but NEBIUS_API_KEY is not set."""
+
+def embedding_model_id(backend: str = EMBEDDING_BACKEND, onnx_file: str = EMBEDDING_ONNX_FILE) -> str:
+    """
+    Identity of the vectors a backend produces, for keying cached embeddings.
+    Quantized backends drift slightly from fp32, so their vectors are cached apart.
+    """
+    if backend == "torch":
+        return EMBEDDING_MODEL_NAME
+    if backend == "onnx":
+        return f"{EMBEDDING_MODEL_NAME}@onnx:{onnx_file}"
+    return f"{EMBEDDING_MODEL_NAME}@{backend}"
+
+def load_embedding_model(backend: str = EMBEDDING_BACKEND, threads: int = EMBEDDING_THREADS, onnx_file: str = EMBEDDING_ONNX_FILE):
+    """
+    Loads the embedding model for one backend. Used by get_model() and by the
+    parity and throughput benchmarks, which compare backends side by side.
+    Args:
+        backend: "torch", "int8" or "onnx".
+        threads: Intra-op threads; 0 keeps the runtime's default.
+        onnx_file: ONNX file inside the model repository, for the onnx backend.
+    """
+    from sentence_transformers import SentenceTransformer
+    if backend == "onnx":
+        import onnxruntime
+        options = onnxruntime.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        return SentenceTransformer(
+            EMBEDDING_MODEL_NAME,
+            device="cpu",
+            backend="onnx",
+            model_kwargs={"file_name": onnx_file, "provider": "CPUExecutionProvider", "session_options": options},
+        )
+    if backend not in ("torch", "int8"):
+        raise ValueError(f"Unknown EMBEDDING_BACKEND: {backend}")
+    import torch
+    if threads:
+        torch.set_num_threads(threads)
+    if backend == "torch":
+        return SentenceTransformer(EMBEDDING_MODEL_NAME)
+    # Dynamic quantization: int8 weights for every Linear layer, activations
+    # quantized on the fly. CPU only.
+    model = SentenceTransformer(EMBEDDING_MODEL_NAME, device="cpu")
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+def get_model():
+    """
+    Returns the shared SentenceTransformer for EMBEDDING_BACKEND, loading it on first call,
+    or a RemoteEmbedder with the same encode() when EMBEDDING_SERVER_SOCKET is set.
+    """
+    global _model
+    if _model is None:
+        with _lock:
+            if _model is None:
+                if EMBEDDING_SERVER_SOCKET:
+                    from app.model.embedding_server import RemoteEmbedder
+                    _model = RemoteEmbedder(EMBEDDING_SERVER_SOCKET)
+                else:
+                    _model = load_embedding_model()
+    return _model
+
+def get_tokenizer():
+    """
+    Returns the embedding model's own (fast) tokenizer, so chunk sizes are
+    measured with exactly the tokenizer that encodes them. With an embedding
+    server, the tokenizer is the only part of the model loaded in the worker.
+    """
+    return get_model().tokenizer
+
+def model_loaded() -> bool:
+    return _model is not None
+
+def build_clients(base_url: str, api_key: str):
+    """
+    Creates (sync, async) OpenAI-compatible clients on keep-alive connection pools.
+    Their own retries are off: ResilientLLMClient retries within each completion's deadline.
+    """
+    limits = httpx.Limits(
+        max_connections=LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=LLM_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=LLM_KEEPALIVE_SECONDS,
+    )
+    timeout = httpx.Timeout(LLM_TIMEOUT_SECONDS, connect=LLM_CONNECT_TIMEOUT_SECONDS)
+    return (
+        OpenAI(base_url=base_url, api_key=api_key, max_retries=0, http_client=DefaultHttpxClient(limits=limits, timeout=timeout)),
+        AsyncOpenAI(base_url=base_url, api_key=api_key, max_retries=0, http_client=DefaultAsyncHttpxClient(limits=limits, timeout=timeout)),
+    )
+
+def get_clients():
+    """
+    Returns the (sync, async) OpenAI-compatible clients for the LLM API, created on first call.
+    The async client is used from request handlers so a slow completion doesn't block the event loop.
+    """
+    global _clients
+    if _clients is None:
+        with _lock:
+            if _clients is None:
+                api_key = os.getenv("NEBIUS_API_KEY")
+                if not api_key:
+                    raise LLMNotConfigured("NEBIUS_API_KEY environment variable is not set.")
+                _clients = build_clients(LLM_BASE_URL, api_key)
+    return _clients
+
+async def aclose_clients() -> None:
+    """
+    Closes the connection pools of the LLM clients, if they were created. Run at shutdown.
+    """
+    if _clients is not None:
+        client, async_client = _clients
+        client.close()
+        await async_client.close()
 
 class NebiusLLM(LLM):
-    client: Any = Field(exclude=True)  # exclude=True prevents Pydantic serialization issues
+    client: Any = Field(exclude=True)  # ResilientLLMClient; exclude=True prevents Pydantic serialization issues
     model_name: str
 
     def __init__(self, client, model_name: str):
         # Use `super().__init__` to properly initialize BaseModel
         super().__init__(client=client, model_name=model_name)
 
-    def _call(self, prompt: str, context: str = "", stop=None) -> str:
+    @staticmethod
+    def _messages(prompt: str, context: str = ""):
         # Combine the context and the original prompt into a single user message.
         # This is a standard and effective RAG pattern.
         formatted_prompt = f"""Based on the context below, please answer the question. If the answer is not in the context, say you don't know.
@@ -33,7 +175,7 @@ Context:
 Question:
 {prompt}"""
 
-        messages = [
+        return [
             {
                 "role": "system",
                 "content": "You are a helpful assistant that answers questions based on the provided context.",
@@ -41,15 +183,48 @@ Question:
             {"role": "user", "content": formatted_prompt},
         ]
 
-        response = self.client.chat.completions.create(
-            model=self.model_name,
-            messages=messages,
-        )
-        return response.choices[0].message.content
+    def _call(self, prompt: str, context: str = "", stop=None) -> str:
+        with timed("llm"):
+            return self.client.complete(self.model_name, self._messages(prompt, context))
+
+    async def _acall(self, prompt: str, context: str = "", stop=None) -> str:
+        # Timed end to end, retries and hedges included
+        with timed("llm"):
+            return await self.client.acomplete(self.model_name, self._messages(prompt, context))
+
+    async def _astream(self, prompt: str, stop=None, run_manager=None, context: str = "", **kwargs) -> AsyncIterator[GenerationChunk]:
+        # Backs llm.astream(): yields tokens as the OpenAI-compatible API streams them.
+        # "llm" times the whole stream, "llm_first_token" the wait for its first token.
+        started = time.perf_counter()
+        first_token = True
+        with timed("llm"):
+            async for text in self.client.astream(self.model_name, self._messages(prompt, context)):
+                if first_token:
+                    observe("llm_first_token", time.perf_counter() - started)
+                    first_token = False
+                chunk = GenerationChunk(text=text)
+                if run_manager:
+                    await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+                yield chunk
 
     @property
     def _llm_type(self) -> str:
         return "nebius"
     
 def get_llm():
-    return NebiusLLM(client=client, model_name="mistralai/Mistral-Nemo-Instruct-2407")
+    """
+    Returns the shared LLM, created on first call with the pooled clients.
+    """
+    global _llm
+    if _llm is None:
+        client, async_client = get_clients()
+        with _lock:
+            if _llm is None:
+                _llm = NebiusLLM(client=ResilientLLMClient(client, async_client), model_name=LLM_MODEL_NAME)
+    return _llm
+
+def built_llm():
+    """
+    Returns the shared LLM if it has been created, without creating it.
+    """
+    return _llm
@@ -1,18 +1,34 @@
 
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
-from fastapi.responses import JSONResponse
-import tempfile
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends, Query, status
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+import json
 import os
 from pathlib import Path
-from app.Function.chunking import query_chunks, convert_document, chunk_document, embed_store_chunks
-from typing import List
-from datetime import datetime
+import hashlib
+import shutil
+from app.Function.chunking import aquery_chunks, aembed_query, query_batcher
+from app.Function.context import abuild_context, count_tokens
+from app.Function.bulk import spool_uploads
+from app.Function.concurrency import run_io
+from app.Function.jobs import job_manager, QueueFull
+from app.Function.documents import clear_manifests, delete_document, document_id_for
+from app.Function.caching import answer_cache, cache_stats, invalidate_retrieval_cache
+from typing import List, Optional
 # Assuming these are correctly imported and initialized
-from app.db.pinecone import pinecone
-from app.db.mongo import chat_history_collection
+from app.db.vector_store import async_vector_store
 from bson import ObjectId
-from app.Function.crud_operations import create_conversation, store_user_message, store_bot_reply
-from app.model.model import get_llm # We only need the get_llm function
+from app.Function.crud_operations import (
+    create_conversation,
+    delete_conversation_by_id,
+    get_conversation_by_id,
+    get_messages,
+    list_conversations,
+)
+from app.Function.history import history_writer
+from app.Function.lifecycle import lifecycle
+from app.Function.metrics import CHUNKS, TOKENS, metrics_payload
+from app.model.model import LLMNotConfigured, built_llm, get_llm
+from app.model.llm_client import LLMTimeout
 from app.schemas.schema1 import QueryRequest, RetrieveQuery, QueryResponse, LLMResponse
 
 router = APIRouter()
@@ -29,7 +45,7 @@ async def handle_query(payload: QueryRequest):
     without involving the LLM.
     """
     try:
-        results = query_chunks(payload.text_query)
+        results = await aquery_chunks(payload.text_query, ef=payload.ef)
         
         if not isinstance(results, list) or not all(isinstance(item, str) for item in results):
             raise HTTPException(status_code=500, detail="Internal error: query_chunks did not return a list of strings.")
@@ -41,47 +57,180 @@ async def handle_query(payload: QueryRequest):
 
 
 ALLOWED_TYPES = ["application/pdf", "application/vnd.openxmlformats-officedocument.wordprocessingml.document"]
-MAX_FILE_SIZE_MB = 50
+MAX_FILE_SIZE_MB = int(os.getenv("MAX_FILE_SIZE_MB", "50"))
+UPLOAD_READ_CHUNK_BYTES = 1024 * 1024
 
-@router.post("/upload")
-async def upload_file(file: UploadFile = File(...)):
+def spool_upload(file: UploadFile, max_bytes: int) -> Path:
     """
-    Handles file uploads, validates them, converts them to text,
-    chunks the text, and stores the embeddings in Pinecone.
+    Streams an upload into a new job spool file a chunk at a time, so the document
+    is never held in memory whole, and stops as soon as it grows past max_bytes.
+    Returns:
+        The spool file, for job_manager.submit.
+    """
+    if file.size is not None and file.size > max_bytes:
+        raise HTTPException(status_code=400, detail=f"File size exceeds {MAX_FILE_SIZE_MB} MB limit.")
+    path = job_manager.spool_file()
+    try:
+        written = 0
+        with open(path, "wb") as out:
+            while True:
+                chunk = file.file.read(UPLOAD_READ_CHUNK_BYTES)
+                if not chunk:
+                    return path
+                written += len(chunk)
+                if written > max_bytes:
+                    raise HTTPException(status_code=400, detail=f"File size exceeds {MAX_FILE_SIZE_MB} MB limit.")
+                out.write(chunk)
+    except BaseException:
+        path.unlink(missing_ok=True)
+        raise
+
+@router.post("/upload", status_code=status.HTTP_202_ACCEPTED)
+async def upload_file(file: UploadFile = File(...), document_id: Optional[str] = Form(None)):
+    """
+    Validates an upload and queues it for background ingestion (text extraction,
+    chunking, embedding and upsert). Returns a job id to poll at GET /jobs/{job_id}.
+
+    Uploading again with the same document_id (by default derived from the file
+    name) re-embeds only the pages that changed and removes vectors of deleted pages.
     """
     if file.content_type not in ALLOWED_TYPES:
         raise HTTPException(status_code=400, detail="Only PDF and DOCX files are supported.")
 
-    contents = await file.read()
-    file_size_mb = len(contents) / (1024 * 1024)
-    if file_size_mb > MAX_FILE_SIZE_MB:
-        raise HTTPException(status_code=400, detail=f"File size exceeds {MAX_FILE_SIZE_MB} MB limit.")
-
-    # Create a temporary directory if it doesn't exist
-    temp_dir = Path("./temp_uploads")
-    temp_dir.mkdir(exist_ok=True)
-    
-    suffix = Path(file.filename).suffix
-    
-    # Use a context manager for the temporary file to ensure it's handled safely
-    with tempfile.NamedTemporaryFile(delete=False, dir=temp_dir, suffix=suffix) as tmp:
-        tmp.write(contents)
-        tmp_path = Path(tmp.name)
+    spooled = await run_io(spool_upload, file, MAX_FILE_SIZE_MB * 1024 * 1024)
+    size = spooled.stat().st_size
+    filetype = Path(file.filename).suffix.lstrip(".").lower() or "pdf"
 
     try:
-        print(f"Processing temporary file: {tmp_path}")
-        document_text = convert_document(str(tmp_path))
-        chunks = chunk_document(document_text)
-        embed_store_chunks(chunks)
-        return {"message": f"Document '{file.filename}' processed successfully. {len(chunks)} chunks were stored."}
+        document_id = document_id or document_id_for(file.filename)
+        job_id = await run_io(job_manager.submit, spooled, file.filename, filetype, document_id)
+        print(f"Queued ingestion job {job_id} for {file.filename} ({size} bytes)")
+        return {
+            "job_id": job_id,
+            "document_id": document_id,
+            "status": "queued",
+            "message": f"Document '{file.filename}' queued for processing.",
+        }
+    except QueueFull:
+        raise HTTPException(status_code=503, detail="Too many documents are being processed. Please retry shortly.")
     except Exception as e:
         import traceback
         traceback.print_exc()
-        raise HTTPException(status_code=500, detail=f"An unexpected error occurred while processing the document: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to queue the document for processing: {e}")
     finally:
-        # Ensure the temporary file is always removed
-        print(f"Cleaning up temporary file: {tmp_path}")
-        os.remove(tmp_path)
+        # Still here only if the job was not created
+        spooled.unlink(missing_ok=True)
+
+def spool_bulk_upload(files: List[UploadFile]) -> dict:
+    """
+    Spools a bulk upload to a staging directory and hands it to a bulk ingestion job.
+    """
+    staging = job_manager.staging_dir()
+    try:
+        spooled = spool_uploads([(f.filename, f.file) for f in files], staging, MAX_FILE_SIZE_MB * 1024 * 1024)
+        return {"job_id": job_manager.submit_bulk(staging, spooled["files"]), **spooled}
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+@router.post("/upload/bulk", status_code=status.HTTP_202_ACCEPTED)
+async def upload_bulk(files: List[UploadFile] = File(...)):
+    """
+    Queues many documents as one bulk ingestion job: any mix of PDF and DOCX
+    files and zip archives of them. Identical files are ingested once, and each
+    document's id is derived from its name (archive members from their path in
+    the archive, under the archive's name). Returns a job id to poll at
+    GET /jobs/{job_id}.
+    """
+    try:
+        result = await run_io(spool_bulk_upload, files)
+        print(f"Queued bulk ingestion job {result['job_id']} for {result['files']} documents")
+        return {**result, "status": "queued", "message": f"{result['files']} documents queued for processing."}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except QueueFull:
+        raise HTTPException(status_code=503, detail="Too many documents are being processed. Please retry shortly.")
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Failed to queue the documents for processing: {e}")
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """
+    Returns the status and per-stage progress of an ingestion job.
+    """
+    if not ObjectId.is_valid(job_id):
+        raise HTTPException(status_code=404, detail="Job not found.")
+    job = await run_io(job_manager.get, job_id, dependency="mongo")
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job
+
+@router.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """
+    Cancels a queued or running ingestion job.
+    """
+    if not ObjectId.is_valid(job_id):
+        raise HTTPException(status_code=404, detail="Job not found.")
+    job = await run_io(job_manager.cancel, job_id, dependency="mongo")
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job
+
+@router.delete("/documents/{document_id}")
+async def remove_document(document_id: str):
+    """
+    Deletes every vector of one document from the vector store.
+    """
+    try:
+        deleted = await run_io(delete_document, document_id)
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Failed to delete document: {e}")
+    if deleted is None:
+        raise HTTPException(status_code=404, detail="Document not found.")
+    answer_cache.clear()
+    return {"message": f"Document '{document_id}' deleted.", "vectors_deleted": deleted}
+
+NO_CONTEXT_REPLY = "I could not find any relevant information in the uploaded documents to answer your question."
+
+def build_prompt(context: str, query: str) -> str:
+    return (
+        f"You are a helpful assistant. Please provide a concise answer to the user's question "
+        f"based ONLY on the following context. If the answer is not in the context, "
+        f"state that you cannot find an answer in the provided documents.\n\n"
+        f"Context:\n{context}\n\n"
+        f"Question: {query}"
+    )
+
+def prompt_tokens_for(final_prompt: str, context) -> int:
+    """
+    Approximates the tokens of the prompt sent to the LLM (see count_tokens) and
+    logs how its context was assembled.
+    """
+    tokens = count_tokens(final_prompt)
+    TOKENS.labels("prompt").inc(tokens)
+    TOKENS.labels("context").inc(context.token_count)
+    CHUNKS.labels("retrieved").inc(len(context.chunks))
+    print(
+        f"Prompt: ~{tokens} tokens, context {context.token_count} tokens from {len(context.chunks)} of "
+        f"{context.candidates} candidate chunks ({context.duplicates} near-duplicates dropped)"
+    )
+    return tokens
+
+async def lookup_cached_answer(payload: RetrieveQuery, context: str):
+    """
+    Checks the semantic answer cache for a question equivalent to payload.query over the same context.
+    Returns:
+        The query embedding, the context hash and the cached answer (None on a miss or bypass).
+    """
+    query_vector = await aembed_query(payload.query)
+    context_hash = hashlib.sha256(context.encode("utf-8")).hexdigest()
+    answer = None if payload.bypass_cache else answer_cache.lookup(query_vector, context_hash)
+    return query_vector, context_hash, answer
 
 @router.get("/retrieve", response_model=LLMResponse)
 async def fetch_response(payload: RetrieveQuery = Depends()):
@@ -93,62 +242,176 @@ async def fetch_response(payload: RetrieveQuery = Depends()):
     convo_id = payload.convo_id
 
     try:
-        # 1. Retrieve relevant context from the vector database
-        relevant_chunks = query_chunks(query)
-        context = "\n".join(relevant_chunks)
-        
+        # 1. Retrieve relevant, deduplicated context within the prompt token budget
+        built = await abuild_context(query, ef=payload.ef)
+        context = built.text
+        prompt_tokens = 0
+
         # If no context is found, we can optionally short-circuit
         if not context.strip():
-            bot_reply = "I could not find any relevant information in the uploaded documents to answer your question."
-            if convo_id:
-                store_user_message(convo_id, query, datetime.now())
-                store_bot_reply(convo_id, bot_reply, datetime.now())
-            return {"response": bot_reply, "convo_id": convo_id}
-
-        # 2. Get the initialized LLM
-        llm = get_llm()
-
-        # 3. Prepare the final prompt for the LLM
-        final_prompt = (
-            f"You are a helpful assistant. Please provide a concise answer to the user's question "
-            f"based ONLY on the following context. If the answer is not in the context, "
-            f"state that you cannot find an answer in the provided documents.\n\n"
-            f"Context:\n{context}\n\n"
-            f"Question: {query}"
-        )
-
-        # Use the modern .invoke() method, which is the correct way.
-        llm_response = llm.invoke(final_prompt)
-        
-        # 4. Store user message and bot reply if convo_id is provided
-        if convo_id:
-            store_user_message(convo_id, query, datetime.now())
-            store_bot_reply(convo_id, llm_response, datetime.now())
+            await history_writer.record(convo_id, query, NO_CONTEXT_REPLY)
+            return {"response": NO_CONTEXT_REPLY, "convo_id": convo_id}
+
+        # 2. Serve a semantically equivalent question over the same context from the cache
+        query_vector, context_hash, llm_response = await lookup_cached_answer(payload, context)
+        cached = llm_response is not None
+
+        if not cached:
+            # 3. Prepare the final prompt for the LLM
+            llm = get_llm()
+            final_prompt = build_prompt(context, query)
+            prompt_tokens = prompt_tokens_for(final_prompt, built)
+
+            # ainvoke uses the AsyncOpenAI client, so the event loop keeps serving other requests.
+            # The client bounds in-flight completions and retries transient errors within a deadline.
+            llm_response = await llm.ainvoke(final_prompt)
+            answer_cache.store(query_vector, context_hash, llm_response)
+
+        # 4. Store user message and bot reply if convo_id is provided (off the response path)
+        await history_writer.record(convo_id, query, llm_response)
 
         # 5. Return the response.
-        return {"response": llm_response, "convo_id": convo_id}
+        return {"response": llm_response, "convo_id": convo_id, "cached": cached, "approx_prompt_tokens": prompt_tokens}
 
+    except LLMTimeout as e:
+        raise HTTPException(status_code=504, detail=f"The LLM did not answer in time: {e}")
+    except LLMNotConfigured as e:
+        raise HTTPException(status_code=503, detail=f"The LLM is not configured: {e}")
     except Exception as e:
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Error during LLM inference: {e}")
 
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@router.get("/retrieve/stream")
+async def stream_response(payload: RetrieveQuery = Depends()):
+    """
+    Streaming variant of /retrieve. Emits Server-Sent Events: one `token` event
+    per piece of the answer as the LLM produces it, then a `done` event with
+    the full response. The turn is recorded in the conversation once the stream
+    completes; an `error` event is sent if generation fails midway.
+    """
+    query = payload.query
+    convo_id = payload.convo_id
+
+    try:
+        built = await abuild_context(query, ef=payload.ef)
+        context = built.text
+        if context.strip():
+            query_vector, context_hash, cached_answer = await lookup_cached_answer(payload, context)
+            if cached_answer is None:
+                get_llm()  # Fail before the stream starts if the LLM is not configured
+    except LLMNotConfigured as e:
+        raise HTTPException(status_code=503, detail=f"The LLM is not configured: {e}")
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Error during retrieval: {e}")
+
+    async def events():
+        try:
+            prompt_tokens = 0
+            if not context.strip():
+                reply, cached = NO_CONTEXT_REPLY, False
+                yield sse_event("token", {"token": reply})
+            elif cached_answer is not None:
+                reply, cached = cached_answer, True
+                yield sse_event("token", {"token": reply})
+            else:
+                parts = []
+                final_prompt = build_prompt(context, query)
+                prompt_tokens = prompt_tokens_for(final_prompt, built)
+                async for token in get_llm().astream(final_prompt):
+                    parts.append(token)
+                    yield sse_event("token", {"token": token})
+                reply, cached = "".join(parts), False
+                answer_cache.store(query_vector, context_hash, reply)
+
+            await history_writer.record(convo_id, query, reply)
+            yield sse_event("done", {"response": reply, "convo_id": convo_id, "cached": cached, "approx_prompt_tokens": prompt_tokens})
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            yield sse_event("error", {"detail": f"Error during LLM inference: {e}"})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @router.post("/clear-database")
 async def clear_database():
     """
-    Clears all vectors from the Pinecone index. Use with extreme caution!
+    Clears all vectors from the vector store. Use with extreme caution!
     """
     try:
-        print("Received request to clear entire Pinecone index.")
-        # Assuming your pinecone object has an index attached to it
-        # The exact method might vary based on your pinecone client version
-        pinecone.delete(delete_all=True)
-        print("Pinecone index successfully cleared.")
-        return JSONResponse(status_code=200, content={"message": "Pinecone database cleared successfully."})
+        print("Received request to clear entire vector store.")
+        await async_vector_store.delete(delete_all=True)
+        await async_vector_store.flush()
+        await run_io(clear_manifests, dependency="mongo")
+        invalidate_retrieval_cache()
+        answer_cache.clear()
+        print("Vector store successfully cleared.")
+        return JSONResponse(status_code=200, content={"message": "Vector database cleared successfully."})
     except Exception as e:
         import traceback
         traceback.print_exc()
-        raise HTTPException(status_code=500, detail=f"Failed to clear Pinecone database: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to clear vector database: {e}")
+
+@router.get("/cache/stats")
+async def get_cache_stats():
+    """
+    Returns size and hit/miss counters for the query embedding and retrieval caches.
+    """
+    return cache_stats()
+
+@router.get("/healthz")
+async def healthz():
+    """
+    Liveness: the process is up and serving. Does not touch any dependency.
+    """
+    return {"status": "ok", "started": lifecycle.started, "import_seconds": lifecycle.import_seconds}
+
+@router.get("/readyz")
+async def readyz():
+    """
+    Readiness: 200 once startup has finished and the model, MongoDB, the vector
+    store and the LLM client are all available, 503 otherwise. Reports each
+    dependency separately, plus the measured import-to-ready time.
+    """
+    report = await lifecycle.readiness()
+    return JSONResponse(status_code=200 if report["ready"] else 503, content=report)
+
+@router.get("/metrics")
+async def metrics():
+    """
+    Prometheus metrics: per-stage latency histograms, request latency by route,
+    requests and LLM calls in flight, and token and chunk counters.
+    """
+    content, content_type = metrics_payload()
+    return Response(content=content, media_type=content_type)
+
+@router.get("/llm/stats")
+async def get_llm_stats():
+    """
+    Returns completion, retry, hedge and timeout counters of the LLM client, its
+    recent latency percentiles and the current hedge delay. Until the first
+    completion creates the client, returns only whether the LLM is configured.
+    """
+    llm = built_llm()
+    if llm is None:
+        return {"configured": bool(os.getenv("NEBIUS_API_KEY")), "built": False}
+    return {"configured": True, "built": True, **llm.client.stats()}
+
+@router.get("/embeddings/stats")
+async def get_embedding_stats():
+    """
+    Returns queue depth and batch-size histogram of the query embedding micro-batcher.
+    """
+    return query_batcher.stats()
 
 # @router.get("/conversation")
 # async def get_conversation(convo_id: str = None):
@@ -171,44 +434,56 @@ async def clear_database():
 #         traceback.print_exc()
 #         raise HTTPException(status_code=500, detail=f"Failed to retrieve conversation: {e}")
 
+# Page sizes for /conversation messages and /conversations
+MESSAGE_PAGE_SIZE = int(os.getenv("MESSAGE_PAGE_SIZE", "50"))
+CONVERSATION_PAGE_SIZE = int(os.getenv("CONVERSATION_PAGE_SIZE", "20"))
+MAX_PAGE_SIZE = 500
+
 @router.get("/conversation")
-async def get_conversation(convo_id: str = None):
+async def get_conversation(
+    convo_id: str = None,
+    limit: int = Query(MESSAGE_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    before: Optional[str] = None,
+    since: Optional[str] = None,
+):
     """
-    Retrieves a conversation by its ID, or the latest conversation if no ID is provided.
+    Retrieves a conversation by its ID, or the latest conversation if no ID is provided,
+    with one page of its messages: the newest `limit` messages by default, those older
+    than message id `before` (to scroll back), or those newer than message id `since`
+    (to catch up). `next_before` is the cursor for the page of older messages, if any.
     """
     try:
-        if convo_id:
-            convo = chat_history_collection.find_one({"_id": ObjectId(convo_id)})
-            if not convo:
-                raise HTTPException(status_code=404, detail="Conversation not found.")
-        else:
-            # Sort by _id which is chronological by default
-            convo = chat_history_collection.find_one(sort=[("_id", -1)])
-            if not convo:
-                raise HTTPException(status_code=404, detail="No conversations found.")
+        convo = await get_conversation_by_id(convo_id)
+        if not convo:
+            detail = "Conversation not found." if convo_id else "No conversations found."
+            raise HTTPException(status_code=404, detail=detail)
 
         # 1. Convert the main document's ID and rename the key
         convo["id"] = str(convo.pop("_id"))
 
-        # 2. Check for and convert IDs within the nested messages array
-        if "messages" in convo and isinstance(convo["messages"], list):
-            for message in convo["messages"]:
-                if "_id" in message:
-                    message["id"] = str(message.pop("_id"))
+        # 2. Fetch one page of messages and convert their IDs
+        messages, has_more = await get_messages(convo["id"], limit, before=before, since=since)
+        for message in messages:
+            message["id"] = str(message.pop("_id"))
+        convo["messages"] = messages
+        convo["has_more"] = has_more
+        convo["next_before"] = messages[0]["id"] if messages and has_more and not since else None
         return convo
 
+    except HTTPException:
+        raise
     except Exception as e:
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Failed to retrieve conversation: {e}")
 
 @router.post("/conversation")
-def create_conversation_route():
+async def create_conversation_route():
     """
     Creates a new conversation and returns its ID.
     """
     try:
-        convo_id = create_conversation()
+        convo_id = await create_conversation()
         return ({"id": convo_id})
     except Exception as e:
         import traceback
@@ -216,24 +491,24 @@ def create_conversation_route():
         raise HTTPException(status_code=500, detail=f"Failed to create conversation: {e}")
     
 @router.get("/conversations")
-async def get_all_conversations():
+async def get_all_conversations(
+    limit: int = Query(CONVERSATION_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    before: Optional[str] = None,
+):
     """
-    Retrieves a list of all conversations, returning only their ID and creation date.
+    Retrieves one page of conversations, most recent first, returning only their ID and
+    creation date. Pass `next_before` from the response as `before` to get the next page.
     """
     try:
-        # Project to only get the necessary fields, and sort by most recent
-        cursor = chat_history_collection.find({}, {"messages": 0}).sort("_id", -1)
-        
-        conversations = []
-        for convo in cursor:
+        conversations, has_more = await list_conversations(limit, before=before)
+        for convo in conversations:
             convo["id"] = str(convo.pop("_id"))
-            conversations.append(convo)
-            
-        return conversations
+
+        next_before = conversations[-1]["id"] if conversations and has_more else None
+        return {"conversations": conversations, "next_before": next_before}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to retrieve conversations: {e}")
-    
-from fastapi import status
+
 
 @router.delete("/conversation/{convo_id}", status_code=status.HTTP_200_OK)
 async def delete_conversation(convo_id: str):
@@ -241,13 +516,8 @@ async def delete_conversation(convo_id: str):
     Deletes a conversation document from MongoDB by its ID.
     """
     try:
-        # Convert string ID to ObjectId
-        object_id = ObjectId(convo_id)
-        
         # Perform the delete operation
-        result = chat_history_collection.delete_one({"_id": object_id})
-        
-        if result.deleted_count == 1:
+        if await delete_conversation_by_id(convo_id):
             return {"message": "Conversation deleted successfully"}
         else:
             raise HTTPException(status_code=404, detail="Conversation not found")
@@ -1,12 +1,15 @@
 from pydantic import BaseModel, Field ,constr
-from typing import List
+from typing import List, Optional
 
 class QueryRequest(BaseModel):
     text_query: constr(min_length=3, max_length=200)# type: ignore
+    ef: Optional[int] = Field(None, ge=1, le=1000)  # HNSW candidate list size for this query; defaults to HNSW_EF_SEARCH
 
 class RetrieveQuery(BaseModel):
     query: constr(min_length=3, max_length=200) # type: ignore
     convo_id: str
+    bypass_cache: bool = False  # Skip the semantic answer cache and always call the LLM
+    ef: Optional[int] = Field(None, ge=1, le=1000)  # HNSW candidate list size for this query; defaults to HNSW_EF_SEARCH
 
 class QueryResponse(BaseModel):
     query: str
@@ -15,3 +18,5 @@ class QueryResponse(BaseModel):
 class LLMResponse(BaseModel):
     response: str
     convo_id: str
+    cached: bool = False
+    approx_prompt_tokens: int = 0  # Prompt size sent to the LLM in embedding-model tokens, not the LLM's own; 0 when no LLM call was made
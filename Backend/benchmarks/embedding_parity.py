@@ -0,0 +1,103 @@
+"""
+Parity check of the CPU embedding backends against the fp32 PyTorch model.
+
+Encodes the same texts with the reference (EMBEDDING_BACKEND=torch) and with
+each candidate backend, and reports per-text cosine similarity between the
+two vectors (the drift) and how often a query's top-k neighbours stay the same.
+Exits with status 1 when a backend's worst cosine falls below --min-cosine.
+
+Usage (from Backend/):
+    python -m benchmarks.embedding_parity --backends int8 onnx
+    python -m benchmarks.embedding_parity --backends onnx --onnx-file onnx/model_quint8_avx2.onnx
+    python -m benchmarks.embedding_parity --texts chunks.txt --output parity.json
+"""
+import argparse
+import json
+import random
+import sys
+from typing import Dict, List
+
+import numpy as np
+
+from app.model.model import load_embedding_model
+
+_WORDS = (
+    "the report describes revenue growth in the third quarter while operating costs remained flat "
+    "patients in the treatment group showed a significant reduction of symptoms after six weeks "
+    "install the package configure the environment variables and restart the server to apply changes "
+    "the contract may be terminated by either party with thirty days written notice "
+    "neural networks learn representations of text that capture semantic similarity between sentences "
+    "rainfall in the northern region exceeded the seasonal average causing local flooding"
+).split()
+
+
+def load_texts(path: str = None, count: int = 512, seed: int = 0) -> List[str]:
+    """
+    Texts to encode: one per non-empty line of `path`, or `count` synthetic
+    sentences of 8 to 120 words drawn from a fixed vocabulary.
+    """
+    if path:
+        with open(path, encoding="utf-8") as f:
+            return [line.strip() for line in f if line.strip()]
+    rng = random.Random(seed)
+    return [" ".join(rng.choices(_WORDS, k=rng.randint(8, 120))) for _ in range(count)]
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def compare(reference: np.ndarray, candidate: np.ndarray, top_k: int) -> Dict[str, float]:
+    """
+    Drift of `candidate` vectors from `reference` vectors of the same texts.
+    """
+    reference, candidate = _normalize(reference), _normalize(candidate)
+    cosine = np.sum(reference * candidate, axis=1)
+    # Neighbour agreement: every text in turn is the query against all the others
+    k = min(top_k, len(reference) - 1)
+    ref_scores, cand_scores = reference @ reference.T, candidate @ candidate.T
+    np.fill_diagonal(ref_scores, -np.inf)
+    np.fill_diagonal(cand_scores, -np.inf)
+    ref_top = np.argpartition(-ref_scores, k, axis=1)[:, :k]
+    cand_top = np.argpartition(-cand_scores, k, axis=1)[:, :k]
+    overlap = [len(set(a) & set(b)) / k for a, b in zip(ref_top, cand_top)]
+    return {
+        "cosine_mean": round(float(cosine.mean()), 6),
+        "cosine_min": round(float(cosine.min()), 6),
+        "cosine_p01": round(float(np.percentile(cosine, 1)), 6),
+        f"top{k}_overlap": round(float(np.mean(overlap)), 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=["int8", "onnx"], choices=["int8", "onnx"])
+    parser.add_argument("--onnx-file", default="onnx/model.onnx", help="ONNX file of the model repository")
+    parser.add_argument("--texts", help="File with one text per line (default: synthetic sentences)")
+    parser.add_argument("--count", type=int, default=512, help="Number of synthetic texts")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--min-cosine", type=float, default=0.99, help="Fail if any text drifts below this cosine")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    texts = load_texts(args.texts, args.count)
+    reference = load_embedding_model("torch").encode(texts, batch_size=64, show_progress_bar=False)
+
+    results, failed = {}, False
+    for backend in args.backends:
+        model = load_embedding_model(backend, onnx_file=args.onnx_file)
+        result = compare(reference, model.encode(texts, batch_size=64, show_progress_bar=False), args.top_k)
+        result["passed"] = result["cosine_min"] >= args.min_cosine
+        failed = failed or not result["passed"]
+        results[backend] = result
+        print(f"{backend:>6}: " + ", ".join(f"{key}={value}" for key, value in result.items()))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"texts": len(texts), "min_cosine": args.min_cosine, "backends": results}, f, indent=2)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Encode throughput of each CPU embedding backend.
+
+For every backend and thread count, measures batched encoding as ingestion
+does it (texts/sec) and single-query encoding as /query does it (p50/p95
+latency), after a warmup pass.
+
+Usage (from Backend/):
+    python -m benchmarks.embedding_throughput --backends torch int8 onnx --threads 1 4
+    python -m benchmarks.embedding_throughput --batch-size 64 --output throughput.json
+"""
+import argparse
+import json
+import time
+from typing import Dict, List
+
+from app.model.model import load_embedding_model
+from benchmarks.embedding_parity import load_texts
+
+
+def measure(model, texts: List[str], batch_size: int, queries: int) -> Dict[str, float]:
+    model.encode(texts[:batch_size], batch_size=batch_size, show_progress_bar=False)  # Warmup
+
+    started = time.perf_counter()
+    model.encode(texts, batch_size=batch_size, show_progress_bar=False)
+    batch_seconds = time.perf_counter() - started
+
+    latencies = []
+    for text in texts[:queries]:
+        started = time.perf_counter()
+        model.encode(text, show_progress_bar=False)
+        latencies.append(time.perf_counter() - started)
+    latencies.sort()
+    pick = lambda q: latencies[min(int(q * len(latencies)), len(latencies) - 1)] * 1000
+    return {
+        "texts_per_sec": round(len(texts) / batch_seconds, 1),
+        "query_p50_ms": round(pick(0.50), 2),
+        "query_p95_ms": round(pick(0.95), 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=["torch", "int8", "onnx"], choices=["torch", "int8", "onnx"])
+    parser.add_argument("--threads", type=int, nargs="+", default=[0], help="Intra-op thread counts to try (0: runtime default)")
+    parser.add_argument("--onnx-file", default="onnx/model.onnx", help="ONNX file of the model repository")
+    parser.add_argument("--texts", help="File with one text per line (default: synthetic sentences)")
+    parser.add_argument("--count", type=int, default=1024, help="Number of synthetic texts")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--queries", type=int, default=200, help="Single-text encodes for the latency figures")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    texts = load_texts(args.texts, args.count)
+    results = []
+    print(f"{'backend':>8} {'threads':>8} {'texts/s':>9} {'p50 ms':>8} {'p95 ms':>8}")
+    for backend in args.backends:
+        for threads in args.threads:
+            # torch.set_num_threads is process-wide, so each configuration loads its own model
+            model = load_embedding_model(backend, threads=threads, onnx_file=args.onnx_file)
+            result = {"backend": backend, "threads": threads, **measure(model, texts, args.batch_size, args.queries)}
+            results.append(result)
+            print(f"{backend:>8} {threads:>8} {result['texts_per_sec']:>9} {result['query_p50_ms']:>8} {result['query_p95_ms']:>8}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
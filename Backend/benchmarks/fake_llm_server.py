@@ -0,0 +1,141 @@
+"""
+Local OpenAI-compatible chat completions server with injectable latency and failures.
+
+Answers POST /v1/chat/completions, streamed or not, after a base latency plus
+jitter, with a fraction of requests hitting a slow tail and a fraction failing
+with 503 (or 429). GET /stats reports how many requests it received, so
+retries and hedges can be counted. Point the backend at it with
+LLM_BASE_URL=http://127.0.0.1:8100/v1/.
+
+Usage (from Backend/):
+    python -m benchmarks.fake_llm_server --port 8100 --latency-ms 300 --tail-rate 0.05 --tail-ms 5000 --error-rate 0.05
+"""
+import argparse
+import asyncio
+import json
+import random
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+@dataclass
+class FakeLLMConfig:
+    latency_ms: float = 300.0  # Time to first token
+    jitter_ms: float = 50.0  # Uniformly random extra latency
+    tail_rate: float = 0.0  # Fraction of requests that are slow...
+    tail_ms: float = 5000.0  # ...by this much more
+    error_rate: float = 0.0  # Fraction of requests answered with `error_status`
+    error_status: int = 503
+    tokens: int = 32
+    token_ms: float = 5.0  # Time per streamed token
+
+
+def create_app(config: FakeLLMConfig) -> FastAPI:
+    app = FastAPI()
+    counters = {"requests": 0, "errors": 0, "tail": 0, "completed": 0}
+
+    def completion_id() -> str:
+        return f"chatcmpl-{uuid.uuid4().hex[:12]}"
+
+    def answer_tokens(body) -> list:
+        words = body["messages"][-1]["content"].split()[-config.tokens:] or ["ok"]
+        return [f"{words[i % len(words)]} " for i in range(config.tokens)]
+
+    @app.post("/v1/chat/completions")
+    async def completions(request: Request):
+        body = await request.json()
+        counters["requests"] += 1
+        if random.random() < config.error_rate:
+            counters["errors"] += 1
+            await asyncio.sleep(config.latency_ms / 1000 / 10)
+            return JSONResponse(status_code=config.error_status, content={"error": {"message": "Injected failure", "type": "server_error"}})
+
+        delay = config.latency_ms + random.uniform(0, config.jitter_ms)
+        if random.random() < config.tail_rate:
+            counters["tail"] += 1
+            delay += config.tail_ms
+        await asyncio.sleep(delay / 1000)
+        tokens = answer_tokens(body)
+        created, model, cid = int(time.time()), body.get("model", "fake"), completion_id()
+
+        if not body.get("stream"):
+            await asyncio.sleep(len(tokens) * config.token_ms / 1000)
+            counters["completed"] += 1
+            return {
+                "id": cid,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(tokens)}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": len(tokens), "total_tokens": len(tokens)},
+            }
+
+        async def events():
+            for token in tokens:
+                chunk = {
+                    "id": cid,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}],
+                }
+                yield f"data: {json.dumps(chunk)}\n\n"
+                await asyncio.sleep(config.token_ms / 1000)
+            counters["completed"] += 1
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.get("/stats")
+    async def stats():
+        return counters
+
+    @app.post("/stats/reset")
+    async def reset():
+        for key in counters:
+            counters[key] = 0
+        return counters
+
+    return app
+
+
+def serve_in_thread(config: FakeLLMConfig, port: int = 0) -> str:
+    """
+    Runs the server on a daemon thread.
+    Returns:
+        Its OpenAI base URL, e.g. http://127.0.0.1:8100/v1/.
+    """
+    server = uvicorn.Server(uvicorn.Config(create_app(config), host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    bound_port = server.servers[0].sockets[0].getsockname()[1]
+    return f"http://127.0.0.1:{bound_port}/v1/"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency-ms", type=float, default=300.0)
+    parser.add_argument("--jitter-ms", type=float, default=50.0)
+    parser.add_argument("--tail-rate", type=float, default=0.0)
+    parser.add_argument("--tail-ms", type=float, default=5000.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--tokens", type=int, default=32)
+    parser.add_argument("--token-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    config = FakeLLMConfig(**{key: value for key, value in vars(args).items() if key != "port"})
+    print(f"Fake LLM API on http://127.0.0.1:{args.port}/v1/")
+    uvicorn.run(create_app(config), host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,361 @@
+"""
+In-process stand-ins for the backend's external services, for benchmarks.
+
+- FakeCollection / install_fake_mongo(): a MongoDB collection in a dict,
+  supporting the queries and updates the backend issues, with sync and
+  asyncio flavours. install_fake_mongo() must run before `app` is imported.
+- FakeLLMClient: an OpenAI-compatible chat.completions client that answers
+  after an injected delay, streamed or not.
+- add_latency(): injects a fixed delay into a vector store's calls.
+- FakeEmbedder: a deterministic hashing embedder with a word tokenizer, so
+  the harness can run without downloading the real model.
+
+Every fake injects latency with time.sleep / asyncio.sleep, so results show
+the backend's overhead on top of a service with known response times.
+"""
+import asyncio
+import copy
+import hashlib
+import itertools
+import re
+import sys
+import time
+import types
+from types import SimpleNamespace
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+from bson.objectid import ObjectId
+
+
+# --- MongoDB -----------------------------------------------------------------
+
+def _matches(doc: Dict[str, Any], query: Dict[str, Any]) -> bool:
+    for key, condition in query.items():
+        if key == "$or":
+            if not any(_matches(doc, clause) for clause in condition):
+                return False
+            continue
+        value = doc.get(key)
+        if isinstance(condition, dict) and any(op.startswith("$") for op in condition):
+            for op, operand in condition.items():
+                if op == "$in" and value not in operand:
+                    return False
+                if op == "$gt" and not (value is not None and value > operand):
+                    return False
+                if op == "$lt" and not (value is not None and value < operand):
+                    return False
+                if op == "$exists" and (key in doc) != bool(operand):
+                    return False
+        elif value != condition:
+            return False
+    return True
+
+
+def _project(doc: Dict[str, Any], projection: Optional[Dict[str, int]]) -> Dict[str, Any]:
+    doc = copy.deepcopy(doc)
+    if not projection:
+        return doc
+    if any(projection.values()):
+        return {key: value for key, value in doc.items() if key == "_id" or projection.get(key)}
+    return {key: value for key, value in doc.items() if key not in projection}
+
+
+def _apply(doc: Dict[str, Any], update: Dict[str, Any], inserting: bool) -> None:
+    for op, fields in update.items():
+        for key, value in fields.items():
+            if op == "$set" or (op == "$setOnInsert" and inserting):
+                # Dotted keys set a field of an embedded document
+                *parents, leaf = key.split(".")
+                target = doc
+                for parent in parents:
+                    target = target.setdefault(parent, {})
+                target[leaf] = copy.deepcopy(value)
+            elif op == "$unset":
+                doc.pop(key, None)
+            elif op == "$inc":
+                doc[key] = doc.get(key, 0) + value
+            elif op == "$push":
+                items = value["$each"] if isinstance(value, dict) and "$each" in value else [value]
+                doc.setdefault(key, []).extend(copy.deepcopy(items))
+
+
+class FakeCursor:
+    def __init__(self, docs: List[Dict[str, Any]]):
+        self._docs = docs
+
+    def sort(self, key, direction=None):
+        keys = key if isinstance(key, list) else [(key, direction or 1)]
+        for field, order in reversed(keys):
+            self._docs.sort(key=lambda doc: doc.get(field), reverse=order == -1)
+        return self
+
+    def limit(self, n: int):
+        if n:
+            self._docs = self._docs[:n]
+        return self
+
+    def __iter__(self):
+        return iter(self._docs)
+
+    async def to_list(self, length=None):
+        return list(self._docs)
+
+    def __aiter__(self):
+        self._iter = iter(self._docs)
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._iter)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class FakeCollection:
+    """
+    Dict-backed collection with the MongoDB operations the backend uses.
+    Every call sleeps `latency` seconds first.
+    """
+
+    OPERATIONS = (
+        "find_one", "find_one_and_update", "insert_one", "insert_many", "update_one", "update_many",
+        "delete_one", "delete_many", "create_index", "count_documents",
+    )
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self._docs: Dict[Any, Dict[str, Any]] = {}
+
+    def __getattr__(self, name):
+        if name not in self.OPERATIONS:
+            raise AttributeError(name)
+        operation = getattr(self, f"_{name}")
+
+        def call(*args, **kwargs):
+            if self.latency:
+                time.sleep(self.latency)
+            return operation(*args, **kwargs)
+        return call
+
+    def find(self, query=None, projection=None):
+        # Cursors are built without a round trip, as with pymongo
+        return FakeCursor([_project(doc, projection) for doc in self._docs.values() if _matches(doc, query or {})])
+
+    def _find_one(self, query=None, projection=None, sort=None):
+        cursor = self.find(query, projection)
+        if sort:
+            cursor.sort(sort)
+        return next(iter(cursor), None)
+
+    def _insert_one(self, doc):
+        doc.setdefault("_id", ObjectId())
+        self._docs[doc["_id"]] = copy.deepcopy(doc)
+        return SimpleNamespace(inserted_id=doc["_id"])
+
+    def _insert_many(self, docs, ordered=True):
+        for doc in docs:
+            self._insert_one(doc)
+        return SimpleNamespace(inserted_ids=[doc["_id"] for doc in docs])
+
+    def _update_one(self, query, update, upsert=False):
+        for doc in self._docs.values():
+            if _matches(doc, query):
+                _apply(doc, update, inserting=False)
+                return SimpleNamespace(matched_count=1, modified_count=1, upserted_id=None)
+        if upsert:
+            doc = {key: value for key, value in query.items() if not isinstance(value, dict)}
+            doc.setdefault("_id", ObjectId())
+            _apply(doc, update, inserting=True)
+            self._docs[doc["_id"]] = doc
+            return SimpleNamespace(matched_count=0, modified_count=0, upserted_id=doc["_id"])
+        return SimpleNamespace(matched_count=0, modified_count=0, upserted_id=None)
+
+    def _update_many(self, query, update):
+        docs = [doc for doc in self._docs.values() if _matches(doc, query)]
+        for doc in docs:
+            _apply(doc, update, inserting=False)
+        return SimpleNamespace(matched_count=len(docs), modified_count=len(docs), upserted_id=None)
+
+    def _find_one_and_update(self, query, update, projection=None):
+        # Returns the document as it was before the update, like pymongo's default
+        for doc in self._docs.values():
+            if _matches(doc, query):
+                before = _project(doc, projection)
+                _apply(doc, update, inserting=False)
+                return before
+        return None
+
+    def _delete_one(self, query):
+        for key, doc in self._docs.items():
+            if _matches(doc, query):
+                del self._docs[key]
+                return SimpleNamespace(deleted_count=1)
+        return SimpleNamespace(deleted_count=0)
+
+    def _delete_many(self, query):
+        keys = [key for key, doc in self._docs.items() if _matches(doc, query)]
+        for key in keys:
+            del self._docs[key]
+        return SimpleNamespace(deleted_count=len(keys))
+
+    def _create_index(self, keys, **kwargs):
+        return "_".join(f"{field}_{order}" for field, order in keys)
+
+    def _count_documents(self, query):
+        return sum(1 for doc in self._docs.values() if _matches(doc, query))
+
+
+class AsyncFakeCollection:
+    """
+    Asyncio view of a FakeCollection, shaped like pymongo's AsyncCollection:
+    the same documents, with the delay awaited instead of slept.
+    """
+
+    def __init__(self, collection: FakeCollection):
+        self._collection = collection
+
+    def find(self, query=None, projection=None):
+        return self._collection.find(query, projection)
+
+    def __getattr__(self, name):
+        if name not in FakeCollection.OPERATIONS:
+            raise AttributeError(name)
+        operation = getattr(self._collection, f"_{name}")
+
+        async def call(*args, **kwargs):
+            if self._collection.latency:
+                await asyncio.sleep(self._collection.latency)
+            return operation(*args, **kwargs)
+        return call
+
+
+def install_fake_mongo(latency: float = 0.0) -> types.ModuleType:
+    """
+    Registers an in-memory replacement for app.db.mongo. Sync and async handles
+    of a collection share the same documents, as they would on a real server.
+    """
+    collections = {name: FakeCollection(latency) for name in ("chat_history", "chat_messages", "ingest_jobs", "documents", "vector_store_state")}
+    module = types.ModuleType("app.db.mongo")
+    module.MONGO_URI = "fake://"
+    for name, collection in collections.items():
+        setattr(module, f"{name}_collection", collection)
+        setattr(module, f"async_{name}_collection", AsyncFakeCollection(collection))
+
+    async def ping():
+        if latency:
+            await asyncio.sleep(latency)
+    module.ping = ping
+    sys.modules["app.db.mongo"] = module
+    return module
+
+
+# --- LLM ---------------------------------------------------------------------
+
+class _FakeCompletions:
+    def __init__(self, latency: float, tokens: int, token_interval: float, is_async: bool):
+        self.latency = latency
+        self.tokens = tokens
+        self.token_interval = token_interval
+        self.is_async = is_async
+
+    def _answer(self, messages) -> List[str]:
+        words = messages[-1]["content"].split()[-self.tokens:] or ["ok"]
+        return [word + " " for word in itertools.islice(itertools.cycle(words), self.tokens)]
+
+    @staticmethod
+    def _completion(text: str):
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))])
+
+    @staticmethod
+    def _chunk(text: str):
+        return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+
+    def create(self, model: str, messages, stream: bool = False, **kwargs):
+        if self.is_async:
+            return self._acreate(messages, stream)
+        time.sleep(self.latency + self.tokens * self.token_interval)
+        return self._completion("".join(self._answer(messages)))
+
+    async def _acreate(self, messages, stream: bool):
+        await asyncio.sleep(self.latency)
+        tokens = self._answer(messages)
+        if not stream:
+            await asyncio.sleep(len(tokens) * self.token_interval)
+            return self._completion("".join(tokens))
+
+        async def chunks():
+            for token in tokens:
+                await asyncio.sleep(self.token_interval)
+                yield self._chunk(token)
+        return chunks()
+
+
+class FakeLLMClient:
+    """
+    OpenAI-compatible client: the answer arrives `latency` seconds (time to
+    first token) plus `token_interval` per token after the request.
+    """
+
+    def __init__(self, latency: float = 0.5, tokens: int = 64, token_interval: float = 0.01, is_async: bool = False):
+        self.is_async = is_async
+        self.chat = SimpleNamespace(completions=_FakeCompletions(latency, tokens, token_interval, is_async))
+
+    def close(self):
+        # Like OpenAI.close(), or AsyncOpenAI.close() which must be awaited
+        return asyncio.sleep(0) if self.is_async else None
+
+
+# --- Vector store ------------------------------------------------------------
+
+def add_latency(store, latency: float, methods: Iterable[str] = ("upsert", "query", "delete")) -> None:
+    """
+    Makes each call of `methods` on a VectorStore instance take `latency` seconds
+    longer, like a network round trip to a hosted index.
+    """
+    if not latency:
+        return
+    for name in methods:
+        method = getattr(store, name)
+
+        def delayed(*args, _method=method, **kwargs):
+            time.sleep(latency)
+            return _method(*args, **kwargs)
+        setattr(store, name, delayed)
+
+
+# --- Embedding model ---------------------------------------------------------
+
+class FakeTokenizer:
+    """
+    Word-level tokenizer with the call signature the chunker uses.
+    """
+
+    def __call__(self, text: str, add_special_tokens: bool = True, return_offsets_mapping: bool = False, **kwargs):
+        spans = [match.span() for match in re.finditer(r"\w+|[^\w\s]", text)]
+        encoding = {"input_ids": list(range(len(spans)))}
+        if return_offsets_mapping:
+            encoding["offset_mapping"] = spans
+        return encoding
+
+
+class FakeEmbedder:
+    """
+    Deterministic stand-in for the SentenceTransformer: hashes words into a
+    normalized bag-of-words vector, so texts sharing words are similar.
+    """
+
+    def __init__(self, dimension: int = 384):
+        self.dimension = dimension
+        self.tokenizer = FakeTokenizer()
+
+    def _vector(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for word in re.findall(r"\w+", text.lower()):
+            vector[int(hashlib.md5(word.encode("utf-8")).hexdigest()[:8], 16) % self.dimension] += 1.0
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    def encode(self, texts, batch_size: int = 32, show_progress_bar: bool = False, **kwargs):
+        if isinstance(texts, str):
+            return self._vector(texts)
+        return np.stack([self._vector(text) for text in texts]) if texts else np.zeros((0, self.dimension), dtype=np.float32)
@@ -0,0 +1,115 @@
+"""
+Tail latency and error rate of LLM completions with and without retries and hedging.
+
+Starts the fake OpenAI-compatible server (benchmarks/fake_llm_server.py) with
+a slow tail and injected failures, then sends the same load through
+ResilientLLMClient in three configurations: no retries, retries, and retries
+plus hedged requests. Reports p50/p95/p99 latency, failed completions, and
+how many requests reached the server for it.
+
+Usage (from Backend/):
+    python -m benchmarks.llm_resilience --requests 400 --concurrency 16 --tail-rate 0.05 --error-rate 0.05
+    python -m benchmarks.llm_resilience --stream --output llm_resilience.json
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import Dict
+
+import httpx
+
+from benchmarks.fake_llm_server import FakeLLMConfig, serve_in_thread
+from benchmarks.offline_bench import percentiles
+from app.model.llm_client import ResilientLLMClient
+from app.model.model import build_clients
+
+MESSAGES = [{"role": "user", "content": "Summarize the quarterly revenue growth of the report."}]
+
+
+async def run(client: ResilientLLMClient, requests: int, concurrency: int, stream: bool) -> Dict:
+    slots = asyncio.Semaphore(concurrency)
+    latencies, failures = [], 0
+
+    async def one():
+        nonlocal failures
+        async with slots:
+            started = time.perf_counter()
+            try:
+                if stream:
+                    async for _ in client.astream("fake", MESSAGES):
+                        pass
+                else:
+                    await client.acomplete("fake", MESSAGES)
+                latencies.append(time.perf_counter() - started)
+            except Exception:
+                failures += 1
+
+    await asyncio.gather(*(one() for _ in range(requests)))
+    return {**percentiles(latencies), "failures": failures}
+
+
+async def bench(args) -> Dict:
+    base_url = serve_in_thread(FakeLLMConfig(
+        latency_ms=args.latency_ms,
+        tail_rate=args.tail_rate,
+        tail_ms=args.tail_ms,
+        error_rate=args.error_rate,
+        token_ms=args.token_ms,
+    ))
+    stats_url = base_url.replace("/v1/", "/stats")
+    configurations = {
+        "no_retries": dict(max_retries=0, hedge=False),
+        "retries": dict(max_retries=args.max_retries, hedge=False),
+        "retries_hedged": dict(max_retries=args.max_retries, hedge=not args.stream),
+    }
+    results = {}
+    async with httpx.AsyncClient() as http:
+        for name, options in configurations.items():
+            # Fresh pooled clients per configuration, with a warmup that fills the latency window for hedging
+            sync_client, async_client = build_clients(base_url, "benchmark")
+            client = ResilientLLMClient(sync_client, async_client, timeout=args.timeout, hedge_min_samples=args.warmup // 2, **options)
+            await run(client, args.warmup, args.concurrency, args.stream)
+            await http.post(stats_url + "/reset")
+            before = client.stats()
+
+            result = await run(client, args.requests, args.concurrency, args.stream)
+            server = (await http.get(stats_url)).json()
+            result["upstream_requests"] = server["requests"]
+            after = client.stats()
+            result.update({key: after[key] - before[key] for key in ("retries", "timeouts", "hedges", "hedges_won")})
+            results[name] = result
+            print(
+                f"{name:>15}: p50 {result['p50_ms']} ms, p95 {result['p95_ms']} ms, p99 {result['p99_ms']} ms, "
+                f"{result['failures']} failed, {result['upstream_requests']} upstream requests "
+                f"({result['retries']} retries, {result['hedges']} hedges, {result['hedges_won']} won)"
+            )
+            await async_client.close()
+            sync_client.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--warmup", type=int, default=60, help="Requests before each measurement, to fill the latency window")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency-ms", type=float, default=200.0)
+    parser.add_argument("--tail-rate", type=float, default=0.05)
+    parser.add_argument("--tail-ms", type=float, default=3000.0)
+    parser.add_argument("--error-rate", type=float, default=0.05)
+    parser.add_argument("--token-ms", type=float, default=1.0)
+    parser.add_argument("--max-retries", type=int, default=2)
+    parser.add_argument("--timeout", type=float, default=10.0, help="Deadline per completion, seconds")
+    parser.add_argument("--stream", action="store_true", help="Streamed completions (retried, not hedged)")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    results = asyncio.run(bench(args))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Concurrent load test for a running backend.
+
+Fires the same request from an increasing number of concurrent clients and
+reports throughput and latency per concurrency level. With handlers that keep
+blocking work off the event loop, throughput should grow with concurrency
+until a dependency limit (CPU_WORKERS, LLM_CONCURRENCY, ...) is reached.
+
+Usage (from Backend/, with the server running):
+    python -m benchmarks.load_test --endpoint query --concurrency 1 2 4 8 16 32
+    python -m benchmarks.load_test --endpoint retrieve --convo-id <id> --requests 200
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from typing import Dict, List
+
+import httpx
+
+
+def _request_factory(args):
+    if args.endpoint == "query":
+        return lambda client, i: client.post("/query", json={"text_query": f"{args.text} ({i})" if args.vary else args.text})
+    params = {"query": args.text, "convo_id": args.convo_id}
+    if args.bypass_cache:
+        params["bypass_cache"] = "true"
+    return lambda client, i: client.get("/retrieve", params=params)
+
+
+async def run_level(base_url: str, concurrency: int, total: int, make_request) -> Dict[str, float]:
+    latencies: List[float] = []
+    errors = 0
+    counter = iter(range(total))
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+        async def worker():
+            nonlocal errors
+            for i in counter:
+                started = time.perf_counter()
+                try:
+                    response = await make_request(client, i)
+                    response.raise_for_status()
+                except httpx.HTTPError:
+                    errors += 1
+                    continue
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    pick = lambda q: latencies[min(int(q * len(latencies)), len(latencies) - 1)] * 1000 if latencies else 0.0
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+        "p50_ms": round(pick(0.50), 1),
+        "p95_ms": round(pick(0.95), 1),
+        "mean_ms": round(statistics.mean(latencies) * 1000, 1) if latencies else 0.0,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--endpoint", choices=["query", "retrieve"], default="query")
+    parser.add_argument("--text", default="What is the main topic of the document?")
+    parser.add_argument("--convo-id", default="", help="Conversation id for /retrieve")
+    parser.add_argument("--vary", action="store_true", help="Make every /query text unique to defeat the query caches")
+    parser.add_argument("--bypass-cache", action="store_true", help="Skip the semantic answer cache on /retrieve")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--requests", type=int, default=100, help="Requests per concurrency level")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    make_request = _request_factory(args)
+    results = []
+    print(f"{'clients':>8} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'errors':>7}")
+    for level in args.concurrency:
+        result = await run_level(args.base_url, level, args.requests, make_request)
+        results.append(result)
+        print(f"{level:>8} {result['throughput_rps']:>8} {result['p50_ms']:>8} {result['p95_ms']:>8} {result['errors']:>7}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
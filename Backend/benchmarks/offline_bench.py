@@ -0,0 +1,266 @@
+"""
+Offline benchmark of ingestion throughput and query latency.
+
+Runs the real extraction, chunking, embedding, vector store and /retrieve code
+over a synthetic PDF corpus, with in-process fakes (benchmarks/fakes.py) for
+MongoDB and the LLM API and optional injected latency for each service. No
+network access or running services are needed; with --fake-model neither is
+the embedding model download.
+
+Ingestion goes through run_ingestion_pipeline, as for an /upload job.
+Reports pages/sec and chunks/sec for ingestion (with per-stage busy seconds),
+p50/p95/p99 latency of aquery_chunks and of the /retrieve route, and peak RSS.
+Results are written as JSON; --compare prints the change against an earlier run.
+
+Usage (from Backend/):
+    python -m benchmarks.offline_bench --output bench.json
+    python -m benchmarks.offline_bench --docs 8 --pages 100 --llm-latency-ms 800 --vector-store hnsw
+    python -m benchmarks.offline_bench --fake-model --compare bench.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from benchmarks import fakes
+
+_WORDS = (
+    "revenue growth quarter operating costs treatment group symptoms reduction install package configure "
+    "environment variables server contract terminated party notice neural networks representations text "
+    "semantic similarity rainfall region seasonal average flooding protocol latency throughput storage "
+    "index query document page chunk vector embedding model inference budget policy compliance audit"
+).split()
+
+
+def percentiles(latencies: List[float]) -> Dict[str, float]:
+    ordered = sorted(latencies)
+    pick = lambda q: ordered[min(int(q * len(ordered)), len(ordered) - 1)] * 1000 if ordered else 0.0
+    return {
+        "requests": len(ordered),
+        "p50_ms": round(pick(0.50), 2),
+        "p95_ms": round(pick(0.95), 2),
+        "p99_ms": round(pick(0.99), 2),
+        "max_ms": round(ordered[-1] * 1000, 2) if ordered else 0.0,
+    }
+
+
+def peak_rss_mb() -> float:
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Kilobytes on Linux, bytes on macOS
+        return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+    except ImportError:
+        import psutil
+        return round(psutil.Process().memory_info().peak_wset / (1024 * 1024), 1)
+
+
+def make_corpus(directory: Path, docs: int, pages: int, seed: int = 0) -> List[Path]:
+    """
+    Writes `docs` PDFs of `pages` pages, each page a few paragraphs of random vocabulary.
+    """
+    import fitz
+
+    rng = random.Random(seed)
+    paths = []
+    for d in range(docs):
+        pdf = fitz.open()
+        for p in range(pages):
+            paragraphs = [" ".join(rng.choices(_WORDS, k=rng.randint(40, 90))) + "." for _ in range(rng.randint(3, 6))]
+            page = pdf.new_page()
+            page.insert_textbox(fitz.Rect(50, 50, 545, 800), f"Document {d} page {p}\n\n" + "\n\n".join(paragraphs), fontsize=9)
+        path = directory / f"doc_{d:03d}.pdf"
+        pdf.save(str(path))
+        paths.append(path)
+    return paths
+
+
+INGEST_STAGES = ("extract", "tokenize", "chunk", "embed", "vector_upsert")
+
+
+def stage_seconds() -> Dict[str, float]:
+    """
+    Returns the total seconds recorded so far per stage in rag_stage_seconds.
+    """
+    from app.Function.metrics import STAGE_SECONDS
+
+    return {
+        sample.labels["stage"]: sample.value
+        for family in STAGE_SECONDS.collect()
+        for sample in family.samples
+        if sample.name.endswith("_sum")
+    }
+
+
+def bench_ingest(paths: List[Path], pages: int) -> Dict[str, float]:
+    from app.Function.pipeline import run_ingestion_pipeline
+
+    # The pipeline's stages overlap on their own threads, so these are busy
+    # seconds per stage, which can add up to more than the elapsed time
+    before = stage_seconds()
+    chunks_total = 0
+    first_vector = []
+    started = time.perf_counter()
+    for path in paths:
+        stats = run_ingestion_pipeline(path, "pdf", filename=path.name)
+        chunks_total += stats["chunks"]
+        first_vector.append(stats["first_vector_seconds"] or 0.0)
+    elapsed = time.perf_counter() - started
+    after = stage_seconds()
+    pages_total = pages * len(paths)
+    return {
+        "documents": len(paths),
+        "pages": pages_total,
+        "chunks": chunks_total,
+        "seconds": round(elapsed, 3),
+        "pages_per_sec": round(pages_total / elapsed, 1),
+        "chunks_per_sec": round(chunks_total / elapsed, 1),
+        "first_vector_seconds_max": round(max(first_vector), 3),
+        **{f"{stage}_seconds": round(after.get(stage, 0.0) - before.get(stage, 0.0), 3) for stage in INGEST_STAGES},
+    }
+
+
+def make_queries(count: int, seed: int = 1) -> List[str]:
+    rng = random.Random(seed)
+    # Numbered so every query misses the query caches
+    return [f"{' '.join(rng.choices(_WORDS, k=rng.randint(4, 10)))} #{i}" for i in range(count)]
+
+
+def bench_query(queries: List[str]) -> Dict[str, float]:
+    from app.Function.chunking import aquery_chunks
+
+    async def run() -> List[float]:
+        latencies = []
+        for query in queries:
+            started = time.perf_counter()
+            await aquery_chunks(query)
+            latencies.append(time.perf_counter() - started)
+        return latencies
+
+    return percentiles(asyncio.run(run()))
+
+
+def bench_retrieve(queries: List[str]) -> Dict[str, float]:
+    from fastapi.testclient import TestClient
+    import main
+
+    latencies, errors = [], 0
+    with TestClient(main.app) as client:
+        convo_id = client.post("/conversation").json()["id"]
+        for query in queries:
+            started = time.perf_counter()
+            response = client.get("/retrieve", params={"query": query[:200], "convo_id": convo_id, "bypass_cache": "true"})
+            if response.status_code != 200:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+    return {**percentiles(latencies), "errors": errors}
+
+
+def _git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(previous: Dict, current: Dict) -> None:
+    """
+    Prints each numeric result next to the same result of an earlier run.
+    """
+    print(f"\nChange against {previous.get('revision', '?')} ({previous.get('timestamp', '?')}):")
+    for section in ("ingest", "query", "retrieve"):
+        for key, value in current.get(section, {}).items():
+            old = previous.get(section, {}).get(key)
+            if isinstance(value, (int, float)) and isinstance(old, (int, float)) and old:
+                print(f"  {section}.{key}: {old} -> {value} ({(value - old) / old * 100:+.1f}%)")
+    old_rss = previous.get("peak_rss_mb")
+    if old_rss:
+        print(f"  peak_rss_mb: {old_rss} -> {current['peak_rss_mb']} ({(current['peak_rss_mb'] - old_rss) / old_rss * 100:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=4, help="PDFs in the synthetic corpus")
+    parser.add_argument("--pages", type=int, default=50, help="Pages per PDF")
+    parser.add_argument("--queries", type=int, default=200, help="aquery_chunks calls")
+    parser.add_argument("--retrieve-requests", type=int, default=50, help="/retrieve requests")
+    parser.add_argument("--vector-store", choices=["numpy", "hnsw"], default="numpy")
+    parser.add_argument("--vector-store-latency-ms", type=float, default=0.0, help="Added to every vector store call")
+    parser.add_argument("--mongo-latency-ms", type=float, default=0.0, help="Added to every MongoDB call")
+    parser.add_argument("--llm-latency-ms", type=float, default=300.0, help="LLM time to first token")
+    parser.add_argument("--llm-token-ms", type=float, default=5.0, help="LLM time per generated token")
+    parser.add_argument("--fake-model", action="store_true", help="Hashing embedder instead of all-MiniLM-L6-v2")
+    parser.add_argument("--workdir", help="Directory for the corpus and local stores (default: a new temp dir)")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--compare", help="Earlier results JSON to compare against")
+    args = parser.parse_args()
+
+    workdir = Path(args.workdir or tempfile.mkdtemp(prefix="pdf_rag_bench_"))
+    (workdir / "corpus").mkdir(parents=True, exist_ok=True)
+    # Fresh local stores, so no embedding is served from an earlier run's cache
+    os.environ.update(
+        VECTOR_STORE=args.vector_store,
+        VECTOR_STORE_PATH=str(workdir / f"vector_store_{time.time_ns()}"),
+        EMBEDDING_CACHE_PATH=str(workdir / f"embedding_cache_{time.time_ns()}.sqlite3"),
+        INGEST_SPOOL_DIR=str(workdir / "spool"),
+        NEBIUS_API_KEY=os.getenv("NEBIUS_API_KEY", "benchmark"),
+    )
+
+    # The fakes replace the services before any app module is imported
+    fakes.install_fake_mongo(latency=args.mongo_latency_ms / 1000)
+    from app.model import model as model_module
+    from app.db.vector_store import vector_store
+
+    llm = dict(latency=args.llm_latency_ms / 1000, token_interval=args.llm_token_ms / 1000)
+    model_module._clients = (fakes.FakeLLMClient(**llm), fakes.FakeLLMClient(**llm, is_async=True))
+    if args.fake_model:
+        model_module._model = fakes.FakeEmbedder()
+    fakes.add_latency(vector_store, args.vector_store_latency_ms / 1000)
+
+    started = time.perf_counter()
+    model_module.get_model().encode(["warmup"], show_progress_bar=False)
+    model_load_seconds = round(time.perf_counter() - started, 3)
+
+    print(f"Writing {args.docs} x {args.pages}-page PDFs to {workdir / 'corpus'}")
+    paths = make_corpus(workdir / "corpus", args.docs, args.pages)
+    queries = make_queries(max(args.queries, args.retrieve_requests))
+
+    ingest = bench_ingest(paths, args.pages)
+    print(f"ingest:   {ingest['pages_per_sec']} pages/s, {ingest['chunks_per_sec']} chunks/s ({ingest['chunks']} chunks in {ingest['seconds']}s)")
+    query = bench_query(queries[:args.queries])
+    print(f"query:    p50 {query['p50_ms']} ms, p95 {query['p95_ms']} ms, p99 {query['p99_ms']} ms")
+    retrieve = bench_retrieve(queries[:args.retrieve_requests])
+    print(f"retrieve: p50 {retrieve['p50_ms']} ms, p95 {retrieve['p95_ms']} ms, p99 {retrieve['p99_ms']} ms, {retrieve['errors']} errors")
+
+    results = {
+        "revision": _git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "platform": {"python": platform.python_version(), "machine": platform.machine(), "cpus": os.cpu_count()},
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare", "workdir")},
+        "model_load_seconds": model_load_seconds,
+        "ingest": ingest,
+        "query": query,
+        "retrieve": retrieve,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    print(f"peak RSS: {results['peak_rss_mb']} MB")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(json.load(f), results)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,33 @@
-
-
+from app.Function.lifecycle import lifecycle  # First import: starts the import-to-ready clock
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 from app.routes.router import router
+from app.Function.jobs import job_manager
+from app.Function.chunking import query_batcher
+from app.Function.history import history_writer
+from app.Function.metrics import MetricsMiddleware
+from app.model.model import aclose_clients
+from app.db.vector_store import vector_store
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # A local vector store allows one writing process: fail this worker now
+    # rather than its first upload
+    vector_store.claim_writer()
+    # Warmup and MongoDB setup run in the background so the server answers
+    # /healthz immediately; /readyz turns ready when they are done.
+    startup = asyncio.create_task(lifecycle.startup())
+    yield
+    startup.cancel()
+    job_manager.shutdown()
+    query_batcher.shutdown()
+    await history_writer.close()
+    await aclose_clients()
+
+app = FastAPI(lifespan=lifespan)
 
 # Configure CORS
 app.add_middleware(
@@ -16,6 +38,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Outermost, so request timings and the Server-Timing header cover CORS handling too
+app.add_middleware(MetricsMiddleware)
+
 app.include_router(router)
 
 @app.get("/")
@@ -23,4 +48,4 @@ def read_root():
     return {"message": "Backend is running!"}
 
 if __name__ == "__main__":
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
@@ -1,11 +1,17 @@
+import json
+import time
 import streamlit as st
 import requests
 
 FASTAPI_BASE_URL = "http://localhost:8000"
 UPLOAD_ENDPOINT = f"{FASTAPI_BASE_URL}/upload"
-RETRIEVE_ENDPOINT = f"{FASTAPI_BASE_URL}/retrieve"
+BULK_UPLOAD_ENDPOINT = f"{FASTAPI_BASE_URL}/upload/bulk"
+RETRIEVE_STREAM_ENDPOINT = f"{FASTAPI_BASE_URL}/retrieve/stream"
 CLEAR_DATABASE_ENDPOINT = f"{FASTAPI_BASE_URL}/clear-database"
 CONVERSATION_ENDPOINT = f"{FASTAPI_BASE_URL}/conversation"
+JOBS_ENDPOINT = f"{FASTAPI_BASE_URL}/jobs"
+JOB_POLL_INTERVAL_SECONDS = 1.0
+CONVERSATIONS_PAGE_SIZE = 20
 
 def create_new_conversation_in_backend():
     try:
@@ -33,16 +39,83 @@ def upload_file_to_fastapi(file, description):
         error_details = response.text if 'response' in locals() and response is not None else "No response details"
         return {"error": str(e), "details": error_details}
 
-def retrieve_answer_from_fastapi(query_text: str, convo_id: str):
+def upload_files_in_bulk(files):
+    """
+    Sends several documents (or zip archives of them) as one bulk ingestion job.
+    """
+    payload = [("files", (file.name, file.getvalue(), file.type or "application/octet-stream")) for file in files]
     try:
-        params = {"query": query_text, "convo_id": convo_id}
-        response = requests.get(RETRIEVE_ENDPOINT, params=params)
+        response = requests.post(BULK_UPLOAD_ENDPOINT, files=payload)
         response.raise_for_status()
         return response.json()
     except requests.RequestException as e:
         error_details = response.text if 'response' in locals() and response is not None else "No response details"
         return {"error": str(e), "details": error_details}
 
+def get_job_status(job_id: str):
+    try:
+        response = requests.get(f"{JOBS_ENDPOINT}/{job_id}")
+        response.raise_for_status()
+        return response.json()
+    except requests.RequestException as e:
+        return {"error": str(e)}
+
+def wait_for_ingestion_job(job_id: str):
+    """
+    Polls an ingestion job until it finishes, showing per-stage progress.
+    """
+    progress_bar = st.progress(0.0, text="Queued...")
+    while True:
+        job = get_job_status(job_id)
+        if "error" in job and job["error"] and "status" not in job:
+            progress_bar.empty()
+            return job
+        progress = job.get("progress", {})
+        if job["status"] == "running":
+            pages_total = progress.get("pages_total") or 0
+            files_total = progress.get("files_total") or 0
+            if files_total:
+                handled = sum(progress.get(key, 0) for key in ("files_done", "files_skipped", "files_duplicate", "files_failed"))
+                done = handled / files_total
+                text = (
+                    f"Processed {handled}/{files_total} documents, "
+                    f"embedded {progress.get('chunks_embedded', 0)} chunks "
+                    f"({progress.get('files_per_sec', 0)} documents/sec)"
+                )
+            elif pages_total:
+                done = progress.get("pages_extracted", 0) / pages_total
+                text = (
+                    f"Extracted {progress.get('pages_extracted', 0)}/{pages_total} pages, "
+                    f"embedded {progress.get('chunks_embedded', 0)} chunks, "
+                    f"wrote {progress.get('vectors_written', 0)} vectors"
+                )
+            else:
+                done, text = 0.0, "Starting..."
+            progress_bar.progress(min(done, 1.0), text=text)
+        elif job["status"] in ("completed", "failed", "cancelled"):
+            progress_bar.empty()
+            return job
+        time.sleep(JOB_POLL_INTERVAL_SECONDS)
+
+def stream_answer_from_fastapi(query_text: str, convo_id: str):
+    """
+    Yields answer tokens from the /retrieve/stream Server-Sent Events endpoint as they arrive.
+    Raises requests.RequestException if the request fails or the server reports an error.
+    """
+    params = {"query": query_text, "convo_id": convo_id}
+    with requests.get(RETRIEVE_STREAM_ENDPOINT, params=params, stream=True) as response:
+        response.raise_for_status()
+        event = None
+        for line in response.iter_lines(decode_unicode=True):
+            if line.startswith("event:"):
+                event = line[len("event:"):].strip()
+            elif line.startswith("data:"):
+                data = json.loads(line[len("data:"):])
+                if event == "token":
+                    yield data["token"]
+                elif event == "error":
+                    raise requests.RequestException(data.get("detail", "Streaming failed"))
+
 def clear_pinecone_database():
     try:
         response = requests.post(CLEAR_DATABASE_ENDPOINT)
@@ -55,14 +128,49 @@ def clear_pinecone_database():
 st.set_page_config(page_title="Document QA System", layout="centered")
 st.title("📄🔍 Document Uploader & QA")
 
-def get_all_conversations_from_backend():
+def get_all_conversations_from_backend(limit: int):
+    """
+    Returns the `limit` most recent conversations and whether older ones exist.
+    """
+    conversations, before = [], None
     try:
-        response = requests.get(f"{FASTAPI_BASE_URL}/conversations")
-        response.raise_for_status()
-        return response.json()
+        while len(conversations) < limit:
+            params = {"limit": limit - len(conversations)}
+            if before:
+                params["before"] = before
+            response = requests.get(f"{FASTAPI_BASE_URL}/conversations", params=params)
+            response.raise_for_status()
+            page = response.json()
+            conversations.extend(page["conversations"])
+            before = page["next_before"]
+            if not before:
+                break
+        return conversations, before is not None
     except requests.RequestException as e:
         st.sidebar.error(f"Error fetching conversations: {e}")
-        return []
+        return [], False
+
+def load_conversation(convo_id: str, before: str = None):
+    """
+    Fetches a page of a conversation's messages: the newest ones, or those older than message id `before`.
+    Returns the conversation JSON, or None on failure.
+    """
+    params = {"convo_id": convo_id}
+    if before:
+        params["before"] = before
+    response = requests.get(CONVERSATION_ENDPOINT, params=params)
+    if response.status_code != 200:
+        return None
+    return response.json()
+
+def open_conversation(convo_id: str) -> bool:
+    full_convo = load_conversation(convo_id)
+    if full_convo is None:
+        return False
+    st.session_state.active_conversation_id = full_convo["id"]
+    st.session_state.messages = full_convo.get("messages", [])
+    st.session_state.messages_before = full_convo.get("next_before")
+    return True
     
 # Add this function with your other API calls
 def delete_conversation_from_backend(convo_id: str):
@@ -85,13 +193,16 @@ if st.sidebar.button("➕ New Conversation"):
     if "id" in result:
         st.session_state.active_conversation_id = result["id"]
         st.session_state.messages = []
+        st.session_state.pop("messages_before", None)
         st.session_state.pop("file_processed", None) 
         st.rerun()
 
 st.sidebar.markdown("---")
 
-# Display the list of existing conversations
-all_conversations = get_all_conversations_from_backend()
+# Display the list of existing conversations, one page at a time
+if "conversations_limit" not in st.session_state:
+    st.session_state.conversations_limit = CONVERSATIONS_PAGE_SIZE
+all_conversations, more_conversations = get_all_conversations_from_backend(st.session_state.conversations_limit)
 # This is the updated loop in your sidebar
 if all_conversations:
     st.sidebar.markdown("##### Previous Chats")
@@ -111,12 +222,7 @@ if all_conversations:
         # Column 1: The button to load the conversation
         with col1:
             if st.button(label_date, key=f"load_{convo_id}", use_container_width=True):
-                response = requests.get(f"{CONVERSATION_ENDPOINT}?convo_id={convo_id}")
-                if response.status_code == 200:
-                    # (Your existing logic to load the conversation)
-                    full_convo = response.json()
-                    st.session_state.active_conversation_id = full_convo["id"]
-                    st.session_state.messages = full_convo.get("messages", [])
+                if open_conversation(convo_id):
                     st.session_state.pop("file_processed", None)
                     st.rerun()
 
@@ -128,19 +234,19 @@ if all_conversations:
                 if st.session_state.active_conversation_id == convo_id:
                     st.session_state.clear() # Clear session to start fresh
                 st.rerun() # Refresh the sidebar to show the conversation is gone
+    if more_conversations and st.sidebar.button("Show older chats", use_container_width=True):
+        st.session_state.conversations_limit += CONVERSATIONS_PAGE_SIZE
+        st.rerun()
 # --- Initial Setup for a new session ---
 # This block now automatically loads the latest or creates a new conversation
 if "active_conversation_id" not in st.session_state:
     if all_conversations:
         # If conversations exist, load the latest one
         latest_convo = all_conversations[0] # The list is sorted by most recent
-        st.session_state.active_conversation_id = latest_convo["id"]
         
-        # Fetch the full details of the latest conversation
-        response = requests.get(f"{CONVERSATION_ENDPOINT}?convo_id={latest_convo['id']}")
-        if response.status_code == 200:
-            st.session_state.messages = response.json().get("messages", [])
-        else:
+        # Fetch the newest messages of the latest conversation
+        if not open_conversation(latest_convo["id"]):
+            st.session_state.active_conversation_id = latest_convo["id"]
             st.session_state.messages = [] # Fallback to empty
     else:
         # If no conversations exist, create the very first one
@@ -165,28 +271,48 @@ if st.sidebar.button("🧹 Clear Pinecone Database"):
 
 # --- File Uploader ---
 with st.container():
-    uploaded_file = st.file_uploader(
-        "Upload a .pdf or .docx file", type=["pdf", "docx"], key="file_uploader"
+    uploaded_files = st.file_uploader(
+        "Upload .pdf or .docx files, or a .zip of them",
+        type=["pdf", "docx", "zip"],
+        accept_multiple_files=True,
+        key="file_uploader",
     )
 
 # --- File Upload Logic ---
-if uploaded_file and "file_processed" not in st.session_state:
-    with st.spinner("Uploading and processing document..."):
-        upload_result = upload_file_to_fastapi(uploaded_file, "N/A")
-        if "error" in upload_result:
-            st.error(f"Document upload failed: {upload_result['error']}")
-            if "details" in upload_result:
-                st.error(upload_result["details"])
-            st.stop()
+if uploaded_files and "file_processed" not in st.session_state:
+    with st.spinner("Uploading documents..."):
+        if len(uploaded_files) == 1 and not uploaded_files[0].name.lower().endswith(".zip"):
+            upload_result = upload_file_to_fastapi(uploaded_files[0], "N/A")
         else:
-            st.success("✅ Document uploaded and processed successfully!")
-            st.session_state.file_processed = True
+            upload_result = upload_files_in_bulk(uploaded_files)
+    if "error" in upload_result:
+        st.error(f"Document upload failed: {upload_result['error']}")
+        if "details" in upload_result:
+            st.error(upload_result["details"])
+        st.stop()
+    job = wait_for_ingestion_job(upload_result["job_id"])
+    if job.get("status") == "completed":
+        st.success("✅ Document uploaded and processed successfully!")
+        failures = (job.get("result") or {}).get("failures") or []
+        for failure in failures:
+            st.warning(f"Could not process {failure['name']}: {failure['error']}")
+        st.session_state.file_processed = True
+    else:
+        st.error(f"Document processing {job.get('status', 'failed')}: {job.get('error') or 'no details'}")
+        st.stop()
 
 if "file_processed" not in st.session_state:
     st.info("Please upload a document to enable Q&A.")
     st.stop()
 
 # --- Main Chat UI ---
+if st.session_state.get("messages_before") and st.button("Load earlier messages"):
+    older = load_conversation(st.session_state.active_conversation_id, before=st.session_state.messages_before)
+    if older is not None:
+        st.session_state.messages = older.get("messages", []) + st.session_state.messages
+        st.session_state.messages_before = older.get("next_before")
+        st.rerun()
+
 for message in st.session_state.messages:
     with st.chat_message(message["role"]):
         st.markdown(message["content"])
@@ -202,21 +328,11 @@ if query_text:
         st.error("Query must be between 3 and 100 characters.")
         st.session_state.messages.pop()
     else:
-        with st.spinner("Getting answer from LLM..."):
-            answer_result = retrieve_answer_from_fastapi(query_text, st.session_state.active_conversation_id)
-            if "error" in answer_result:
-                st.error(f"Failed to get answer: {answer_result['error']}")
-                if "details" in answer_result:
-                    st.error(answer_result["details"])
-                st.session_state.messages.append({
-                    "role": "assistant",
-                    "content": "I apologize, but I could not retrieve an answer at this time. Please try again."
-                })
-                with st.chat_message("assistant"):
-                    st.markdown("I apologize, but I could not retrieve an answer at this time. Please try again.")
-            else:
-                llm_answer = answer_result.get("response", "No response found.")
-                st.session_state.messages.append({"role": "assistant", "content": llm_answer})
-                with st.chat_message("assistant"):
-                    st.markdown(llm_answer)
-
+        with st.chat_message("assistant"):
+            try:
+                llm_answer = st.write_stream(stream_answer_from_fastapi(query_text, st.session_state.active_conversation_id))
+            except requests.RequestException as e:
+                st.error(f"Failed to get answer: {e}")
+                llm_answer = "I apologize, but I could not retrieve an answer at this time. Please try again."
+                st.markdown(llm_answer)
+        st.session_state.messages.append({"role": "assistant", "content": llm_answer})